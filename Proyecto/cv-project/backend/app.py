@@ -1,38 +1,254 @@
-from flask import Flask, jsonify, request, abort, send_from_directory
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, abort, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+import flask_migrate
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import json
+import click
 from dotenv import load_dotenv
 import stripe
-from scan_utils import scan_ports
-from models import db, Profile, Experience, Education, Skill, ScanHistory, DonationHistory
-from datetime import datetime
+from scan_utils import (DEFAULT_SCAN_PROFILE, SCAN_PROFILES, get_common_ports, parse_ports_spec, profile_ports,
+                        scan_ports, scan_ports_connect, scan_ports_incremental, scan_ports_parallel)
+from cv_cache import CVCache
+from cv_assembly import load_cv_data
+from scan_jobs import ScanJobManager, QueueFullError
+from scan_admission import ScanAdmission
+from port_monitor import PortMonitor, parse_window, port_availability
+from scan_cache import FingerprintCache, ScanResultCache, make_scan_key
+from pagination import keyset_page, parse_fields
+from scan_diff import diff_results
+from scan_retention import compact_scans
+from photo_variants import PhotoProcessor, photo_urls
+from upload_serving import UploadServer
+from upload_store import UploadStore
+from db_pool import PoolMonitor
+from metrics import Metrics
+from profiling import RequestProfiler, phase
+from donations import DonationOutbox, configure_stripe, status_update_from_event, donation_stats, rebuild_donation_stats
+import sqlalchemy as sa
+from sqlalchemy.orm import defer, selectinload
+from models import db, Profile, Experience, Education, Skill, ScanHistory, ScanPort, DonationHistory, PortTransition
+from datetime import datetime, timedelta
 import time
-from werkzeug.utils import secure_filename
+from urllib.parse import urlencode
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://cvuser:cvpassword@db:5432/cvproject')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Scan engines accepted by /api/scan (engine="connect" is the native TCP-connect scanner)
+SCAN_ENGINES = ('nmap', 'connect')
+
+# First migration: the schema that the original db.create_all() produced (profiles table included)
+BASELINE_REVISION = '7e93130661f1'
+
+# Extensions are created unbound and attached to the app in create_app()
+pool_monitor = PoolMonitor()
+metrics = Metrics()
+request_profiler = RequestProfiler()
+migrate = Migrate()
+cv_cache = CVCache()
+scan_jobs = ScanJobManager()
+scan_admission = ScanAdmission()
+port_monitor = PortMonitor()
+scan_cache = ScanResultCache()
+fingerprint_cache = FingerprintCache()
+photo_processor = PhotoProcessor(on_ready=cv_cache.invalidate)
+upload_server = UploadServer()
+upload_store = UploadStore()
+donation_outbox = DonationOutbox()
+
+# Todas las rutas y comandos CLI; cli_group=None mantiene "flask compact-scans" en lugar de "flask api ..."
+api = Blueprint('api', __name__, cli_group=None)
+
+def load_config(app):
+    """Carga en app.config la configuración leída de las variables de entorno"""
+    # Database configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'postgresql://cvuser:cvpassword@db:5432/cvproject')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Connection pool (see db_pool.engine_options); the statement timeout only applies to Postgres (0 disables it)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', '5'))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'True').lower() in ('1', 'true', 'yes')
+    app.config['DB_CONNECT_TIMEOUT'] = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+
+    # Prometheus metrics at /api/metrics (request latency, scans, queries, uploads)
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+
+    # Opt-in profiling: per-request SQL counts and Server-Timing, cProfile dumps for requests sent with
+    # X-Profile (only when it matches PROFILE_TOKEN) or under PROFILE_PATHS; slow queries are logged on their own
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', 'profiles')
+    app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN')
+    app.config['PROFILE_PATHS'] = [path.strip() for path in os.getenv('PROFILE_PATHS', '').split(',') if path.strip()]
+    app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', '0'))  # 0 disables the slow query log
+
+    # /api/health reports "degraded" when the SELECT 1 round trip takes longer than this
+    app.config['HEALTH_DB_SLOW_MS'] = float(os.getenv('HEALTH_DB_SLOW_MS', '250'))
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+
+    # Profile photo variants (thumbnail, display, retina) generated in the background after each upload
+    app.config['PHOTO_VARIANT_FORMAT'] = os.getenv('PHOTO_VARIANT_FORMAT', 'WEBP')
+    app.config['PHOTO_VARIANT_QUALITY'] = int(os.getenv('PHOTO_VARIANT_QUALITY', '80'))
+
+    # Maximum size of an uploaded photo; larger uploads are rejected with 413 while streaming
+    app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
+
+    # In-memory LRU for the hottest small files under /uploads (0 disables it)
+    app.config['UPLOAD_CACHE_SIZE'] = int(os.getenv('UPLOAD_CACHE_SIZE', '32'))
+    app.config['UPLOAD_CACHE_MAX_FILE'] = int(os.getenv('UPLOAD_CACHE_MAX_FILE', str(256 * 1024)))
+
+    # CV cache configuration (in-process LRU by default, redis:// URL for a shared store)
+    app.config['CV_CACHE_URL'] = os.getenv('CV_CACHE_URL')
+    app.config['CV_CACHE_SIZE'] = int(os.getenv('CV_CACHE_SIZE', '64'))
+    # Without a shared store each worker only sees its own invalidations: bound the staleness (0 = no TTL)
+    app.config['CV_CACHE_LOCAL_TTL'] = float(os.getenv('CV_CACHE_LOCAL_TTL', '5'))
+    # Fail /api/cv if rebuilding the CV takes more than one query (for development and benchmarks)
+    app.config['CV_CHECK_QUERIES'] = os.getenv('CV_CHECK_QUERIES', 'False').lower() in ('1', 'true', 'yes')
+
+    # Scan job queue: concurrent scans, queued scans and how long finished jobs stay in memory
+    app.config['SCAN_WORKERS'] = int(os.getenv('SCAN_WORKERS', '2'))
+    app.config['SCAN_QUEUE_SIZE'] = int(os.getenv('SCAN_QUEUE_SIZE', '8'))
+    app.config['SCAN_JOB_TTL'] = int(os.getenv('SCAN_JOB_TTL', '3600'))
+    # Queued/running scans older than this with no live job (dead or restarted worker) are marked failed
+    app.config['SCAN_STALE_AFTER'] = int(os.getenv('SCAN_STALE_AFTER', '3600'))
+
+    # Port lists always go to the scan_ports table; keep a full JSON copy in scan_history too?
+    app.config['SCAN_STORE_JSON'] = os.getenv('SCAN_STORE_JSON', 'True').lower() in ('1', 'true', 'yes')
+
+    # Delta storage: store only the differences against the last full snapshot of the same target/range,
+    # writing a new full snapshot every SCAN_SNAPSHOT_INTERVAL scans
+    app.config['SCAN_DELTA_STORAGE'] = os.getenv('SCAN_DELTA_STORAGE', 'False').lower() in ('1', 'true', 'yes')
+    app.config['SCAN_SNAPSHOT_INTERVAL'] = int(os.getenv('SCAN_SNAPSHOT_INTERVAL', '10'))
+
+    # Compressed storage: scan results are saved as zlib-compressed JSON (scan_results_z)
+    app.config['SCAN_COMPRESS_RESULTS'] = os.getenv('SCAN_COMPRESS_RESULTS', 'True').lower() in ('1', 'true', 'yes')
+    app.config['SCAN_COMPRESS_LEVEL'] = int(os.getenv('SCAN_COMPRESS_LEVEL', '6'))
 
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
+    # Retention policy applied by `flask compact-scans`: keep everything for SCAN_RETENTION_FULL_DAYS,
+    # then one scan per target/range/day until SCAN_RETENTION_ROLLUP_DAYS, then drop (0 disables a stage)
+    app.config['SCAN_RETENTION_FULL_DAYS'] = int(os.getenv('SCAN_RETENTION_FULL_DAYS', '30'))
+    app.config['SCAN_RETENTION_ROLLUP_DAYS'] = int(os.getenv('SCAN_RETENTION_ROLLUP_DAYS', '365'))
+    app.config['SCAN_COMPACTION_BATCH_SIZE'] = int(os.getenv('SCAN_COMPACTION_BATCH_SIZE', '500'))
+
+    # Scan result cache: seconds a completed result is reused for identical scans (0 disables it)
+    app.config['SCAN_CACHE_TTL'] = int(os.getenv('SCAN_CACHE_TTL', '60'))
+    app.config['SCAN_CACHE_URL'] = os.getenv('SCAN_CACHE_URL')
+    app.config['SCAN_CACHE_SIZE'] = int(os.getenv('SCAN_CACHE_SIZE', '128'))
+
+    # Service fingerprints reused by the standard/deep profiles: seconds before a port is
+    # fingerprinted again (0 disables incremental detection); stored in SCAN_CACHE_URL if set
+    app.config['SCAN_FINGERPRINT_TTL'] = int(os.getenv('SCAN_FINGERPRINT_TTL', '86400'))
+    app.config['SCAN_FINGERPRINT_CACHE_SIZE'] = int(os.getenv('SCAN_FINGERPRINT_CACHE_SIZE', '4096'))
+
+    # Native TCP-connect engine (engine="connect" in /api/scan)
+    app.config['SCAN_CONNECT_CONCURRENCY'] = int(os.getenv('SCAN_CONNECT_CONCURRENCY', '500'))
+    app.config['SCAN_CONNECT_TIMEOUT'] = float(os.getenv('SCAN_CONNECT_TIMEOUT', '1.0'))
+
+    # Parallel nmap mode: the range is split into chunks scanned by several nmap processes
+    app.config['SCAN_NMAP_PARALLEL'] = os.getenv('SCAN_NMAP_PARALLEL', 'False').lower() in ('1', 'true', 'yes')
+    app.config['SCAN_NMAP_WORKERS'] = int(os.getenv('SCAN_NMAP_WORKERS', str(os.cpu_count() or 1)))
+    app.config['SCAN_NMAP_CHUNK_SIZE'] = int(os.getenv('SCAN_NMAP_CHUNK_SIZE', '0'))  # 0 = automatic
+
+    # nmap scan profiles: default for requests without "profile" and per-profile timeout in seconds
+    # (SCAN_TIMEOUT_QUICK, SCAN_TIMEOUT_STANDARD, SCAN_TIMEOUT_DEEP; 0 = no limit)
+    app.config['SCAN_DEFAULT_PROFILE'] = os.getenv('SCAN_DEFAULT_PROFILE', DEFAULT_SCAN_PROFILE)
+    app.config['SCAN_PROFILE_TIMEOUTS'] = {
+        name: int(os.getenv(f'SCAN_TIMEOUT_{name.upper()}', str(profile['timeout'])))
+        for name, profile in SCAN_PROFILES.items()
+    }
+
+    # Admission control for /api/scan: per-client token bucket (scans per minute, 0 disables it, and burst)
+    # plus global caps on running and waiting scans, shared by all workers when SCAN_LIMIT_URL points to Redis
+    app.config['SCAN_RATE_LIMIT'] = float(os.getenv('SCAN_RATE_LIMIT', '6'))
+    app.config['SCAN_RATE_BURST'] = int(os.getenv('SCAN_RATE_BURST', '3'))
+    app.config['SCAN_MAX_CONCURRENT'] = int(os.getenv('SCAN_MAX_CONCURRENT', str(app.config['SCAN_WORKERS'])))
+    app.config['SCAN_MAX_QUEUED'] = int(os.getenv('SCAN_MAX_QUEUED', str(app.config['SCAN_QUEUE_SIZE'])))
+    app.config['SCAN_SLOT_TTL'] = int(os.getenv('SCAN_SLOT_TTL', '1800'))
+    app.config['SCAN_LIMIT_URL'] = os.getenv('SCAN_LIMIT_URL')
+    app.config['SCAN_QUEUE_RETRY_AFTER'] = int(os.getenv('SCAN_QUEUE_RETRY_AFTER', '10'))
+
+    # Background port monitor: connect probes of MONITOR_PORTS (nmap-style list, default: common ports) every
+    # MONITOR_INTERVAL seconds; only state changes are stored (port_transitions)
+    app.config['MONITOR_ENABLED'] = os.getenv('MONITOR_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+    app.config['MONITOR_TARGET'] = os.getenv('MONITOR_TARGET', '127.0.0.1')
+    app.config['MONITOR_PORTS'] = parse_ports_spec(os.getenv('MONITOR_PORTS', ''))
+    app.config['MONITOR_INTERVAL'] = float(os.getenv('MONITOR_INTERVAL', '5'))
+    app.config['MONITOR_TIMEOUT'] = float(os.getenv('MONITOR_TIMEOUT', '0.5'))
+    app.config['MONITOR_CONCURRENCY'] = int(os.getenv('MONITOR_CONCURRENCY', '100'))
+    app.config['MONITOR_LOCK_FILE'] = os.getenv('MONITOR_LOCK_FILE')
+
+    # Reverse proxies in front of the backend (1 behind the frontend's nginx): client IPs come from X-Forwarded-For
+    app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', '0'))
+
+    # Stripe: pooled HTTP client; STRIPE_API_BASE points it at a local stub (benchmarks/stripe_stub.py)
+    app.config['STRIPE_SECRET_KEY'] = os.getenv('STRIPE_SECRET_KEY')
+    app.config['STRIPE_WEBHOOK_SECRET'] = os.getenv('STRIPE_WEBHOOK_SECRET')
+    app.config['STRIPE_API_BASE'] = os.getenv('STRIPE_API_BASE')
+    app.config['STRIPE_HTTP_POOL_SIZE'] = int(os.getenv('STRIPE_HTTP_POOL_SIZE', '10'))
+    app.config['STRIPE_TIMEOUT'] = float(os.getenv('STRIPE_TIMEOUT', '10'))
+    app.config['STRIPE_MAX_RETRIES'] = int(os.getenv('STRIPE_MAX_RETRIES', '2'))
+
+    # Webhook status updates are batched by a background thread; failed batches are retried with backoff
+    app.config['DONATION_OUTBOX_BATCH_SIZE'] = int(os.getenv('DONATION_OUTBOX_BATCH_SIZE', '100'))
+    app.config['DONATION_OUTBOX_FLUSH_INTERVAL'] = float(os.getenv('DONATION_OUTBOX_FLUSH_INTERVAL', '0.05'))
+    app.config['DONATION_OUTBOX_RETRIES'] = int(os.getenv('DONATION_OUTBOX_RETRIES', '3'))
+    app.config['DONATION_OUTBOX_RETRY_BACKOFF'] = float(os.getenv('DONATION_OUTBOX_RETRY_BACKOFF', '0.1'))
+
+def create_app(config=None):
+    """
+    Fábrica de la aplicación: configuración, extensiones y rutas
+
+    Args:
+        config (dict): Opcional, valores que sustituyen a los del entorno (benchmarks, scripts)
+
+    Returns:
+        Flask: Aplicación lista para servir (gunicorn importa la de wsgi.py)
+    """
+    app = Flask(__name__)
+    CORS(app)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Initialize extensions (no threads are started here, so the app can be preloaded before forking)
+    metrics.init_app(app)
+    request_profiler.init_app(app)
+    pool_monitor.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        pool_monitor.register_events()
+        metrics.register_engine(db.engine)
+        request_profiler.register_engine(db.engine)
+    metrics.registry.add_collector(pool_monitor.collect)
+    migrate.init_app(app, db)
+    cv_cache.init_app(app)
+    scan_admission.init_app(app)
+    metrics.registry.add_collector(scan_admission.collect)
+    scan_jobs.init_app(app)
+    scan_cache.init_app(app)
+    fingerprint_cache.init_app(app)
+    port_monitor.init_app(app)
+    photo_processor.init_app(app)
+    upload_server.init_app(app)
+    upload_store.init_app(app)
+    configure_stripe(app)
+    donation_outbox.init_app(app)
 
-# Configure Stripe
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+    app.register_blueprint(api)
+    return app
 
 # Datos estáticos del CV (fallback si la BD no está disponible) - Solo datos de Luis Eduardo
 CV_DATA = {
@@ -85,47 +301,55 @@ CV_DATA = {
     }
 }
 
-@app.route('/api/cv', methods=['GET'])
+def uploads_base_url():
+    return f"{request.host_url.rstrip('/')}/uploads"
+
+@api.route('/api/cv', methods=['GET'])
 def get_cv():
     """Endpoint que devuelve los datos del CV desde la base de datos"""
+    # The photo URL depends on the host, so each host gets its own cache entry
+    cache_variant = request.host_url
+    with phase('cache'):
+        cached = cv_cache.get(cache_variant)
+    if cached:
+        return cv_cache.make_response(cached)
+    
     try:
-        # Get CV profile from database
-        profile = CVProfile.query.first()
-        
-        if not profile:
-            # If no profile exists, create default one
-            profile = create_default_profile()
+        # Read the version before building so a concurrent write invalidates this entry
+        version = cv_cache.version()
         
-        # Build CV data structure
-        cv_data = {
-            'profile': profile.to_dict(),
-            'experience': [exp.to_dict() for exp in profile.experiences],
-            'education': [edu.to_dict() for edu in profile.educations],
-            'skills': {}
-        }
-        
-        # Organize skills by category
-        for skill in profile.skills:
-            cv_data['skills'][skill.category] = skill.skills_list
+        # Load the whole profile graph in a single round trip
+        check_queries = current_app.config['CV_CHECK_QUERIES']
+        with phase('load'):
+            cv_data = load_cv_data(check_queries)
+            
+            if not cv_data:
+                # If no profile exists, create default one
+                if not create_default_profile():
+                    raise RuntimeError('No se pudo crear el perfil por defecto')
+                cv_data = load_cv_data(check_queries)
         
-        if profile and profile.photo_filename:
-            cv_data['profile']['photo_url'] = f"{request.host_url.rstrip('/')}/uploads/{profile.photo_filename}"
-        else:
-            cv_data['profile']['photo_url'] = None
+        # Variants once they are ready, the original until then
+        cv_data['profile'].update(photo_urls(cv_data['profile'], uploads_base_url()))
         
-        return jsonify(cv_data)
+        with phase('json'):
+            body = jsonify(cv_data).get_data(as_text=True)
+        entry = cv_cache.set(cache_variant, body, version)
+        return cv_cache.make_response(entry)
         
+    except AssertionError:
+        # CV_CHECK_QUERIES: the static fallback would hide the regression
+        raise
     except Exception as e:
         # Fallback to static data if database fails
         print(f"Database error, using static data: {e}")
         fallback_data = CV_DATA.copy()
-        if fallback_data['profile'].get('photo_filename'):
-            fallback_data['profile']['photo_url'] = f"{request.host_url.rstrip('/')}/uploads/{fallback_data['profile']['photo_filename']}"
+        fallback_data['profile'] = dict(fallback_data['profile'], **photo_urls(fallback_data['profile'], uploads_base_url()))
         return jsonify(fallback_data)
 
-@app.route('/api/scan', methods=['POST'])
+@api.route('/api/scan', methods=['POST'])
 def scan_network():
-    """Endpoint para escanear puertos usando nmap y guardar en BD"""
+    """Endpoint que encola un escaneo de puertos con nmap y devuelve su id de inmediato"""
     try:
         data = request.get_json()
         
@@ -134,11 +358,24 @@ def scan_network():
         
         port_range = data['port_range']
         target = data.get('target', 'localhost')
+        engine = data.get('engine', 'nmap')
+        profile = data.get('profile', current_app.config['SCAN_DEFAULT_PROFILE'])
+        parallel = bool(data.get('parallel', current_app.config['SCAN_NMAP_PARALLEL']))
+        refresh_fingerprints = bool(data.get('refresh_fingerprints', False))
         
         # Validar que solo se permita localhost o 127.0.0.1
         if target not in ['localhost', '127.0.0.1']:
             return jsonify({'error': 'Solo se permite escanear localhost o 127.0.0.1'}), 400
         
+        if engine not in SCAN_ENGINES:
+            return jsonify({'error': f'Motor de escaneo inválido. Use uno de: {", ".join(SCAN_ENGINES)}'}), 400
+        
+        if profile not in SCAN_PROFILES:
+            return jsonify({'error': f'Perfil de escaneo inválido. Use uno de: {", ".join(SCAN_PROFILES)}'}), 400
+        # Los perfiles solo cambian los argumentos de nmap
+        if engine != 'nmap':
+            profile = None
+        
         # Validar formato del rango de puertos
         if not port_range or '-' not in port_range:
             return jsonify({'error': 'Formato de rango de puertos inválido. Use formato: "22-443"'}), 400
@@ -149,37 +386,257 @@ def scan_network():
                 raise ValueError()
         except ValueError:
             return jsonify({'error': 'Rango de puertos inválido. Use números entre 1-65535'}), 400
+
+        # Un perfil limitado a puertos comunes no amplía el escaneo al rango completo si no hay ninguno
+        if profile is not None and profile_ports(profile, port_range) == []:
+            return jsonify({'error': f'El perfil {profile} solo escanea puertos comunes y no hay ninguno en {port_range}. '
+                                     f'Amplíe el rango o use otro perfil'}), 400
+
+        # Escaneos idénticos (mismo objetivo, puertos y opciones) comparten resultado
+        cache_key = make_scan_key(target, port_range, {'engine': engine, 'profile': profile})
+        if not data.get('refresh') and not refresh_fingerprints:
+            cached = scan_cache.get(cache_key)
+            if cached:
+                return jsonify({
+                    'scan_id': cached['scan_id'],
+                    'target': target,
+                    'port_range': port_range,
+                    'profile': profile,
+                    'status': 'completed',
+                    'progress': 1.0,
+                    'duration': cached['duration'],
+                    'results': cached['results'],
+                    'timestamp': cached['results'].get('timestamp', ''),
+                    'status_url': f"/api/scan/{cached['scan_id']}",
+                    'cached': True,
+                    'coalesced': False,
+                    'cache_age': round(time.time() - cached['cached_at'], 3)
+                })
         
-        # Realizar el escaneo
-        start_time = time.time()
-        scan_results = scan_ports(target, port_range)
-        duration = time.time() - start_time
+        # Límite por cliente: los resultados en caché no gastan tokens
+        allowed, retry_after = scan_admission.check_rate(request.remote_addr or 'unknown')
+        if not allowed:
+            response = jsonify({
+                'error': f'Demasiados escaneos seguidos. Intente de nuevo en {retry_after} s',
+                'retry_after': retry_after
+            })
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
         
-        # Guardar en base de datos
+        # Encolar el escaneo; la fila de ScanHistory se crea ahora y se completa al terminar.
+        # Con refresh_fingerprints no se une a un escaneo en curso que reutilice huellas
+        job_key = cache_key
+        if refresh_fingerprints:
+            job_key = make_scan_key(target, port_range, {'engine': engine, 'profile': profile,
+                                                         'refresh_fingerprints': True})
         try:
-            scan_record = ScanHistory(
-                target=target,
-                port_range=port_range,
-                scan_results=scan_results,
-                duration=duration
+            job, created = scan_jobs.submit(
+                target,
+                port_range,
+                make_scan_runner(target, port_range, engine, parallel, profile, refresh_fingerprints),
+                key=job_key,
+                on_complete=lambda job: scan_cache.set(cache_key, job),
+                engine=engine,
+                profile=profile
             )
-            db.session.add(scan_record)
-            db.session.commit()
-        except Exception as db_error:
-            print(f"Error saving scan to database: {db_error}")
+        except QueueFullError:
+            response = jsonify({'error': 'Hay demasiados escaneos en curso. Intente de nuevo en unos minutos'})
+            response.headers['Retry-After'] = str(current_app.config['SCAN_QUEUE_RETRY_AFTER'])
+            return response, 503
         
-        return jsonify({
-            'target': target,
-            'port_range': port_range,
-            'results': scan_results,
-            'timestamp': scan_results.get('timestamp', ''),
-            'duration': duration
-        })
+        response = job.to_dict()
+        response['status_url'] = f"/api/scan/{job.scan_id}"
+        response['cached'] = False
+        response['coalesced'] = not created
+        response['cache_age'] = None
+        return jsonify(response), 202
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error durante el escaneo: {str(e)}'}), 500
 
-@app.route('/api/create-checkout-session', methods=['POST'])
+def make_scan_runner(target, port_range, engine, parallel=False, profile=DEFAULT_SCAN_PROFILE,
+                     refresh_fingerprints=False):
+    """Devuelve la función que ejecuta el escaneo con el motor y el perfil elegidos dentro del job"""
+    if engine == 'connect':
+        return lambda job: scan_ports_connect(
+            target,
+            port_range,
+            concurrency=current_app.config['SCAN_CONNECT_CONCURRENCY'],
+            timeout=current_app.config['SCAN_CONNECT_TIMEOUT'],
+            on_port=job.report_port,
+            cancel_event=job.cancel_event
+        )
+    arguments = SCAN_PROFILES[profile]['arguments']
+    ports = profile_ports(profile, port_range)
+    timeout = current_app.config['SCAN_PROFILE_TIMEOUTS'][profile]
+    if SCAN_PROFILES[profile]['fingerprints'] and fingerprint_cache.ttl:
+        # Barrido de estados y detección de versiones solo en los puertos sin huella vigente.
+        # El barrido en paralelo no publica puertos: se publican al final, ya con sus huellas
+        def run_incremental(job):
+            sweep = None
+            if parallel:
+                sweep = lambda sweep_arguments, sweep_timeout: scan_ports_parallel(
+                    target,
+                    port_range,
+                    workers=current_app.config['SCAN_NMAP_WORKERS'],
+                    chunk_size=current_app.config['SCAN_NMAP_CHUNK_SIZE'] or None,
+                    arguments=sweep_arguments,
+                    on_progress=job.report_progress,
+                    cancel_event=job.cancel_event,
+                    ports=ports,
+                    timeout=sweep_timeout
+                )
+            return scan_ports_incremental(target, port_range, fingerprint_cache, arguments=arguments, ports=ports,
+                                          timeout=timeout, sweep=sweep, refresh=refresh_fingerprints)
+        return run_incremental
+    if parallel:
+        return lambda job: scan_ports_parallel(
+            target,
+            port_range,
+            workers=current_app.config['SCAN_NMAP_WORKERS'],
+            chunk_size=current_app.config['SCAN_NMAP_CHUNK_SIZE'] or None,
+            arguments=arguments,
+            on_port=job.report_port,
+            on_progress=job.report_progress,
+            cancel_event=job.cancel_event,
+            ports=ports,
+            timeout=timeout
+        )
+    return lambda job: scan_ports(target, port_range, arguments=arguments, ports=ports, timeout=timeout)
+
+@api.route('/api/scan/<int:scan_id>', methods=['GET'])
+def get_scan_status(scan_id):
+    """Estado, progreso y resultado de un escaneo encolado"""
+    job = scan_jobs.get(scan_id)
+    if job:
+        return jsonify(job.to_dict())
+    
+    # Trabajo ya expirado de memoria o lanzado por otro proceso: se lee de la BD
+    scan = db.session.get(ScanHistory, scan_id)
+    if not scan:
+        return jsonify({'error': 'Escaneo no encontrado'}), 404
+    response = {
+        'scan_id': scan.id,
+        'target': scan.target,
+        'port_range': scan.port_range,
+        'profile': scan.profile,
+        'status': scan.status,
+        'progress': 1.0 if scan.status in ScanJobManager.FINAL_STATES else 0.0,
+        'duration': scan.duration
+    }
+    results = scan.results
+    if results is not None:
+        response['results'] = results
+        response['timestamp'] = results.get('timestamp', '')
+    return jsonify(response)
+
+@api.route('/api/scan/<int:scan_id>/diff', methods=['GET'])
+def get_scan_diff(scan_id):
+    """Puertos abiertos, cerrados y con servicio cambiado respecto al escaneo anterior (o ?against=<id>)"""
+    scan = db.session.get(ScanHistory, scan_id)
+    if not scan:
+        return jsonify({'error': 'Escaneo no encontrado'}), 404
+    if scan.status != 'completed':
+        return jsonify({'error': f'El escaneo no está completado ({scan.status})'}), 409
+    
+    against = request.args.get('against', type=int)
+    previous = db.session.get(ScanHistory, against) if against else scan.find_previous()
+    if against and not previous:
+        return jsonify({'error': 'Escaneo de comparación no encontrado'}), 404
+    
+    diff = diff_results(previous.results if previous else None, scan.results)
+    diff.update({
+        'scan_id': scan.id,
+        'previous_scan_id': previous.id if previous else None,
+        'target': scan.target,
+        'port_range': scan.port_range,
+        'timestamp': scan.timestamp.isoformat() if scan.timestamp else None,
+        'previous_timestamp': previous.timestamp.isoformat() if previous and previous.timestamp else None
+    })
+    return jsonify(diff)
+
+def format_sse(event, data, event_id=None):
+    """Serializa un evento en formato Server-Sent Events"""
+    message = f"id: {event_id}\n" if event_id is not None else ''
+    return message + f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@api.route('/api/scan/<int:scan_id>/events', methods=['GET'])
+def stream_scan(scan_id):
+    """Transmite por SSE cada puerto y el progreso del escaneo; el resumen llega al final"""
+    job = scan_jobs.get(scan_id)
+    
+    if job:
+        # Al reconectar, EventSource envía el último id recibido
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+        start = last_event_id + 1 if last_event_id is not None else 0
+        
+        def generate():
+            for index, event, data in job.iter_events(start):
+                if event is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield format_sse(event, data, index)
+    else:
+        # Escaneo terminado y ya fuera de memoria, o en curso en otro worker: se reproduce desde la BD
+        scan = db.session.get(ScanHistory, scan_id)
+        if not scan:
+            return jsonify({'error': 'Escaneo no encontrado'}), 404
+        
+        # Un escaneo que sigue sin terminar pasado SCAN_STALE_AFTER desde su creación
+        # quedó huérfano: no se espera más (así tampoco alargan la espera las reconexiones)
+        deadline = scan.timestamp + timedelta(seconds=current_app.config['SCAN_STALE_AFTER'])
+        
+        def generate():
+            current = scan
+            while current.status not in ScanJobManager.FINAL_STATES:
+                if datetime.utcnow() >= deadline:
+                    scan_jobs.fail_orphaned()
+                    yield format_sse('error', {'scan_id': scan_id, 'error': 'El escaneo no terminó a tiempo'})
+                    return
+                # Sin los puertos en vivo: esperar a que el otro proceso guarde el resultado
+                yield ': keep-alive\n\n'
+                db.session.rollback()  # Libera la conexión y fuerza a releer la fila
+                time.sleep(1)
+                current = db.session.get(ScanHistory, scan_id)
+                if current is None:
+                    return
+            results = current.results or {}
+            done = {
+                'scan_id': current.id,
+                'target': current.target,
+                'port_range': current.port_range,
+                'status': current.status,
+                'progress': 1.0,
+                'duration': current.duration,
+                'timestamp': results.get('timestamp', ''),
+                'summary': results.get('summary'),
+                'error': results.get('error')
+            }
+            index = 0
+            for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+                for port_info in results.get(state, []):
+                    yield format_sse('port', port_info, index)
+                    index += 1
+            yield format_sse('done', done, index)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/api/scan/<int:scan_id>/cancel', methods=['POST'])
+def cancel_scan(scan_id):
+    """Cancela un escaneo en cola o en curso"""
+    job = scan_jobs.cancel(scan_id)
+    if not job:
+        return jsonify({'error': 'Escaneo no encontrado o no gestionado por este servidor'}), 404
+    if job.finished and job.status != 'cancelled':
+        return jsonify({'error': f'El escaneo ya terminó ({job.status})'}), 409
+    return jsonify(job.to_dict())
+
+@api.route('/api/create-checkout-session', methods=['POST'])
 def create_checkout_session():
     """Endpoint para crear una sesión de pago con Stripe y guardar en BD"""
     try:
@@ -205,18 +662,11 @@ def create_checkout_session():
             cancel_url='http://localhost:5173/cancel',
         )
         
-        # Guardar en base de datos
+        # Guardar la donación pendiente antes de responder; si falla, el webhook la crea con los datos del evento
         try:
-            donation_record = DonationHistory(
-                stripe_session_id=checkout_session.id,
-                amount=amount,
-                currency='usd',
-                status='pending'
-            )
-            db.session.add(donation_record)
-            db.session.commit()
+            donation_outbox.record_checkout(checkout_session.id, amount, 'usd')
         except Exception as db_error:
-            print(f"Error saving donation to database: {db_error}")
+            current_app.logger.error('Could not record donation %s: %s', checkout_session.id, db_error)
         
         return jsonify({
             'checkout_url': checkout_session.url,
@@ -226,19 +676,52 @@ def create_checkout_session():
     except Exception as e:
         return jsonify({'error': f'Error creando sesión de pago: {str(e)}'}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    """Webhook de Stripe: actualiza el estado de las donaciones (idempotente)"""
+    if not current_app.config['STRIPE_WEBHOOK_SECRET']:
+        return jsonify({'error': 'STRIPE_WEBHOOK_SECRET no está configurada'}), 503
+    try:
+        event = stripe.Webhook.construct_event(
+            request.get_data(),
+            request.headers.get('Stripe-Signature', ''),
+            current_app.config['STRIPE_WEBHOOK_SECRET']
+        )
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        return jsonify({'error': f'Evento inválido: {str(e)}'}), 400
+    
+    update = status_update_from_event(event)
+    if update is None:
+        return jsonify({'received': True, 'ignored': event['type']})
+    # Se responde cuando el lote está confirmado: si falla, Stripe reintenta la entrega
+    if not donation_outbox.apply_update(update):
+        return jsonify({'error': 'No se pudo guardar el evento'}), 500
+    return jsonify({'received': True, 'status': update['status']})
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
-    """Endpoint de salud para verificar que el servidor está funcionando"""
-    return jsonify({
-        'status': 'healthy',
-        'message': 'CV Project API está funcionando correctamente'
-    })
+    """Endpoint de salud: ida y vuelta real a la base de datos y estado del pool de conexiones"""
+    report, code = pool_monitor.health()
+    messages = {
+        'healthy': 'CV Project API está funcionando correctamente',
+        'degraded': 'CV Project API responde, pero la base de datos va lenta',
+        'unhealthy': 'CV Project API no puede acceder a la base de datos'
+    }
+    report['message'] = messages[report['status']]
+    return jsonify(report), code
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/api/upload-photo', methods=['POST'])
+@api.route('/api/upload-photo', methods=['POST'])
 def upload_photo():
     if 'photo' not in request.files:
         return jsonify({'error': 'No photo part in the request'}), 400
@@ -246,10 +729,10 @@ def upload_photo():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Ensure a unique filename to prevent overwrites
-        # For simplicity, we'll use the original name, but a better approach would be to use UUIDs
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+        # The body was streamed to a temp file while hashing (see upload_store); store it
+        # under its content hash so identical photos share a file and names never collide
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        filename, created = upload_store.save(file, extension)
         
         # Update profile in DB
         profile = Profile.query.first()
@@ -260,17 +743,28 @@ def upload_photo():
                 return jsonify({'error': 'Could not create a default profile.'}), 500
 
         profile.photo_filename = filename
+        profile.photo_variants = None
         db.session.commit()
-        photo_url = f"{request.host_url.rstrip('/')}/uploads/{filename}"
-        return jsonify({'status': 'success', 'message': 'Photo uploaded successfully', 'photo_url': photo_url})
+        cv_cache.invalidate()
+        
+        # Resizing runs in the background; until it finishes the CV serves the original
+        photo_processor.submit(profile.id, filename)
+        urls = photo_urls(profile.to_dict(), uploads_base_url())
+        return jsonify(dict(urls, status='success', message='Photo uploaded successfully',
+                            variants_pending=True, deduplicated=not created))
     else:
         return jsonify({'error': 'File type not allowed'}), 400
 
-@app.route('/uploads/<filename>')
+@api.app_errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Archivo demasiado grande (máximo {current_app.config["UPLOAD_MAX_BYTES"]} bytes)'}), 413
+
+@api.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Immutable caching for content-hash names, ETag revalidation for the rest
+    return upload_server.send(filename)
 
-@app.route('/api/reset-data', methods=['POST'])
+@api.route('/api/reset-data', methods=['POST'])
 def reset_data():
     """Endpoint para limpiar y recargar los datos del CV"""
     try:
@@ -280,6 +774,7 @@ def reset_data():
         Education.query.delete()
         Skill.query.delete()
         db.session.commit()
+        cv_cache.invalidate()
         
         # Create fresh data
         profile = create_default_profile()
@@ -371,6 +866,7 @@ def create_default_profile():
             db.session.add(skill)
         
         db.session.commit()
+        cv_cache.invalidate()
         return profile
         
     except Exception as e:
@@ -378,44 +874,338 @@ def create_default_profile():
         print(f"Error creating default profile: {e}")
         return None
 
-@app.route('/api/scan-history', methods=['GET'])
+HISTORY_MAX_LIMIT = 100
+
+def paginated_response(items, next_cursor):
+    """Lista JSON con el cursor de la siguiente página en X-Next-Cursor y Link"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(dict(request.args, cursor=next_cursor))}>; rel="next"'
+    return response
+
+@api.route('/api/scan-history', methods=['GET'])
 def get_scan_history():
-    """Obtener historial de escaneos"""
+    """Obtener historial de escaneos paginado por cursor (?limit=, ?cursor=, ?fields=)"""
     try:
-        scans = ScanHistory.query.order_by(ScanHistory.timestamp.desc()).limit(10).all()
-        return jsonify([scan.to_dict() for scan in scans])
+        limit = max(1, min(request.args.get('limit', 10, type=int), HISTORY_MAX_LIMIT))
+        fields = parse_fields(request.args.get('fields'), ScanHistory.FIELDS)
+        
+        query = ScanHistory.query
+        if fields is not None and 'scan_results' not in fields:
+            # Las vistas de lista no necesitan el JSON: ni se lee de la BD
+            query = query.options(
+                defer(ScanHistory.scan_results), defer(ScanHistory.scan_results_z), defer(ScanHistory.scan_delta)
+            )
+        else:
+            # Los deltas se reconstruyen desde su snapshot: los de toda la página en una consulta (IN)
+            base_scans = selectinload(ScanHistory.base_scan)
+            if not current_app.config['SCAN_STORE_JSON']:
+                # Las listas de puertos se reconstruyen desde scan_ports: una consulta para toda la página
+                query = query.options(selectinload(ScanHistory.ports))
+                base_scans = base_scans.selectinload(ScanHistory.ports)
+            query = query.options(base_scans)
+        
+        with phase('query'):
+            scans, next_cursor = keyset_page(
+                query, ScanHistory.timestamp, ScanHistory.id,
+                cursor=request.args.get('cursor'), limit=limit
+            )
+        with phase('serialize'):
+            items = [scan.to_dict(fields) for scan in scans]
+        with phase('json'):
+            return paginated_response(items, next_cursor)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Error obteniendo historial: {str(e)}'}), 500
 
-@app.route('/api/donation-history', methods=['GET'])
+@api.route('/api/scan-history/<int:scan_id>', methods=['GET'])
+def get_scan_detail(scan_id):
+    """Detalle completo de un escaneo del historial"""
+    scan = db.session.get(ScanHistory, scan_id)
+    if not scan:
+        return jsonify({'error': 'Escaneo no encontrado'}), 404
+    with phase('serialize'):
+        data = scan.to_dict()
+    with phase('json'):
+        return jsonify(data)
+
+@api.route('/api/ports/<int:port>/history', methods=['GET'])
+def get_port_history(port):
+    """Observaciones de un puerto en los escaneos y la última vez que se vio abierto"""
+    try:
+        protocol = request.args.get('protocol', 'tcp')
+        state = request.args.get('state')
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        query = ScanPort.query.filter(ScanPort.port == port, ScanPort.protocol == protocol)
+        if state:
+            query = query.filter(ScanPort.state == state)
+        observations = query.order_by(ScanPort.observed_at.desc(), ScanPort.id.desc()).limit(limit).all()
+        
+        last_open = ScanPort.query.filter(
+            ScanPort.port == port,
+            ScanPort.protocol == protocol,
+            ScanPort.state == 'open'
+        ).order_by(ScanPort.observed_at.desc(), ScanPort.id.desc()).first()
+        
+        return jsonify({
+            'port': port,
+            'protocol': protocol,
+            'last_open': last_open.to_dict() if last_open else None,
+            'observations': [observation.to_dict() for observation in observations]
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error obteniendo historial del puerto: {str(e)}'}), 500
+
+@api.route('/api/services/<service>/scans', methods=['GET'])
+def get_service_scans(service):
+    """Escaneos en los que se encontró un servicio (por defecto, abierto)"""
+    try:
+        state = request.args.get('state', 'open')
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        
+        observations = ScanPort.query.filter(
+            ScanPort.service == service,
+            ScanPort.state == state
+        ).order_by(ScanPort.observed_at.desc(), ScanPort.id.desc()).limit(limit).all()
+        
+        scans = {}
+        for observation in observations:
+            scans.setdefault(observation.scan_id, {
+                'scan_id': observation.scan_id,
+                'observed_at': observation.observed_at.isoformat() if observation.observed_at else None,
+                'ports': []
+            })['ports'].append(observation.to_port_info())
+        
+        return jsonify({
+            'service': service,
+            'state': state,
+            'scans': list(scans.values())
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error obteniendo escaneos del servicio: {str(e)}'}), 500
+
+@api.route('/api/donation-history', methods=['GET'])
 def get_donation_history():
-    """Obtener historial de donaciones"""
+    """Obtener historial de donaciones paginado por cursor (?limit=, ?cursor=, ?fields=)"""
     try:
-        donations = DonationHistory.query.order_by(DonationHistory.created_at.desc()).limit(10).all()
-        return jsonify([donation.to_dict() for donation in donations])
+        limit = max(1, min(request.args.get('limit', 10, type=int), HISTORY_MAX_LIMIT))
+        fields = parse_fields(request.args.get('fields'), DonationHistory.FIELDS)
+        
+        donations, next_cursor = keyset_page(
+            DonationHistory.query, DonationHistory.created_at, DonationHistory.id,
+            cursor=request.args.get('cursor'), limit=limit
+        )
+        return paginated_response([donation.to_dict(fields) for donation in donations], next_cursor)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Error obteniendo historial: {str(e)}'}), 500
 
+@api.route('/api/donations/stats', methods=['GET'])
+def get_donation_stats():
+    """Totales de donaciones por estado, moneda y día (?since=, ?until= en YYYY-MM-DD, ?currency=, ?status=)"""
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        stats = donation_stats(
+            since=datetime.strptime(since, '%Y-%m-%d').date() if since else None,
+            until=datetime.strptime(until, '%Y-%m-%d').date() if until else None,
+            currency=request.args.get('currency'),
+            status=request.args.get('status')
+        )
+        return jsonify(stats)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error obteniendo estadísticas: {str(e)}'}), 500
+
+@api.route('/api/monitor/ports', methods=['GET'])
+def get_monitored_ports():
+    """Estado y disponibilidad de los puertos vigilados (?window=24h, o ?start=&end= en ISO 8601; sin zona, UTC)"""
+    try:
+        start, end = parse_window(request.args)
+        report = port_availability(port_monitor.target, start, end, ports=port_monitor.ports)
+        services = get_common_ports()
+        return jsonify({
+            'monitor': port_monitor.status(),
+            'target': port_monitor.target,
+            'start': start.isoformat(),
+            'end': min(end, datetime.utcnow()).isoformat(),
+            'ports': [dict(port=port, service=services.get(port), **data) for port, data in report.items()]
+        })
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error obteniendo la disponibilidad: {str(e)}'}), 500
+
+@api.route('/api/monitor/ports/<int:port>', methods=['GET'])
+def get_port_availability(port):
+    """Disponibilidad de un puerto vigilado y sus transiciones en la ventana (?window=, ?start=, ?end=, ?limit=)"""
+    try:
+        start, end = parse_window(request.args)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        report = port_availability(port_monitor.target, start, end, ports=[port])[port]
+        transitions = PortTransition.query.filter(
+            PortTransition.target == port_monitor.target,
+            PortTransition.port == port,
+            PortTransition.changed_at >= start,
+            PortTransition.changed_at < end
+        ).order_by(PortTransition.changed_at.desc(), PortTransition.id.desc()).limit(limit).all()
+        return jsonify(dict(
+            port=port,
+            service=get_common_ports().get(port),
+            target=port_monitor.target,
+            start=start.isoformat(),
+            end=min(end, datetime.utcnow()).isoformat(),
+            history=[transition.to_dict() for transition in transitions],
+            **report
+        ))
+    except ValueError as e:
+        return jsonify({'error': f'Parámetros inválidos: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error obteniendo la disponibilidad: {str(e)}'}), 500
+
+@api.cli.command('init-db')
+def init_db():
+    """Crea el esquema en una base de datos vacía o la migra a la última versión"""
+    inspector = sa.inspect(db.engine)
+    if inspector.has_table('profiles') or inspector.has_table('cv_profiles'):
+        # Base de datos existente: aplicar las migraciones pendientes. Las creadas con
+        # db.create_all() antes de usar migraciones ya tienen "profiles" pero no
+        # alembic_version: se marcan en la revisión base para no repetir el renombrado
+        if inspector.has_table('profiles') and not inspector.has_table('alembic_version'):
+            flask_migrate.stamp(revision=BASELINE_REVISION)
+        flask_migrate.upgrade()
+        click.echo('✅ Esquema migrado a la última versión')
+        # Se ejecuta antes de arrancar el servidor: ningún escaneo queued/running sigue vivo
+        orphaned = scan_jobs.fail_orphaned(older_than=0)
+        if orphaned:
+            click.echo(f'⚠️  {orphaned} escaneos interrumpidos marcados como failed')
+    else:
+        # La primera migración parte de un esquema creado con create_all(), así que
+        # una BD nueva se crea desde los modelos y se marca en la última revisión
+        db.create_all()
+        flask_migrate.stamp()
+        click.echo('✅ Tablas de base de datos creadas')
+
+@api.cli.command('check-cv-queries')
+def check_cv_queries():
+    """Verifica que el ensamblado del CV se resuelva en una sola consulta"""
+    try:
+        cv_data = load_cv_data(check_queries=True)
+    except AssertionError as e:
+        raise click.ClickException(str(e))
+    if cv_data is None:
+        raise click.ClickException('No hay perfil en la base de datos; ejecute POST /api/reset-data primero')
+    click.echo('✅ CV ensamblado en 1 consulta')
+
+@api.cli.command('rebuild-donation-stats')
+@click.option('--check', is_flag=True, help='Solo compara el rollup con donation_history, sin reescribirlo')
+def rebuild_donation_stats_command(check):
+    """Recalcula desde cero las estadísticas de donaciones"""
+    mismatches = rebuild_donation_stats(write=not check)
+    for day, currency, status, stored, actual in mismatches:
+        click.echo(f"{day} {currency} {status}: rollup={stored} real={actual}")
+    if check and mismatches:
+        raise click.ClickException(f'{len(mismatches)} grupos no coinciden con donation_history')
+    click.echo('✅ Rollup de donaciones correcto' if check else f'✅ Rollup reconstruido ({len(mismatches)} grupos corregidos)')
+
+@api.cli.command('compact-scans')
+@click.option('--batch-size', type=int, default=None, help='Filas por lote (por defecto SCAN_COMPACTION_BATCH_SIZE)')
+@click.option('--pause', type=float, default=0.0, help='Segundos de espera entre lotes')
+@click.option('--dry-run', is_flag=True, help='Solo informa de lo que se eliminaría o comprimiría')
+def compact_scans_command(batch_size, pause, dry_run):
+    """Aplica la retención del historial de escaneos y comprime los resultados antiguos"""
+    try:
+        report = compact_scans(
+            full_days=current_app.config['SCAN_RETENTION_FULL_DAYS'],
+            rollup_days=current_app.config['SCAN_RETENTION_ROLLUP_DAYS'],
+            compress_level=current_app.config['SCAN_COMPRESS_LEVEL'] if current_app.config['SCAN_COMPRESS_RESULTS'] else None,
+            store_json=current_app.config['SCAN_STORE_JSON'],
+            batch_size=batch_size or current_app.config['SCAN_COMPACTION_BATCH_SIZE'],
+            pause=pause,
+            dry_run=dry_run,
+            log=click.echo
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report, indent=2))
+
+@api.cli.command('monitor-ports')
+@click.option('--once', is_flag=True, help='Comprobar los puertos una sola vez y mostrar los cambios')
+def monitor_ports_command(once):
+    """Vigila los puertos configurados en primer plano (no necesita MONITOR_ENABLED)"""
+    if once:
+        port_monitor.load_states()
+        for change in port_monitor.probe_once():
+            click.echo(f"{change['port']}: {change['state']}")
+        click.echo(f"{len(port_monitor.ports)} puertos comprobados en {port_monitor.last_probe_ms} ms")
+        return
+    click.echo(f"Vigilando {len(port_monitor.ports)} puertos de {port_monitor.target} cada {port_monitor.interval} s (Ctrl+C para salir)")
+    try:
+        port_monitor.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port_monitor.stop()
+
+@api.cli.command('generate-photo-variants')
+def generate_photo_variants():
+    """Genera (o regenera) las variantes de la foto del perfil actual"""
+    profile = Profile.query.first()
+    if profile is None or not profile.photo_filename:
+        raise click.ClickException('No hay foto de perfil')
+    variants = photo_processor.process(profile.id, profile.photo_filename)
+    if variants is None:
+        raise click.ClickException(f'No se pudieron generar las variantes de {profile.photo_filename}')
+    for name, variant in variants.items():
+        click.echo(f"{name}: {variant['filename']} ({variant['width']}x{variant['height']}, {variant['bytes']} bytes)")
+
+@api.cli.command('gc-uploads')
+@click.option('--grace', type=int, default=3600, help='Antigüedad mínima en segundos de los archivos a borrar')
+@click.option('--dry-run', is_flag=True, help='Solo lista los archivos que se borrarían')
+def gc_uploads(grace, dry_run):
+    """Elimina las subidas que ningún perfil referencia"""
+    report = upload_store.gc(grace_seconds=grace, dry_run=dry_run)
+    for name in report['removed']:
+        click.echo(f"{'(dry-run) ' if dry_run else ''}{name}")
+    click.echo(f"{len(report['removed'])} archivos, {report['bytes_reclaimed']} bytes liberados")
+
 if __name__ == '__main__':
+    # Servidor de desarrollo; en producción: gunicorn -c gunicorn.conf.py wsgi:app
+    app = create_app()
+    
     # Verificar que las variables de entorno estén configuradas
-    if not os.getenv('STRIPE_SECRET_KEY'):
+    if not app.config['STRIPE_SECRET_KEY']:
         print("⚠️  ADVERTENCIA: STRIPE_SECRET_KEY no está configurada en .env")
     
-    # Create tables
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Tablas de base de datos creadas")
-        except Exception as e:
-            print(f"⚠️  Error creando tablas: {e}")
-    
-    print("🚀 Iniciando servidor Flask...")
+    # El esquema ya no se crea al arrancar: flask --app app init-db
+    print("🚀 Iniciando servidor Flask de desarrollo...")
     print("📋 Endpoints disponibles:")
     print("   GET  /api/cv - Obtener datos del CV")
-    print("   POST /api/scan - Escanear puertos con nmap")
+    print("   POST /api/scan - Encolar escaneo de puertos con nmap")
+    print("   GET  /api/scan/<id> - Estado y resultado de un escaneo")
+    print("   GET  /api/scan/<id>/events - Progreso y puertos en vivo (SSE)")
+    print("   GET  /api/scan/<id>/diff - Cambios respecto al escaneo anterior")
+    print("   POST /api/scan/<id>/cancel - Cancelar un escaneo")
     print("   POST /api/create-checkout-session - Crear sesión de pago")
+    print("   POST /api/stripe/webhook - Webhook de Stripe (estado de donaciones)")
     print("   GET  /api/health - Verificar estado del servidor")
-    print("   GET  /api/scan-history - Obtener historial de escaneos")
+    print("   GET  /api/metrics - Métricas en formato Prometheus")
+    print("   GET  /api/scan-history - Obtener historial de escaneos (paginado)")
+    print("   GET  /api/scan-history/<id> - Detalle de un escaneo")
+    print("   GET  /api/ports/<port>/history - Historial de un puerto")
+    print("   GET  /api/services/<service>/scans - Escaneos que encontraron un servicio")
     print("   GET  /api/donation-history - Obtener historial de donaciones")
+    print("   GET  /api/donations/stats - Totales de donaciones por estado, moneda y día")
+    print("   GET  /api/monitor/ports - Estado y disponibilidad de los puertos vigilados")
+    print("   GET  /api/monitor/ports/<port> - Disponibilidad y transiciones de un puerto")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(
+        debug=os.getenv('FLASK_DEBUG', 'True').lower() in ('1', 'true', 'yes'),
+        host='0.0.0.0',
+        port=int(os.getenv('PORT', '5000'))
+    )
@@ -0,0 +1,177 @@
+"""
+Prueba de carga HTTP: peticiones por segundo y latencias de /api/cv y /api/health.
+
+Con --servers arranca cada servidor en un puerto libre, lo mide y lo detiene,
+para comparar el servidor de desarrollo de Werkzeug (python app.py) con
+gunicorn (gunicorn.conf.py, ajustable con WEB_CONCURRENCY, GUNICORN_THREADS...).
+Sin --servers mide el servidor que ya esté escuchando en --url.
+
+Usa la base de datos de DATABASE_URL; ejecute antes `flask --app app init-db`.
+
+Uso (desde backend/):
+    python benchmarks/bench_http.py --servers dev,gunicorn --concurrency 32 --duration 10
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=4 python benchmarks/bench_http.py --servers gunicorn
+    python benchmarks/bench_http.py --url http://localhost:5000 --paths /api/health
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_COMMANDS = {
+    'dev': [sys.executable, 'app.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def wait_until_ready(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    parts = urlsplit(base_url)
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'El servidor terminó al arrancar (código {process.returncode})')
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'El servidor no respondió en {timeout}s')
+
+
+def start_server(name):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='False', GUNICORN_ACCESS_LOG='/dev/null')
+    process = subprocess.Popen(SERVER_COMMANDS[name], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base_url, process)
+    except Exception:
+        process.kill()
+        raise
+    return process, base_url
+
+
+def load(base_url, path, concurrency, duration):
+    """Lanza `concurrency` clientes con keep-alive contra path durante `duration` segundos"""
+    parts = urlsplit(base_url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        local, failed = [], 0
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in (('p50', percentile(latencies, 0.50)),
+                                ('p95', percentile(latencies, 0.95)),
+                                ('p99', percentile(latencies, 0.99)))
+        }
+    }
+
+
+def bench(base_url, args):
+    results = []
+    for path in args.paths.split(','):
+        load(base_url, path, args.concurrency, args.warmup)
+        results.append(load(base_url, path, args.concurrency, args.duration))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Servidor ya arrancado (sin --servers)')
+    parser.add_argument('--servers', default=None,
+                        help=f'Servidores a arrancar y comparar, separados por comas: {", ".join(SERVER_COMMANDS)}')
+    parser.add_argument('--paths', default='/api/cv,/api/health')
+    parser.add_argument('--concurrency', type=int, default=16, help='Clientes simultáneos')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de medida por ruta')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Segundos de calentamiento por ruta')
+    args = parser.parse_args()
+
+    report = {'concurrency': args.concurrency, 'duration': args.duration, 'runs': []}
+    if not args.servers:
+        report['runs'].append({'server': args.url, 'results': bench(args.url, args)})
+    else:
+        for name in args.servers.split(','):
+            if name not in SERVER_COMMANDS:
+                parser.error(f'Servidor desconocido: {name}')
+            process, base_url = start_server(name)
+            try:
+                run = {'server': name, 'results': bench(base_url, args)}
+                if name == 'gunicorn':
+                    run['workers'] = int(os.getenv('WEB_CONCURRENCY', '1'))
+                    run['worker_class'] = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+                    run['threads'] = int(os.getenv('GUNICORN_THREADS', '16'))
+                report['runs'].append(run)
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compara el tiempo real de scan_ports() (un solo proceso nmap) contra
+scan_ports_parallel() (bloques en varios procesos nmap).
+
+Requiere nmap instalado y privilegios para -sS (root o CAP_NET_RAW).
+
+Uso (desde backend/):
+    python benchmarks/bench_nmap_parallel.py
+    python benchmarks/bench_nmap_parallel.py --ranges 1-1000,1-10000 --workers 8 --arguments "-sS -T4"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scan_utils import NMAP_ARGUMENTS, scan_ports, scan_ports_parallel  # noqa: E402
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    results = func(*args, **kwargs)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', default='127.0.0.1')
+    parser.add_argument('--ranges', default='1-1000,1-10000,1-65535',
+                        help='Rangos separados por comas (por defecto 1k, 10k y 65k puertos)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--arguments', default=NMAP_ARGUMENTS, help='Argumentos de nmap para ambos modos')
+    args = parser.parse_args()
+
+    report = {
+        'target': args.target,
+        'arguments': args.arguments,
+        'workers': args.workers,
+        'runs': []
+    }
+
+    for port_range in args.ranges.split(','):
+        single_time, single = timed(scan_ports, args.target, port_range, arguments=args.arguments)
+        parallel_time, parallel = timed(
+            scan_ports_parallel, args.target, port_range,
+            workers=args.workers, chunk_size=args.chunk_size, arguments=args.arguments
+        )
+        report['runs'].append({
+            'port_range': port_range,
+            'single_seconds': round(single_time, 3),
+            'parallel_seconds': round(parallel_time, 3),
+            'speedup': round(single_time / parallel_time, 2) if parallel_time else None,
+            'chunks': parallel.get('scan_info', {}).get('chunks'),
+            'single_summary': single.get('summary') or {'error': single.get('error')},
+            'parallel_summary': parallel.get('summary') or {'error': parallel.get('error')}
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+nmap falso para benchmarks sin red ni privilegios.
+
+Se comporta como el ejecutable nmap que usa python-nmap (`nmap -V` y
+`nmap -oX - <host> -p <rango> ...`) y devuelve XML de nmap, así scan_ports()
+y scan_ports_parallel() recorren el mismo camino que en producción. Los puertos
+salen de una grabación de scan_ports() o se generan:
+
+    FAKE_NMAP_RECORDING  JSON con la salida de scan_ports() a reproducir
+    FAKE_NMAP_OPEN       Puertos abiertos generados sin grabación (por defecto 10)
+    FAKE_NMAP_CLOSED     Puertos cerrados/filtrados listados además (por defecto 0)
+    FAKE_NMAP_LATENCY    Segundos de espera por invocación (por defecto 0)
+
+install_shim() deja un ejecutable "nmap" que apunta a este script en una
+carpeta para anteponerla al PATH. Para grabar una salida real (requiere nmap):
+
+    python benchmarks/fake_nmap.py record 127.0.0.1 1-1000 -o recording.json
+"""
+import json
+import os
+import stat
+import sys
+import time
+from xml.sax.saxutils import quoteattr
+
+# Servicios conocidos para que los puertos generados se parezcan a un escaneo real
+KNOWN_SERVICES = {
+    22: ('ssh', 'OpenSSH', '9.6p1'), 25: ('smtp', 'Postfix smtpd', ''), 53: ('domain', 'dnsmasq', '2.90'),
+    80: ('http', 'nginx', '1.25.3'), 443: ('https', 'nginx', '1.25.3'), 3306: ('mysql', 'MySQL', '8.0.36'),
+    5000: ('http', 'Werkzeug httpd', '3.0.1'), 5432: ('postgresql', 'PostgreSQL DB', '15.6'),
+    6379: ('redis', 'Redis key-value store', '7.2.4'), 8080: ('http-proxy', '', ''),
+}
+
+
+def parse_ports(spec):
+    """Lista de puertos de una especificación de nmap ("1-1000", "22,80,8000-8010")"""
+    ports = []
+    for part in spec.split(','):
+        if '-' in part:
+            start, end = map(int, part.split('-'))
+            ports.extend(range(start, end + 1))
+        elif part:
+            ports.append(int(part))
+    return ports
+
+
+def generated_ports(ports, open_count, closed_count):
+    """Puertos abiertos (conocidos primero, luego repartidos por `ports`, lista o range) y cerrados/filtrados"""
+    chosen = [port for port in KNOWN_SERVICES if port in ports][:open_count]
+    if len(chosen) < open_count and ports:
+        step = max(1, len(ports) // (open_count - len(chosen) + 1))
+        for port in ports[step::step]:
+            if len(chosen) >= open_count:
+                break
+            if port not in chosen:
+                chosen.append(port)
+    result = []
+    for port in sorted(chosen):
+        name, product, version = KNOWN_SERVICES.get(port, ('unknown', '', ''))
+        result.append({'port': port, 'protocol': 'tcp', 'state': 'open',
+                       'name': name, 'product': product, 'version': version, 'extrainfo': ''})
+    taken = set(chosen)
+    for port in ports:
+        if closed_count <= 0:
+            break
+        if port in taken:
+            continue
+        state = 'closed' if port % 2 else 'filtered'
+        result.append({'port': port, 'protocol': 'tcp', 'state': state,
+                       'name': 'unknown', 'product': '', 'version': '', 'extrainfo': ''})
+        closed_count -= 1
+    return result
+
+
+def recorded_ports(path, ports):
+    with open(path) as f:
+        recording = json.load(f)
+    requested = set(ports)
+    return [
+        port_info
+        for state in ('open_ports', 'closed_ports', 'filtered_ports')
+        for port_info in recording.get(state, [])
+        if port_info['port'] in requested
+    ]
+
+
+def render_xml(args, host, port_infos, elapsed):
+    ports_xml = []
+    for info in port_infos:
+        service = (f'<service name={quoteattr(info.get("name") or "unknown")} product={quoteattr(info.get("product") or "")}'
+                   f' version={quoteattr(info.get("version") or "")} extrainfo={quoteattr(info.get("extrainfo") or "")}'
+                   f' conf="10"/>')
+        ports_xml.append(
+            f'<port protocol={quoteattr(info.get("protocol", "tcp"))} portid="{info["port"]}">'
+            f'<state state={quoteattr(info["state"])} reason="syn-ack" reason_ttl="64"/>{service}</port>'
+        )
+    now = int(time.time())
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<nmaprun scanner="nmap" args={quoteattr(" ".join(args))} start="{now}" version="7.94" xmloutputversion="1.05">'
+        '<scaninfo type="syn" protocol="tcp" numservices="0" services=""/>'
+        f'<host><status state="up" reason="localhost-response"/>'
+        f'<address addr={quoteattr(host)} addrtype="ipv4"/>'
+        '<hostnames><hostname name="localhost" type="user"/></hostnames>'
+        f'<ports>{"".join(ports_xml)}</ports></host>'
+        f'<runstats><finished time="{now}" timestr={quoteattr(time.ctime(now))} elapsed="{elapsed:.2f}" exit="success"/>'
+        '<hosts up="1" down="0" total="1"/></runstats></nmaprun>\n'
+    )
+
+
+def run_fake(argv):
+    if '-V' in argv:
+        print('Nmap version 7.94 ( https://nmap.org )')
+        return 0
+
+    start = time.perf_counter()
+    spec = argv[argv.index('-p') + 1] if '-p' in argv else '1-1000'
+    host = next((arg for arg in argv if arg in ('localhost', '127.0.0.1')), '127.0.0.1')
+    ports = parse_ports(spec)
+    latency = float(os.getenv('FAKE_NMAP_LATENCY', '0'))
+    if latency:
+        time.sleep(latency)
+
+    recording = os.getenv('FAKE_NMAP_RECORDING')
+    if recording:
+        port_infos = recorded_ports(recording, ports)
+    else:
+        port_infos = generated_ports(ports, int(os.getenv('FAKE_NMAP_OPEN', '10')),
+                                     int(os.getenv('FAKE_NMAP_CLOSED', '0')))
+    address = '127.0.0.1' if host == 'localhost' else host
+    sys.stdout.write(render_xml(['nmap'] + argv, address, port_infos, time.perf_counter() - start))
+    return 0
+
+
+def record(argv):
+    import argparse
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from scan_utils import NMAP_ARGUMENTS, scan_ports
+
+    parser = argparse.ArgumentParser(prog='fake_nmap.py record')
+    parser.add_argument('target')
+    parser.add_argument('port_range')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--arguments', default=NMAP_ARGUMENTS)
+    args = parser.parse_args(argv)
+    results = scan_ports(args.target, args.port_range, arguments=args.arguments)
+    if 'error' in results:
+        print(results['error'], file=sys.stderr)
+        return 1
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+
+def install_shim(directory):
+    """
+    Crea <directory>/nmap, que ejecuta este script con el Python actual
+
+    Returns:
+        dict: Copia de os.environ con directory al principio del PATH
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'nmap')
+    with open(path, 'w') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return dict(os.environ, PATH=f"{directory}{os.pathsep}{os.environ.get('PATH', '')}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'record':
+        sys.exit(record(sys.argv[2:]))
+    sys.exit(run_fake(sys.argv[1:]))
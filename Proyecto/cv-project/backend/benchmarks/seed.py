@@ -0,0 +1,167 @@
+"""
+Carga volúmenes realistas de ScanHistory (con scan_ports) y DonationHistory para los benchmarks.
+
+Las filas se insertan por lotes con el mismo formato que escribe el backend
+(SCAN_STORE_JSON / SCAN_COMPRESS_RESULTS de la configuración) y al final se
+reconstruye el rollup donation_daily_stats. Usa la base de DATABASE_URL.
+
+Uso (desde backend/):
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --scans 100000 --donations 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_nmap import generated_ports  # noqa: E402
+from models import PORT_STATE_LISTS, db, DonationHistory, ScanHistory, ScanPort  # noqa: E402
+from scan_utils import build_summary  # noqa: E402
+
+PORT_RANGES = ('1-1000', '1-1024', '20-443', '1-10000', '8000-9000')
+TARGETS = ('localhost', '127.0.0.1')
+CURRENCIES = (('usd', 0.8), ('mxn', 0.15), ('eur', 0.05))
+DONATION_STATUSES = (('completed', 0.7), ('pending', 0.15), ('failed', 0.1), ('expired', 0.05))
+
+
+def _weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def fake_results(rng, target, port_range, timestamp, open_ports):
+    """Resultado con el formato de scan_ports() para un escaneo sembrado"""
+    start, end = map(int, port_range.split('-'))
+    ports = range(start, end + 1)
+    port_infos = generated_ports(ports, rng.randint(max(open_ports - 2, 0), open_ports + 2), rng.randint(0, 3))
+    results = {
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'target': target,
+        'port_range': port_range,
+        'scan_info': {'command_line': f'nmap -oX - -p {port_range} -sS -O -A {target}', 'scanstats': {}},
+        'host_info': {'hostname': 'localhost', 'state': 'up', 'protocols': ['tcp']},
+        'open_ports': [],
+        'closed_ports': [],
+        'filtered_ports': []
+    }
+    for port_info in port_infos:
+        results[f"{port_info['state']}_ports"].append(port_info)
+    results['summary'] = build_summary(results)
+    return results
+
+
+def seed_scans(count, open_ports=5, days=365, batch_size=5000, store_json=True, compress_level=6, seed=1):
+    """
+    Inserta `count` escaneos completados repartidos en los últimos `days` días
+
+    Returns:
+        dict: Escaneos y filas de scan_ports insertados
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    inserted = ports_inserted = 0
+    while inserted < count:
+        size = min(batch_size, count - inserted)
+        scan_rows, all_results = [], []
+        for _ in range(size):
+            target = rng.choice(TARGETS)
+            port_range = rng.choice(PORT_RANGES)
+            timestamp = now - timedelta(seconds=rng.randint(0, days * 86400))
+            results = fake_results(rng, target, port_range, timestamp, open_ports)
+            stored = results if store_json else {k: v for k, v in results.items() if k not in PORT_STATE_LISTS}
+            scan_rows.append({
+                'target': target,
+                'port_range': port_range,
+                'profile': 'deep',
+                'status': 'completed',
+                'timestamp': timestamp,
+                'duration': round(rng.uniform(0.5, 60.0), 3),
+                'scan_results': None if compress_level is not None else stored,
+                'scan_results_z': ScanHistory.compress_payload(stored, compress_level) if compress_level is not None else None
+            })
+            all_results.append((results, timestamp))
+
+        ids = db.session.execute(
+            db.insert(ScanHistory).returning(ScanHistory.id, sort_by_parameter_order=True), scan_rows
+        ).scalars().all()
+        port_rows = []
+        for scan_id, (results, timestamp) in zip(ids, all_results):
+            port_rows.extend(ScanPort.rows_from_results(scan_id, results, timestamp))
+        if port_rows:
+            db.session.execute(db.insert(ScanPort), port_rows)
+        db.session.commit()
+        inserted += size
+        ports_inserted += len(port_rows)
+    return {'scans': inserted, 'scan_ports': ports_inserted}
+
+
+def seed_donations(count, days=365, batch_size=10000, seed=1):
+    """Inserta `count` donaciones con estados, monedas e importes variados"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    prefix = f"cs_seed_{int(time.time() * 1000)}"
+    inserted = 0
+    while inserted < count:
+        size = min(batch_size, count - inserted)
+        rows = []
+        for index in range(inserted, inserted + size):
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            status = _weighted(rng, DONATION_STATUSES)
+            rows.append({
+                'stripe_session_id': f"{prefix}_{index}",
+                'amount': rng.choice((100, 500, 1000, 2500, 5000, 10000)),
+                'currency': _weighted(rng, CURRENCIES),
+                'status': status,
+                'created_at': created_at,
+                'completed_at': created_at + timedelta(seconds=rng.randint(5, 600)) if status == 'completed' else None
+            })
+        db.session.execute(db.insert(DonationHistory), rows)
+        db.session.commit()
+        inserted += size
+    return {'donations': inserted}
+
+
+def seed(app, scans=0, donations=0, open_ports=5, days=365, batch_size=5000):
+    """Crea las tablas si faltan y siembra; devuelve el informe con los tiempos"""
+    from donations import rebuild_donation_stats
+
+    report = {}
+    with app.app_context():
+        db.create_all()
+        if scans:
+            start = time.perf_counter()
+            report.update(seed_scans(
+                scans, open_ports=open_ports, days=days, batch_size=batch_size,
+                store_json=app.config['SCAN_STORE_JSON'],
+                compress_level=app.config['SCAN_COMPRESS_LEVEL'] if app.config['SCAN_COMPRESS_RESULTS'] else None
+            ))
+            report['scans_seconds'] = round(time.perf_counter() - start, 2)
+        if donations:
+            start = time.perf_counter()
+            report.update(seed_donations(donations, days=days, batch_size=batch_size * 2))
+            rebuild_donation_stats(write=True)
+            report['donations_seconds'] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scans', type=int, default=10000)
+    parser.add_argument('--donations', type=int, default=10000)
+    parser.add_argument('--open-ports', type=int, default=5, help='Puertos abiertos medios por escaneo')
+    parser.add_argument('--days', type=int, default=365, help='Antigüedad máxima de las filas')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    from app import create_app
+    report = seed(create_app(), scans=args.scans, donations=args.donations,
+                  open_ports=args.open_ports, days=args.days, batch_size=args.batch_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
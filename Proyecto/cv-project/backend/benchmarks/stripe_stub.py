@@ -0,0 +1,125 @@
+"""
+Stub local de la API de Stripe para probar y medir el flujo de donaciones sin red.
+
+Implementa POST /v1/checkout/sessions (lo único que usa el backend) con una
+latencia configurable y, si se indica --webhook-url, envía después al backend
+un evento checkout.session.completed firmado igual que Stripe.
+
+Uso (desde backend/):
+    python benchmarks/stripe_stub.py --port 12111 --latency 0.2 \\
+        --webhook-url http://localhost:5000/api/stripe/webhook --webhook-secret whsec_test
+
+    # en otra terminal
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_stub \\
+    STRIPE_WEBHOOK_SECRET=whsec_test python app.py
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+_ids = itertools.count(1)
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """Cabecera Stripe-Signature (esquema v1: HMAC-SHA256 de "timestamp.payload")"""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def send_webhook(url, secret, session, event_type='checkout.session.completed'):
+    event = {
+        'id': f"evt_stub_{next(_ids)}",
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {'object': dict(session, status='complete', payment_status='paid')}
+    }
+    payload = json.dumps(event)
+    request = urllib.request.Request(url, data=payload.encode(), method='POST', headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': sign_payload(payload, secret)
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except Exception as e:
+        print(f"webhook {session['id']}: {e}")
+        return None
+
+
+def make_handler(args):
+    class StripeStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, como la API real
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            form = parse_qs(self.rfile.read(length).decode())
+            if self.path != '/v1/checkout/sessions':
+                self._reply(404, {'error': {'type': 'invalid_request_error', 'message': f'Unknown path {self.path}'}})
+                return
+
+            if args.latency:
+                time.sleep(args.latency)
+            session_id = f"cs_test_stub_{next(_ids)}"
+            session = {
+                'id': session_id,
+                'object': 'checkout.session',
+                'url': f"https://checkout.stripe.test/pay/{session_id}",
+                'mode': form.get('mode', ['payment'])[0],
+                'amount_total': int(form.get('line_items[0][price_data][unit_amount]', ['0'])[0]),
+                'currency': form.get('line_items[0][price_data][currency]', ['usd'])[0],
+                'status': 'open',
+                'payment_status': 'unpaid'
+            }
+            self._reply(200, session)
+
+            if args.webhook_url:
+                timer = threading.Timer(args.webhook_delay, send_webhook,
+                                        (args.webhook_url, args.webhook_secret, session))
+                timer.daemon = True
+                timer.start()
+
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+    return StripeStubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--latency', type=float, default=0.0, help='Segundos de latencia simulada por petición')
+    parser.add_argument('--webhook-url', default=None, help='Webhook del backend al que enviar el pago completado')
+    parser.add_argument('--webhook-secret', default='whsec_test')
+    parser.add_argument('--webhook-delay', type=float, default=0.5, help='Segundos entre el checkout y el webhook')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"Stripe stub escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Caché LRU en memoria del proceso, con TTL opcional por entrada
+
+    Los contadores (versiones) se guardan aparte para que nunca sean
+    desalojados por el LRU.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+class RedisCache:
+    """
+    Caché compartida entre procesos sobre Redis (dependencia opcional)
+
+    Los valores se serializan como JSON, por lo que deben ser tipos básicos.
+    """
+
+    def __init__(self, url, prefix=''):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('Se requiere el paquete "redis" para usar una caché compartida') from e
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ex = max(1, math.ceil(ttl)) if ttl else None
+        self._client.set(self.prefix + key, json.dumps(value), ex=ex)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + key)
+
+    def get_counter(self, key):
+        raw = self._client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+
+def make_cache(url=None, maxsize=128, prefix=''):
+    """
+    Crea el backend de caché según la URL configurada
+
+    Args:
+        url (str): URL del almacén compartido (ej: "redis://redis:6379/0"); si está vacía se usa LRU en proceso
+        maxsize (int): Número máximo de entradas del LRU en proceso
+        prefix (str): Prefijo de claves para el almacén compartido
+
+    Returns:
+        LRUCache | RedisCache: Backend de caché
+    """
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, prefix=prefix)
+    return LRUCache(maxsize=maxsize)
@@ -0,0 +1,150 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import joinedload
+from models import db, Profile
+
+# Fecha ISO 8601 siempre con microsegundos. datetime.isoformat() los omite cuando
+# son cero, así que _normalize_timestamps la reescribe igual que to_dict(). Las
+# columnas son timestamp sin zona: to_char no depende de la TimeZone de la sesión.
+_PG_ISO = """to_char({col}, 'YYYY-MM-DD"T"HH24:MI:SS.US')"""
+
+# Campos de fecha de cada sección del documento
+_TIMESTAMP_FIELDS = {'profile': ('created_at', 'updated_at'), 'experience': ('created_at',), 'education': ('created_at',)}
+
+# Todo el grafo del perfil en un único documento JSON construido por Postgres
+PG_CV_QUERY = text(f"""
+SELECT json_build_object(
+    'profile', json_build_object(
+        'id', p.id,
+        'name', p.name,
+        'title', p.title,
+        'email', p.email,
+        'phone', p.phone,
+        'location', p.location,
+        'summary', p.summary,
+        'photo_filename', p.photo_filename,
+        'photo_variants', p.photo_variants,
+        'created_at', {_PG_ISO.format(col='p.created_at')},
+        'updated_at', {_PG_ISO.format(col='p.updated_at')}
+    ),
+    'experience', COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', e.id,
+            'company', e.company,
+            'position', e.position,
+            'period', e.period,
+            'location', e.location,
+            'responsibilities', e.responsibilities,
+            'created_at', {_PG_ISO.format(col='e.created_at')}
+        ) ORDER BY e.id)
+        FROM experiences e WHERE e.profile_id = p.id
+    ), '[]'::json),
+    'education', COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', ed.id,
+            'institution', ed.institution,
+            'degree', ed.degree,
+            'period', ed.period,
+            'location', ed.location,
+            'created_at', {_PG_ISO.format(col='ed.created_at')}
+        ) ORDER BY ed.id)
+        FROM educations ed WHERE ed.profile_id = p.id
+    ), '[]'::json),
+    'skills', COALESCE((
+        SELECT json_object_agg(s.category, s.skills_list ORDER BY s.id)
+        FROM skills s WHERE s.profile_id = p.id
+    ), '{{}}'::json)
+)
+FROM profiles p
+ORDER BY p.id
+LIMIT 1
+""")
+
+
+def _normalize_timestamps(document):
+    """Deja las fechas del documento de Postgres con el formato de datetime.isoformat()"""
+    for section, fields in _TIMESTAMP_FIELDS.items():
+        items = document.get(section)
+        for item in (items if isinstance(items, list) else [items] if items else []):
+            for field in fields:
+                if item.get(field):
+                    item[field] = datetime.fromisoformat(item[field]).isoformat()
+    return document
+
+
+def load_cv_data(check_queries=False):
+    """
+    Carga el perfil con experiencias, educación y habilidades en una sola consulta
+
+    En Postgres el documento se arma en el servidor con json_build_object/json_agg;
+    en otros motores (SQLite) se usa un único SELECT con LEFT OUTER JOINs.
+
+    Args:
+        check_queries (bool): Cuenta las sentencias y lanza AssertionError si no es exactamente una
+
+    Returns:
+        dict | None: Estructura del CV (sin URLs de la foto) o None si no hay perfil
+    """
+    if not check_queries:
+        return _load_cv_data()
+    with count_queries(db.engine) as counter:
+        cv_data = _load_cv_data()
+    if counter.count != 1:
+        statements = '\n\n'.join(counter.statements)
+        raise AssertionError(f'El CV usó {counter.count} consultas (se esperaba 1):\n{statements}')
+    return cv_data
+
+
+def _load_cv_data():
+    if db.engine.dialect.name == 'postgresql':
+        document = db.session.execute(PG_CV_QUERY).scalar()
+        if isinstance(document, str):
+            document = json.loads(document)
+        return _normalize_timestamps(document) if document else document
+
+    profile = db.session.execute(
+        select(Profile)
+        .options(
+            joinedload(Profile.experiences),
+            joinedload(Profile.educations),
+            joinedload(Profile.skills)
+        )
+        .order_by(Profile.id)
+        .limit(1)
+    ).unique().scalars().first()
+
+    if not profile:
+        return None
+
+    cv_data = {
+        'profile': profile.to_dict(),
+        'experience': [exp.to_dict() for exp in profile.experiences],
+        'education': [edu.to_dict() for edu in profile.educations],
+        'skills': {}
+    }
+    for skill in profile.skills:
+        cv_data['skills'][skill.category] = skill.skills_list
+    return cv_data
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    """Cuenta las sentencias SQL ejecutadas sobre el engine dentro del bloque"""
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
@@ -0,0 +1,82 @@
+import hashlib
+from flask import current_app, request
+from cache import LRUCache, make_cache
+
+
+class CVCache:
+    """
+    Caché versionada del documento del CV ya serializado
+
+    Cada escritura del CV incrementa la versión, de modo que las entradas
+    anteriores quedan inaccesibles sin tener que borrarlas una a una (también
+    entre procesos cuando el backend es compartido). Con el LRU en proceso la
+    versión es de cada worker y una invalidación solo llega al que la hizo, así
+    que sus entradas caducan a los CV_CACHE_LOCAL_TTL segundos: con varios
+    workers los demás sirven el CV anterior como mucho ese tiempo.
+    """
+
+    VERSION_KEY = 'version'
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_cache(
+            app.config.get('CV_CACHE_URL'),
+            maxsize=app.config.get('CV_CACHE_SIZE', 64),
+            prefix='cv:'
+        )
+        if isinstance(self.backend, LRUCache):
+            self.ttl = app.config.get('CV_CACHE_LOCAL_TTL', 5) or None
+        app.extensions['cv_cache'] = self
+
+    def version(self):
+        try:
+            return self.backend.get_counter(self.VERSION_KEY)
+        except Exception as e:
+            print(f"CV cache error: {e}")
+            return None
+
+    def get(self, variant):
+        """Devuelve la entrada {'etag', 'body'} vigente para la variante, o None"""
+        version = self.version()
+        if version is None:
+            return None
+        try:
+            return self.backend.get(f"{version}:{variant}")
+        except Exception as e:
+            print(f"CV cache error: {e}")
+            return None
+
+    def set(self, variant, body, version):
+        """
+        Guarda el cuerpo serializado bajo la versión leída antes de construirlo,
+        así una invalidación concurrente nunca queda tapada por datos viejos.
+        """
+        entry = {
+            'etag': hashlib.sha256(body.encode('utf-8')).hexdigest()[:32],
+            'body': body
+        }
+        if version is not None:
+            try:
+                self.backend.set(f"{version}:{variant}", entry, ttl=self.ttl)
+            except Exception as e:
+                print(f"CV cache error: {e}")
+        return entry
+
+    def invalidate(self):
+        try:
+            self.backend.incr(self.VERSION_KEY)
+        except Exception as e:
+            print(f"CV cache error: {e}")
+
+    @staticmethod
+    def make_response(entry):
+        """Construye la respuesta con ETag, respondiendo 304 si If-None-Match coincide"""
+        response = current_app.response_class(entry['body'], mimetype='application/json')
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
@@ -0,0 +1,221 @@
+import threading
+import time
+from sqlalchemy import event, exc, text
+from sqlalchemy.pool import QueuePool
+from metrics import Counter, Gauge
+from models import db
+
+# Estado del pool expuesto en /api/metrics: clave de pool_status(), nombre, descripción y tipo
+POOL_METRICS = (
+    ('size', 'cv_db_pool_size', 'Conexiones permanentes del pool', Gauge),
+    ('checked_out', 'cv_db_pool_checked_out', 'Conexiones en uso', Gauge),
+    ('overflow', 'cv_db_pool_overflow', 'Conexiones de overflow abiertas', Gauge),
+    ('checkouts', 'cv_db_pool_checkouts_total', 'Conexiones entregadas por el pool', Counter),
+    ('timeouts', 'cv_db_pool_timeouts_total', 'Esperas por conexión que agotaron DB_POOL_TIMEOUT', Counter),
+    ('connect_errors', 'cv_db_pool_connect_errors_total', 'Errores al abrir conexiones', Counter),
+    ('disconnects', 'cv_db_pool_disconnects_total', 'Conexiones perdidas detectadas al usarlas', Counter),
+)
+
+
+def engine_options(config):
+    """
+    Opciones de create_engine para SQLALCHEMY_ENGINE_OPTIONS a partir de la configuración DB_*
+
+    Args:
+        config (dict): app.config con SQLALCHEMY_DATABASE_URI y las claves DB_POOL_*
+
+    Returns:
+        dict: pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping,
+              la clase de pool con métricas y, en Postgres, los timeouts de conexión y de sentencia
+    """
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') in ('sqlite:', 'sqlite:/')):
+        # SQLite en memoria usa un pool de una sola conexión: no hay nada que ajustar
+        return {}
+
+    options = {
+        'poolclass': MonitoredQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if uri.startswith('postgresql'):
+        connect_args = {'connect_timeout': config['DB_CONNECT_TIMEOUT']}
+        if config['DB_STATEMENT_TIMEOUT_MS']:
+            # Cortar en el servidor las consultas que se eternizan y retienen la conexión
+            connect_args['options'] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+        options['connect_args'] = connect_args
+    return options
+
+
+class PoolStats:
+    """Contadores acumulados del pool desde el arranque del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connect_errors = 0
+        self.connections_opened = 0
+        self.disconnects = 0
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'checkout_wait_max_ms': round(self.wait_max * 1000, 3),
+                'timeouts': self.timeouts,
+                'connect_errors': self.connect_errors,
+                'connections_opened': self.connections_opened,
+                'disconnects': self.disconnects
+            }
+
+
+class MonitoredQueuePool(QueuePool):
+    """
+    QueuePool que mide cuánto tarda cada checkout (espera por una conexión libre,
+    pre-ping o apertura) y cuenta los timeouts por pool agotado y los errores al conectar
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.increment('timeouts')
+            raise
+        except Exception:
+            self.stats.increment('connect_errors')
+            raise
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose() y las desconexiones recrean el pool: conservar los contadores
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class PoolMonitor:
+    """
+    Configura el pool de conexiones desde DB_* y comprueba la salud de la base de datos
+
+    init_app() debe llamarse antes de db.init_app(), que es quien crea el engine.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.slow_ms = app.config.get('HEALTH_DB_SLOW_MS', 250)
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+        app.extensions['pool_monitor'] = self
+
+    def register_events(self):
+        """Engancha los eventos del engine (requiere contexto de aplicación y db.init_app hecho)"""
+        engine = db.engine
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            stats = self._stats(engine.pool)
+            if stats is not None:
+                stats.increment('connections_opened')
+
+        @event.listens_for(engine, 'handle_error')
+        def on_error(context):
+            stats = self._stats(engine.pool)
+            if stats is not None and context.is_disconnect:
+                stats.increment('disconnects')
+
+    @staticmethod
+    def _stats(pool):
+        return getattr(pool, 'stats', None)
+
+    def pool_status(self):
+        """Estado actual del pool (ocupación) más los contadores acumulados"""
+        pool = db.engine.pool
+        status = {'class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            size = pool.size()
+            status.update({
+                'size': size,
+                'max_overflow': pool._max_overflow,
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'capacity': size + max(pool._max_overflow, 0)
+            })
+        stats = self._stats(pool)
+        if stats is not None:
+            status.update(stats.to_dict())
+        return status
+
+    def collect(self):
+        """Métricas del pool para /api/metrics, leídas en el momento de exponerlas"""
+        status = self.pool_status()
+        collected = []
+        for key, name, documentation, metric_class in POOL_METRICS:
+            if key in status:
+                metric = metric_class(name, documentation)
+                metric.inc(status[key])
+                collected.append(metric)
+        stats = self._stats(db.engine.pool)
+        if stats is not None:
+            wait = Counter('cv_db_pool_checkout_wait_seconds_total', 'Tiempo total esperando conexiones del pool')
+            wait.inc(stats.wait_total)
+            collected.append(wait)
+        return collected
+
+    def health(self):
+        """
+        Comprueba que el backend puede servir: ida y vuelta real a la BD y ocupación del pool
+
+        Returns:
+            tuple: (dict con el informe, código HTTP) - 503 si la BD no responde o el
+                   pool está agotado; 200 con status "degraded" si la BD va lenta
+        """
+        pool = self.pool_status()
+        if 'capacity' in pool and pool['checked_out'] >= pool['capacity']:
+            # Con el pool agotado la sonda esperaría DB_POOL_TIMEOUT: no tiene sentido probar
+            database = {'ok': False, 'error': 'Pool de conexiones agotado'}
+            return {'status': 'unhealthy', 'database': database, 'pool': pool}, 503
+
+        start = time.perf_counter()
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            database = {
+                'ok': False,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+                'error': str(e).splitlines()[0]
+            }
+            return {'status': 'unhealthy', 'database': database, 'pool': self.pool_status()}, 503
+
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        status = 'degraded' if latency_ms > self.slow_ms else 'healthy'
+        database = {'ok': True, 'latency_ms': latency_ms}
+        return {'status': status, 'database': database, 'pool': self.pool_status()}, 200
@@ -0,0 +1,386 @@
+import queue
+import threading
+import time
+from datetime import date, datetime
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import IntegrityError
+from models import db, DonationHistory, DonationDailyStat
+
+# Orden de los estados: una donación solo avanza (un evento viejo o repetido no la hace retroceder)
+STATUS_RANK = {'pending': 0, 'failed': 1, 'expired': 1, 'completed': 2}
+
+# Eventos del webhook de Stripe que cambian el estado de una donación
+WEBHOOK_EVENT_STATUS = {
+    'checkout.session.completed': 'completed',
+    'checkout.session.async_payment_succeeded': 'completed',
+    'checkout.session.async_payment_failed': 'failed',
+    'checkout.session.expired': 'expired'
+}
+
+
+def configure_stripe(app):
+    """
+    Configura el cliente de Stripe con un pool de conexiones HTTP reutilizable
+
+    Todas las llamadas comparten una requests.Session (keep-alive y TLS
+    reutilizados) en lugar de abrir una conexión por checkout. STRIPE_API_BASE
+    permite apuntar a un stub local (ver benchmarks/stripe_stub.py).
+    """
+    stripe.api_key = app.config.get('STRIPE_SECRET_KEY')
+    if app.config.get('STRIPE_API_BASE'):
+        stripe.api_base = app.config['STRIPE_API_BASE']
+    stripe.max_network_retries = app.config.get('STRIPE_MAX_RETRIES', 2)
+
+    pool_size = app.config.get('STRIPE_HTTP_POOL_SIZE', 10)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    stripe.default_http_client = stripe.http_client.RequestsClient(
+        timeout=app.config.get('STRIPE_TIMEOUT', 10),
+        session=session
+    )
+
+
+def status_update_from_event(event):
+    """
+    Traduce un evento del webhook a una actualización de donación
+
+    Returns:
+        dict | None: {'stripe_session_id', 'status', 'completed_at', 'amount', 'currency'}
+                     o None si el evento no afecta a las donaciones
+    """
+    status = WEBHOOK_EVENT_STATUS.get(event['type'])
+    if status is None:
+        return None
+    session = event['data']['object']
+    return {
+        'stripe_session_id': session['id'],
+        'status': status,
+        'completed_at': datetime.utcfromtimestamp(event['created']) if status == 'completed' else None,
+        'amount': session.get('amount_total'),
+        'currency': session.get('currency') or 'usd'
+    }
+
+
+class DonationOutbox:
+    """
+    Escrituras de donaciones: altas en la petición y cambios de estado por lotes
+
+    El checkout guarda la donación pending (y su rollup) en su propia
+    transacción antes de responder, así una caída o un reciclado del worker no
+    la pierde. Los cambios de estado del webhook se encolan y un hilo los agrupa
+    en lotes de hasta DONATION_OUTBOX_BATCH_SIZE escritos en una sola
+    transacción; un lote que falla se reintenta DONATION_OUTBOX_RETRIES veces
+    con espera exponencial. El webhook espera a que su lote se confirme, así
+    Stripe reintenta la entrega si aun así no se pudo escribir.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('DONATION_OUTBOX_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('DONATION_OUTBOX_FLUSH_INTERVAL', 0.05)
+        self.retries = app.config.get('DONATION_OUTBOX_RETRIES', 3)
+        self.retry_backoff = app.config.get('DONATION_OUTBOX_RETRY_BACKOFF', 0.1)
+        self._queue = queue.Queue(maxsize=app.config.get('DONATION_OUTBOX_SIZE', 10000))
+        app.extensions['donation_outbox'] = self
+
+    def _ensure_worker(self):
+        # El hilo se arranca con el primer uso (no al importar, por si el servidor hace fork)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='donation-outbox', daemon=True)
+                self._thread.start()
+
+    def record_checkout(self, stripe_session_id, amount, currency='usd'):
+        """Guarda la donación pendiente y su rollup en una transacción (debe llamarse con contexto de app)"""
+        item = {
+            'stripe_session_id': stripe_session_id,
+            'amount': amount,
+            'currency': currency,
+            'status': 'pending',
+            'created_at': datetime.utcnow()
+        }
+        try:
+            self._write_batch([('insert', item, None)])
+            db.session.commit()
+        except IntegrityError:
+            # El webhook ya la creó entre la lectura y el INSERT
+            db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def apply_update(self, update, timeout=10):
+        """
+        Encola un cambio de estado y espera a que su lote se confirme
+
+        Returns:
+            bool: True si se escribió (o ya estaba aplicado), False si falló o expiró
+        """
+        self._ensure_worker()
+        done = {'event': threading.Event(), 'ok': False}
+        self._queue.put(('update', update, done), timeout=timeout)
+        done['event'].wait(timeout)
+        return done['ok']
+
+    def flush(self, timeout=10):
+        """Espera a que se escriba todo lo encolado hasta ahora"""
+        return self.apply_update(None, timeout=timeout)
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            ok = self._write_with_retries(batch)
+            for _, _, done in batch:
+                if done is not None:
+                    done['ok'] = ok
+                    done['event'].set()
+
+    def _write_with_retries(self, batch):
+        for attempt in range(self.retries + 1):
+            with self.app.app_context():
+                try:
+                    self._write_batch(batch)
+                    db.session.commit()
+                    return True
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.warning('Error writing donation batch (%d items, attempt %d/%d): %s',
+                                            len(batch), attempt + 1, self.retries + 1, e)
+            if attempt < self.retries:
+                time.sleep(self.retry_backoff * 2 ** attempt)
+        self.app.logger.error('Donation batch dropped after %d attempts; Stripe will redeliver its webhooks',
+                              self.retries + 1)
+        return False
+
+    def _write_batch(self, batch):
+        inserts = {item['stripe_session_id']: item for kind, item, _ in batch if kind == 'insert'}
+        updates = {}
+        for kind, item, _ in batch:
+            if kind != 'update' or item is None:
+                continue
+            # De varios eventos de la misma sesión en el lote gana el estado más avanzado
+            current = updates.get(item['stripe_session_id'])
+            if current is None or STATUS_RANK[item['status']] >= STATUS_RANK[current['status']]:
+                updates[item['stripe_session_id']] = item
+
+        session_ids = set(inserts) | set(updates)
+        if not session_ids:
+            return
+        # FOR UPDATE: con varios procesos, el estado leído es el que se modifica (y el rollup cuadra)
+        existing = {
+            row.stripe_session_id: row
+            for row in db.session.execute(
+                db.select(DonationHistory.stripe_session_id, DonationHistory.status, DonationHistory.amount,
+                          DonationHistory.currency, DonationHistory.created_at)
+                .where(DonationHistory.stripe_session_id.in_(session_ids))
+                .with_for_update()
+            )
+        }
+        rollup = RollupDelta()
+
+        # Altas: las repetidas (reintentos) se ignoran; el webhook puede crear las que se perdieron
+        new_rows = [item for session_id, item in inserts.items() if session_id not in existing]
+        for session_id, update in updates.items():
+            if session_id not in existing and session_id not in inserts and update.get('amount') is not None:
+                new_rows.append({
+                    'stripe_session_id': session_id,
+                    'amount': update['amount'],
+                    'currency': update['currency'],
+                    'status': 'pending',
+                    'created_at': datetime.utcnow()
+                })
+        if new_rows:
+            db.session.execute(db.insert(DonationHistory), new_rows)
+        for row in new_rows:
+            rollup.add(row['created_at'], row['currency'], 'pending', row['amount'])
+        rows = dict(existing)
+        rows.update((row['stripe_session_id'], _RowState(**row)) for row in new_rows)
+
+        # Cambios de estado: un UPDATE con executemany por estado destino, solo hacia delante
+        applied = [
+            update for session_id, update in updates.items()
+            if session_id in rows and STATUS_RANK[update['status']] > STATUS_RANK[rows[session_id].status]
+        ]
+        table = DonationHistory.__table__
+        for status in {update['status'] for update in applied}:
+            lower = [name for name, rank in STATUS_RANK.items() if rank < STATUS_RANK[status]]
+            params = [
+                {'sid': update['stripe_session_id'], 'new_status': update['status'],
+                 'new_completed_at': update['completed_at']}
+                for update in applied if update['status'] == status
+            ]
+            db.session.execute(
+                table.update()
+                .where(table.c.stripe_session_id == bindparam('sid'), db.or_(*(table.c.status == name for name in lower)))
+                .values(status=bindparam('new_status'), completed_at=bindparam('new_completed_at')),
+                params
+            )
+        for update in applied:
+            row = rows[update['stripe_session_id']]
+            rollup.move(row.created_at, row.currency, row.status, update['status'], row.amount)
+
+        # El rollup se actualiza en la misma transacción que las donaciones
+        rollup.apply()
+
+
+class _RowState:
+    """Estado de una donación recién insertada, con los mismos atributos que las filas leídas"""
+
+    def __init__(self, stripe_session_id, amount, currency, status, created_at):
+        self.stripe_session_id = stripe_session_id
+        self.amount = amount
+        self.currency = currency
+        self.status = status
+        self.created_at = created_at
+
+
+class RollupDelta:
+    """Cambios acumulados en donation_daily_stats por (día, moneda, estado)"""
+
+    def __init__(self):
+        self.deltas = {}
+
+    def add(self, created_at, currency, status, amount, sign=1):
+        key = (created_at.date(), currency or 'usd', status)
+        count, total = self.deltas.get(key, (0, 0))
+        self.deltas[key] = (count + sign, total + sign * (amount or 0))
+
+    def move(self, created_at, currency, old_status, new_status, amount):
+        self.add(created_at, currency, old_status, amount, sign=-1)
+        self.add(created_at, currency, new_status, amount)
+
+    def apply(self):
+        """Upsert de los cambios (INSERT ... ON CONFLICT DO UPDATE en Postgres y SQLite)"""
+        rows = [
+            {'day': day, 'currency': currency, 'status': status, 'count': count, 'amount': amount}
+            for (day, currency, status), (count, amount) in self.deltas.items()
+            if count or amount
+        ]
+        if not rows:
+            return
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(DonationDailyStat.__table__)
+        table = DonationDailyStat.__table__
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=['day', 'currency', 'status'],
+                set_={'count': table.c.count + stmt.excluded.count, 'amount': table.c.amount + stmt.excluded.amount}
+            ),
+            rows
+        )
+
+
+def rebuild_donation_stats(write=True):
+    """
+    Recalcula donation_daily_stats desde donation_history con un GROUP BY
+
+    Args:
+        write (bool): Si es False no modifica nada y solo compara
+
+    Returns:
+        list: Diferencias [(día, moneda, estado, (count, amount) guardado, (count, amount) real)]
+    """
+    day = func.date(DonationHistory.created_at)
+    actual = {
+        (_as_date(row.day), row.currency or 'usd', row.status): (row.count, int(row.amount or 0))
+        for row in db.session.execute(
+            db.select(day.label('day'), DonationHistory.currency, DonationHistory.status,
+                      func.count(DonationHistory.id).label('count'), func.sum(DonationHistory.amount).label('amount'))
+            .group_by(day, DonationHistory.currency, DonationHistory.status)
+        )
+    }
+    stored = {
+        (stat.day, stat.currency, stat.status): (stat.count, stat.amount)
+        for stat in DonationDailyStat.query.all()
+        if stat.count or stat.amount
+    }
+    mismatches = [
+        (key[0].isoformat(), key[1], key[2], stored.get(key, (0, 0)), actual.get(key, (0, 0)))
+        for key in sorted(set(actual) | set(stored))
+        if stored.get(key, (0, 0)) != actual.get(key, (0, 0))
+    ]
+
+    if write:
+        DonationDailyStat.query.delete()
+        db.session.add_all(
+            DonationDailyStat(day=key[0], currency=key[1], status=key[2], count=count, amount=amount)
+            for key, (count, amount) in actual.items()
+        )
+        db.session.commit()
+    return mismatches
+
+
+def _as_date(value):
+    # func.date() devuelve date en Postgres y texto "YYYY-MM-DD" en SQLite
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def donation_stats(since=None, until=None, currency=None, status=None):
+    """
+    Totales de donaciones leídos del rollup (nunca de donation_history)
+
+    Args:
+        since (date): Primer día incluido
+        until (date): Último día incluido
+        currency (str): Filtrar por moneda
+        status (str): Filtrar por estado
+
+    Returns:
+        dict: totals (número por estado), by_currency (número e importe por
+              estado) y by_day (una entrada por día, moneda y estado)
+    """
+    query = DonationDailyStat.query.filter(DonationDailyStat.count != 0)
+    if since:
+        query = query.filter(DonationDailyStat.day >= since)
+    if until:
+        query = query.filter(DonationDailyStat.day <= until)
+    if currency:
+        query = query.filter(DonationDailyStat.currency == currency.lower())
+    if status:
+        query = query.filter(DonationDailyStat.status == status)
+    stats = query.order_by(DonationDailyStat.day, DonationDailyStat.currency, DonationDailyStat.status).all()
+
+    totals = {'count': 0, 'by_status': {}}
+    by_currency = {}
+    for stat in stats:
+        totals['count'] += stat.count
+        totals['by_status'][stat.status] = totals['by_status'].get(stat.status, 0) + stat.count
+        # Los importes solo se suman dentro de una misma moneda
+        entry = by_currency.setdefault(stat.currency, {'count': 0, 'amount': 0, 'by_status': {}})
+        entry['count'] += stat.count
+        entry['amount'] += stat.amount
+        bucket = entry['by_status'].setdefault(stat.status, {'count': 0, 'amount': 0})
+        bucket['count'] += stat.count
+        bucket['amount'] += stat.amount
+
+    return {
+        'totals': totals,
+        'by_currency': by_currency,
+        'by_day': [stat.to_dict() for stat in stats]
+    }
@@ -0,0 +1,58 @@
+"""
+Configuración de gunicorn (gunicorn -c gunicorn.conf.py wsgi:app)
+
+Todo se ajusta con variables de entorno:
+
+    WEB_CONCURRENCY        Procesos worker (por defecto 1, ver abajo; sin
+                           CV_CACHE_URL cada uno tiene su caché del CV, ver
+                           CV_CACHE_LOCAL_TTL)
+    GUNICORN_THREADS       Hilos por worker con gthread (por defecto 16)
+    GUNICORN_WORKER_CLASS  gthread (por defecto) o gevent para muchas conexiones
+                           SSE de /api/scan/<id>/events abiertas a la vez
+                           (requiere `pip install gevent`)
+    GUNICORN_WORKER_CONNECTIONS  Conexiones simultáneas por worker con gevent
+    GUNICORN_TIMEOUT       Segundos sin respuesta del worker antes de reiniciarlo
+    GUNICORN_BIND          Dirección de escucha (por defecto 0.0.0.0:5000)
+
+Los escaneos en curso viven en la memoria del worker que los recibió: con
+varios workers, /api/scan/<id> y /events los leen de la BD desde los demás
+(sin eventos en vivo) y /cancel solo funciona en el worker dueño del escaneo.
+Por eso el valor por defecto es un único worker con muchos hilos; suba
+WEB_CONCURRENCY solo si acepta esas limitaciones.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# Con gthread el timeout solo vigila que el worker siga vivo: las respuestas SSE
+# largas no lo disparan. Con gevent, igual mientras el stream envíe keep-alives.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Reciclar workers de vez en cuando limita el crecimiento de memoria (0 = nunca)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+# La aplicación se importa una vez en el proceso maestro y los workers la heredan
+# al hacer fork: arranque más rápido y memoria compartida. create_app() no abre
+# conexiones ni lanza hilos, así que es seguro.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() in ('1', 'true', 'yes')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Por si el maestro llegó a abrir conexiones: cada worker crea las suyas
+    from wsgi import app
+    from models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,265 @@
+import bisect
+import threading
+import time
+from flask import g, request
+from sqlalchemy import event
+
+# Límites de los histogramas, en segundos
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SCAN_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Tamaños de rango de puertos para etiquetar los escaneos sin disparar la cardinalidad
+PORT_RANGE_SIZES = ((100, '1-100'), (1000, '101-1000'), (10000, '1001-10000'), (65535, '10001-65535'))
+
+
+def port_range_size(port_range):
+    """Clase de tamaño de un rango "inicio-fin" (ej: "22-443" -> "101-1000")"""
+    try:
+        start, end = map(int, port_range.split('-'))
+    except (AttributeError, ValueError):
+        return 'unknown'
+    count = end - start + 1
+    for limit, label in PORT_RANGE_SIZES:
+        if count <= limit:
+            return label
+    return PORT_RANGE_SIZES[-1][1]
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            # Sin etiquetas la serie existe desde el principio (0 en vez de ausente)
+            self._values[()] = 0
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+            for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        # Un contador por cubeta (no acumulado): observe() solo toca una posición
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, ("le", _format_value(float(bound))))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas con exposición en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() -> lista de métricas con sus valores al momento de exponerlas"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """
+    Métricas del backend para /api/metrics
+
+    Mide cada petición por regla de URL (no por ruta concreta, para acotar las
+    series), las consultas SQL mediante eventos del engine, los escaneos al
+    terminar (ScanJobManager) y los bytes subidos (UploadStore). Cada
+    observación es un bisect y una suma bajo un lock, así que puede quedarse
+    activa en /api/cv. Los valores son por proceso.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.registry = MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter('cv_http_requests_total', 'Peticiones HTTP atendidas', ('route', 'method', 'status'))
+        self.request_latency = r.histogram('cv_http_request_duration_seconds', 'Tiempo hasta devolver la respuesta',
+                                           ('route', 'method'))
+        self.in_flight = r.gauge('cv_http_requests_in_flight', 'Peticiones en curso', ('route',))
+        self.scans = r.counter('cv_scans_total', 'Escaneos terminados', ('engine', 'status'))
+        self.scan_duration = r.histogram('cv_scan_duration_seconds', 'Duración de los escaneos',
+                                         ('engine', 'port_range_size', 'status'), buckets=SCAN_BUCKETS)
+        self.nmap_failures = r.counter('cv_nmap_failures_total', 'Escaneos con nmap que terminaron con error')
+        self.db_queries = r.histogram('cv_db_query_duration_seconds', 'Duración de las consultas SQL',
+                                      ('operation',), buckets=DB_BUCKETS)
+        self.db_errors = r.counter('cv_db_errors_total', 'Consultas SQL que fallaron')
+        self.uploads = r.counter('cv_uploads_total', 'Fotos subidas', ('deduplicated',))
+        self.upload_bytes = r.counter('cv_upload_bytes_total', 'Bytes recibidos en subidas de fotos')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+            app.teardown_request(self._teardown_request)
+        app.extensions['metrics'] = self
+
+    def register_engine(self, engine):
+        """Mide las consultas del engine (llamar con el engine ya creado)"""
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._metrics_start = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, '_metrics_start', None)
+            if start is not None:
+                operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+                if operation not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+                    operation = 'OTHER'
+                self.db_queries.observe(time.perf_counter() - start, (operation,))
+
+        @event.listens_for(engine, 'handle_error')
+        def handle_error(context):
+            self.db_errors.inc()
+
+    @staticmethod
+    def _route():
+        rule = request.url_rule
+        return rule.rule if rule is not None else '<unmatched>'
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_route = self._route()
+        self.in_flight.inc(labels=(g._metrics_route,))
+
+    def _after_request(self, response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            route = g._metrics_route
+            self.request_latency.observe(time.perf_counter() - start, (route, request.method))
+            self.requests.inc(labels=(route, request.method, str(response.status_code)))
+        return response
+
+    def _teardown_request(self, exc=None):
+        route = g.pop('_metrics_route', None)
+        if route is not None:
+            self.in_flight.dec(labels=(route,))
+
+    def observe_scan(self, job):
+        """Registra un escaneo terminado (lo llama ScanJobManager)"""
+        if not self.enabled:
+            return
+        self.scans.inc(labels=(job.engine, job.status))
+        if job.duration is not None:
+            self.scan_duration.observe(job.duration, (job.engine, port_range_size(job.port_range), job.status))
+        if job.status == 'failed' and job.engine == 'nmap':
+            self.nmap_failures.inc()
+
+    def observe_upload(self, size, created):
+        if not self.enabled:
+            return
+        self.uploads.inc(labels=('false' if created else 'true',))
+        self.upload_bytes.inc(size)
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,35 @@
+"""Store SQL NULL in scan_history JSON columns and drop the duplicate timestamp index
+
+Revision ID: 1c5e8f3a7d29
+Revises: f0c4d9a2b718
+Create Date: 2026-10-17 16:05:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c5e8f3a7d29'
+down_revision = 'f0c4d9a2b718'
+branch_labels = None
+depends_on = None
+
+scan_history = sa.table('scan_history', sa.column('scan_results', sa.JSON), sa.column('scan_delta', sa.JSON))
+
+
+def upgrade():
+    # 9d3e6b1a4c27 added ix_scan_history_timestamp next to idx_scan_history_timestamp from init.sql
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_scan_history_timestamp', if_exists=True)
+        batch_op.create_index('idx_scan_history_timestamp', ['timestamp'], unique=False, if_not_exists=True)
+
+    # Compressed, delta and rematerialized rows were saved with a JSON 'null' instead of SQL NULL
+    for column in (scan_history.c.scan_results, scan_history.c.scan_delta):
+        op.execute(scan_history.update().where(sa.cast(column, sa.Text) == 'null').values({column.name: sa.null()}))
+
+
+def downgrade():
+    # SQL NULL reads back the same as JSON 'null'; put back the index that 9d3e6b1a4c27 drops on downgrade
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.create_index('ix_scan_history_timestamp', ['timestamp'], unique=False, if_not_exists=True)
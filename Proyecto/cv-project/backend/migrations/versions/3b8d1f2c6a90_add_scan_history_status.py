@@ -0,0 +1,29 @@
+"""Add status to scan_history and make scan_results nullable
+
+Revision ID: 3b8d1f2c6a90
+Revises: 7e93130661f1
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8d1f2c6a90'
+down_revision = '7e93130661f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False, server_default='completed'))
+        batch_op.alter_column('scan_results', existing_type=sa.JSON(), nullable=True)
+
+
+def downgrade():
+    op.execute("DELETE FROM scan_history WHERE scan_results IS NULL")
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.alter_column('scan_results', existing_type=sa.JSON(), nullable=False)
+        batch_op.drop_column('status')
@@ -0,0 +1,30 @@
+"""Add upload_blobs table to track when each upload was last stored or reused
+
+Revision ID: 4b9e2d7c1f63
+Revises: 1c5e8f3a7d29
+Create Date: 2026-10-17 18:42:10.553912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b9e2d7c1f63'
+down_revision = '1c5e8f3a7d29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing files have no row: gc-uploads keeps using their mtime until they are stored again
+    op.create_table('upload_blobs',
+        sa.Column('filename', sa.String(length=100), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('last_referenced_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('filename')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_blobs')
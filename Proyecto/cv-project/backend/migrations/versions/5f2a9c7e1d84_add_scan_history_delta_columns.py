@@ -0,0 +1,34 @@
+"""Add delta storage columns to scan_history
+
+Revision ID: 5f2a9c7e1d84
+Revises: c41e7a9d2b53
+Create Date: 2026-10-17 11:58:20.174530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2a9c7e1d84'
+down_revision = 'c41e7a9d2b53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('base_scan_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('scan_delta', sa.JSON(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_scan_history_base_scan_id'), ['base_scan_id'], unique=False)
+        batch_op.create_foreign_key('fk_scan_history_base_scan_id', 'scan_history', ['base_scan_id'], ['id'])
+
+
+def downgrade():
+    # Deltas cannot be represented without these columns: drop them first
+    op.execute("DELETE FROM scan_history WHERE base_scan_id IS NOT NULL")
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_scan_history_base_scan_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_scan_history_base_scan_id'))
+        batch_op.drop_column('scan_delta')
+        batch_op.drop_column('base_scan_id')
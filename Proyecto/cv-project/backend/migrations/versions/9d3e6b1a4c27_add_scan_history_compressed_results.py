@@ -0,0 +1,50 @@
+"""Add compressed results column and timestamp index to scan_history
+
+Revision ID: 9d3e6b1a4c27
+Revises: 5f2a9c7e1d84
+Create Date: 2026-10-17 12:41:07.582310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+import zlib
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3e6b1a4c27'
+down_revision = '5f2a9c7e1d84'
+branch_labels = None
+depends_on = None
+
+scan_history = sa.table(
+    'scan_history',
+    sa.column('id', sa.Integer),
+    sa.column('scan_results', sa.JSON),
+    sa.column('scan_results_z', sa.LargeBinary)
+)
+
+
+def upgrade():
+    # Existing rows keep their JSON; `flask compact-scans` compresses them in batches
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('scan_results_z', sa.LargeBinary(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_scan_history_timestamp'), ['timestamp'], unique=False)
+
+
+def downgrade():
+    # Decompress rows back into scan_results before dropping the column
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(scan_history.c.id, scan_history.c.scan_results_z).where(scan_history.c.scan_results_z.isnot(None))
+    ).fetchall()
+    for scan_id, blob in rows:
+        bind.execute(
+            scan_history.update()
+            .where(scan_history.c.id == scan_id)
+            .values(scan_results=json.loads(zlib.decompress(blob)))
+        )
+
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_scan_history_timestamp'))
+        batch_op.drop_column('scan_results_z')
@@ -0,0 +1,26 @@
+"""Add photo_variants to profiles
+
+Revision ID: a7c4e2f91b36
+Revises: 9d3e6b1a4c27
+Create Date: 2026-10-17 13:05:44.918204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2f91b36'
+down_revision = '9d3e6b1a4c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('profiles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('photo_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('profiles', schema=None) as batch_op:
+        batch_op.drop_column('photo_variants')
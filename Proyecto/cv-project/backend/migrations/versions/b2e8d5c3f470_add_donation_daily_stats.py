@@ -0,0 +1,42 @@
+"""Add donation_daily_stats rollup table
+
+Revision ID: b2e8d5c3f470
+Revises: a7c4e2f91b36
+Create Date: 2026-10-17 13:52:16.330587
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8d5c3f470'
+down_revision = 'a7c4e2f91b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('donation_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'currency', 'status', name='uq_donation_daily_stats_bucket')
+    )
+
+    # Backfill from the existing donations in a single INSERT ... SELECT
+    op.execute("""
+        INSERT INTO donation_daily_stats (day, currency, status, count, amount)
+        SELECT DATE(created_at), COALESCE(currency, 'usd'), status, COUNT(*), SUM(amount)
+        FROM donation_history
+        WHERE created_at IS NOT NULL
+        GROUP BY DATE(created_at), COALESCE(currency, 'usd'), status
+    """)
+
+
+def downgrade():
+    op.drop_table('donation_daily_stats')
@@ -0,0 +1,102 @@
+"""Add scan_ports table with per-port observations and backfill it
+
+Revision ID: c41e7a9d2b53
+Revises: 3b8d1f2c6a90
+Create Date: 2026-10-17 11:04:52.907113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a9d2b53'
+down_revision = '3b8d1f2c6a90'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 500
+
+scan_history = sa.table(
+    'scan_history',
+    sa.column('id', sa.Integer),
+    sa.column('timestamp', sa.DateTime),
+    sa.column('scan_results', sa.JSON)
+)
+
+scan_ports = sa.table(
+    'scan_ports',
+    sa.column('scan_id', sa.Integer),
+    sa.column('port', sa.Integer),
+    sa.column('protocol', sa.String),
+    sa.column('state', sa.String),
+    sa.column('service', sa.String),
+    sa.column('product', sa.String),
+    sa.column('version', sa.String),
+    sa.column('extrainfo', sa.String),
+    sa.column('observed_at', sa.DateTime)
+)
+
+
+def upgrade():
+    op.create_table('scan_ports',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('scan_id', sa.Integer(), nullable=False),
+        sa.Column('port', sa.Integer(), nullable=False),
+        sa.Column('protocol', sa.String(length=10), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=False),
+        sa.Column('service', sa.String(length=100), nullable=True),
+        sa.Column('product', sa.String(length=200), nullable=True),
+        sa.Column('version', sa.String(length=100), nullable=True),
+        sa.Column('extrainfo', sa.String(length=200), nullable=True),
+        sa.Column('observed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['scan_id'], ['scan_history.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scan_ports', schema=None) as batch_op:
+        batch_op.create_index('idx_scan_ports_port_state_observed_at', ['port', 'state', 'observed_at'], unique=False)
+        batch_op.create_index('idx_scan_ports_service_state', ['service', 'state'], unique=False)
+        batch_op.create_index('idx_scan_ports_observed_at', ['observed_at'], unique=False)
+        batch_op.create_index('idx_scan_ports_scan_id', ['scan_id'], unique=False)
+
+    # Backfill from the JSON blobs, walking scan_history by id in batches
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            sa.select(scan_history.c.id, scan_history.c.timestamp, scan_history.c.scan_results)
+            .where(scan_history.c.id > last_id)
+            .order_by(scan_history.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not batch:
+            break
+
+        rows = []
+        for scan_id, timestamp, results in batch:
+            for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+                for port_info in (results or {}).get(state, []):
+                    rows.append({
+                        'scan_id': scan_id,
+                        'port': port_info['port'],
+                        'protocol': port_info['protocol'],
+                        'state': port_info['state'],
+                        'service': port_info.get('name') or None,
+                        'product': port_info.get('product') or None,
+                        'version': port_info.get('version') or None,
+                        'extrainfo': port_info.get('extrainfo') or None,
+                        'observed_at': timestamp
+                    })
+        if rows:
+            connection.execute(scan_ports.insert(), rows)
+        last_id = batch[-1][0]
+
+
+def downgrade():
+    with op.batch_alter_table('scan_ports', schema=None) as batch_op:
+        batch_op.drop_index('idx_scan_ports_scan_id')
+        batch_op.drop_index('idx_scan_ports_observed_at')
+        batch_op.drop_index('idx_scan_ports_service_state')
+        batch_op.drop_index('idx_scan_ports_port_state_observed_at')
+
+    op.drop_table('scan_ports')
@@ -0,0 +1,27 @@
+"""Add scan profile column to scan_history
+
+Revision ID: e6a1f3b8c925
+Revises: b2e8d5c3f470
+Create Date: 2026-10-17 14:36:52.904113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a1f3b8c925'
+down_revision = 'b2e8d5c3f470'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows stay null: the engine they ran with (nmap or connect) was not recorded
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('scan_history', schema=None) as batch_op:
+        batch_op.drop_column('profile')
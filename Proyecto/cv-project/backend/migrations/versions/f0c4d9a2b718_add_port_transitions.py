@@ -0,0 +1,34 @@
+"""Add port_transitions table for the port monitor
+
+Revision ID: f0c4d9a2b718
+Revises: e6a1f3b8c925
+Create Date: 2026-10-17 15:18:04.271936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f0c4d9a2b718'
+down_revision = 'e6a1f3b8c925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('port_transitions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('target', sa.String(length=50), nullable=False),
+        sa.Column('port', sa.Integer(), nullable=False),
+        sa.Column('state', sa.String(length=10), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_port_transitions_target_port_changed_at', 'port_transitions',
+                    ['target', 'port', 'changed_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_port_transitions_target_port_changed_at', table_name='port_transitions')
+    op.drop_table('port_transitions')
@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
+import zlib
+from scan_diff import PORT_STATE_LISTS, make_delta, apply_delta
 
 db = SQLAlchemy()
 
@@ -14,13 +17,14 @@ class Profile(db.Model):
     location = db.Column(db.String(100), nullable=False)
     summary = db.Column(db.Text, nullable=False)
     photo_filename = db.Column(db.String(120), nullable=True)
+    photo_variants = db.Column(db.JSON, nullable=True)  # Resized copies of photo_filename, see photo_variants.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    experiences = db.relationship('Experience', backref='profile', lazy=True, cascade='all, delete-orphan')
-    educations = db.relationship('Education', backref='profile', lazy=True, cascade='all, delete-orphan')
-    skills = db.relationship('Skill', backref='profile', lazy=True, cascade='all, delete-orphan')
+    # Relationships (lazy by default; the CV endpoint eager-loads them via cv_assembly.load_cv_data)
+    experiences = db.relationship('Experience', backref='profile', lazy=True, cascade='all, delete-orphan', order_by='Experience.id')
+    educations = db.relationship('Education', backref='profile', lazy=True, cascade='all, delete-orphan', order_by='Education.id')
+    skills = db.relationship('Skill', backref='profile', lazy=True, cascade='all, delete-orphan', order_by='Skill.id')
 
     def to_dict(self):
         return {
@@ -32,6 +36,7 @@ class Profile(db.Model):
             'location': self.location,
             'summary': self.summary,
             'photo_filename': self.photo_filename,
+            'photo_variants': self.photo_variants,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -99,23 +104,219 @@ class Skill(db.Model):
 
 class ScanHistory(db.Model):
     __tablename__ = 'scan_history'
+    __table_args__ = (
+        db.Index('idx_scan_history_timestamp', 'timestamp'),  # Same name as init.sql
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     target = db.Column(db.String(50), nullable=False)
     port_range = db.Column(db.String(20), nullable=False)
-    scan_results = db.Column(db.JSON, nullable=False)  # Store complete scan results as JSON
+    scan_results = db.Column(db.JSON(none_as_null=True), nullable=True)  # Complete scan results as JSON (SQL NULL until the scan finishes)
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='completed')  # queued, running, completed, failed, cancelled
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     duration = db.Column(db.Float)  # Scan duration in seconds
+    profile = db.Column(db.String(20), nullable=True)  # nmap scan profile (quick, standard, deep); null for connect scans and older rows
     
-    def to_dict(self):
-        return {
+    # Delta storage: when base_scan_id is set, scan_results is null and scan_delta holds
+    # the differences against that full snapshot (see scan_diff.make_delta)
+    base_scan_id = db.Column(db.Integer, db.ForeignKey('scan_history.id'), nullable=True, index=True)
+    scan_delta = db.Column(db.JSON(none_as_null=True), nullable=True)
+    base_scan = db.relationship('ScanHistory', remote_side=[id], lazy=True)
+    
+    # Compressed storage: zlib-compressed JSON that replaces scan_results (see stored_results)
+    scan_results_z = db.Column(db.LargeBinary, nullable=True)
+    
+    # Per-port observations (normalized copy of the port lists, see ScanPort)
+    ports = db.relationship('ScanPort', backref='scan', lazy=True, cascade='all, delete-orphan',
+                            passive_deletes=True, order_by='ScanPort.port')
+    
+    @staticmethod
+    def compress_payload(value, level=6):
+        """JSON compacto comprimido con zlib, el formato de scan_results_z"""
+        return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), level)
+    
+    @property
+    def stored_results(self):
+        """Lo guardado en scan_results, descomprimiendo scan_results_z si la fila está comprimida"""
+        if self.scan_results_z is None:
+            return self.scan_results
+        # Memoriza el último blob descomprimido: results y choose_delta_base lo leen varias veces
+        cached = self.__dict__.get('_decompressed')
+        if cached is None or cached[0] is not self.scan_results_z:
+            cached = (self.scan_results_z, json.loads(zlib.decompress(self.scan_results_z)))
+            self.__dict__['_decompressed'] = cached
+        return cached[1]
+    
+    def store_results(self, value, compress_level=None):
+        """Guarda `value` en scan_results, o comprimido en scan_results_z si se da compress_level"""
+        if value is not None and compress_level is not None:
+            self.scan_results_z = self.compress_payload(value, compress_level)
+            self.scan_results = None
+        else:
+            self.scan_results = value
+            self.scan_results_z = None
+    
+    def set_results(self, results, store_json=True, delta_base=None, compress_level=None):
+        """
+        Guarda los resultados: las listas de puertos van a scan_ports y, si
+        store_json es False, scan_results solo conserva los metadatos
+        (scan_info, host_info, summary...) y las listas se derivan al leer.
+        Con delta_base (un snapshot completo) solo se guardan las diferencias,
+        también en scan_ports: los puertos iguales que en el snapshot ya tienen
+        fila en él. Con compress_level (0-9) el JSON se guarda comprimido en scan_results_z.
+        """
+        ports = None
+        if delta_base is not None and 'error' not in results:
+            self.base_scan_id = delta_base.id
+            self.scan_delta = make_delta(delta_base.results, results)
+            self.store_results(None)
+            ports = self.scan_delta['upsert']
+        elif store_json or 'error' in results:
+            self.store_results(results, compress_level)
+        else:
+            self.store_results(
+                {key: value for key, value in results.items() if key not in PORT_STATE_LISTS},
+                compress_level
+            )
+        ScanPort.query.filter_by(scan_id=self.id).delete()
+        if ports is None:
+            rows = ScanPort.rows_from_results(self.id, results, self.timestamp)
+        else:
+            rows = ScanPort.rows_from_ports(self.id, ports, self.timestamp)
+        if rows:
+            db.session.execute(db.insert(ScanPort), rows)
+    
+    @property
+    def results(self):
+        """Resultados completos, reconstruyendo desde el delta o desde scan_ports si hace falta"""
+        if self.scan_delta is not None and self.base_scan is not None:
+            return apply_delta(self.base_scan.results, self.scan_delta)
+        stored = self.stored_results
+        if stored is None or 'error' in stored or 'open_ports' in stored:
+            return stored
+        results = dict(stored)
+        for state in PORT_STATE_LISTS:
+            results[state] = []
+        for port in self.ports:
+            results.setdefault(f"{port.state}_ports", []).append(port.to_port_info())
+        return results
+    
+    def find_previous(self):
+        """Último escaneo completado del mismo objetivo, rango y perfil anterior a este"""
+        return ScanHistory.query.filter(
+            ScanHistory.target == self.target,
+            ScanHistory.port_range == self.port_range,
+            ScanHistory.profile == self.profile,
+            ScanHistory.status == 'completed',
+            ScanHistory.id < self.id
+        ).order_by(ScanHistory.id.desc()).first()
+    
+    def choose_delta_base(self, snapshot_interval):
+        """
+        Snapshot completo contra el que guardar este escaneo como delta, o None si
+        toca un snapshot nuevo: no hay escaneo previo o el último snapshot ya
+        tiene snapshot_interval - 1 deltas apoyados en él.
+        """
+        if snapshot_interval <= 1:
+            return None
+        previous = self.find_previous()
+        if previous is None:
+            return None
+        base = previous.base_scan if previous.base_scan_id else previous
+        if base is None or base.stored_results is None or 'error' in base.stored_results:
+            return None
+        deltas = ScanHistory.query.filter(ScanHistory.base_scan_id == base.id).count()
+        if deltas >= snapshot_interval - 1:
+            return None
+        return base
+    
+    # Columns callers may ask for with ?fields= (scan_results is the heavy one)
+    FIELDS = ('id', 'target', 'port_range', 'profile', 'status', 'scan_results', 'timestamp', 'duration')
+    
+    def to_dict(self, fields=None):
+        """Serializa la fila; con fields solo incluye esas claves y no toca scan_results si no se pide"""
+        data = {
             'id': self.id,
             'target': self.target,
             'port_range': self.port_range,
-            'scan_results': self.scan_results,
+            'profile': self.profile,
+            'status': self.status,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'duration': self.duration
         }
+        if fields is None or 'scan_results' in fields:
+            data['scan_results'] = self.results
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        return data
+
+class ScanPort(db.Model):
+    """Una observación de un puerto en un escaneo, para consultar puertos y servicios sin leer los JSON"""
+    __tablename__ = 'scan_ports'
+    __table_args__ = (
+        db.Index('idx_scan_ports_port_state_observed_at', 'port', 'state', 'observed_at'),
+        db.Index('idx_scan_ports_service_state', 'service', 'state'),
+        db.Index('idx_scan_ports_observed_at', 'observed_at'),
+        db.Index('idx_scan_ports_scan_id', 'scan_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scan_id = db.Column(db.Integer, db.ForeignKey('scan_history.id', ondelete='CASCADE'), nullable=False)
+    port = db.Column(db.Integer, nullable=False)
+    protocol = db.Column(db.String(10), nullable=False)
+    state = db.Column(db.String(20), nullable=False)  # open, closed, filtered
+    service = db.Column(db.String(100))
+    product = db.Column(db.String(200))
+    version = db.Column(db.String(100))
+    extrainfo = db.Column(db.String(200))
+    observed_at = db.Column(db.DateTime, nullable=False)  # Timestamp of the scan, copied for time-range queries
+    
+    @staticmethod
+    def rows_from_results(scan_id, results, observed_at):
+        """Filas de scan_ports para las listas de puertos de un resultado de scan_ports()"""
+        return ScanPort.rows_from_ports(
+            scan_id,
+            [port_info for state in PORT_STATE_LISTS for port_info in results.get(state, [])],
+            observed_at
+        )
+    
+    @staticmethod
+    def rows_from_ports(scan_id, ports, observed_at):
+        """Filas de scan_ports para una lista de puertos con el formato de scan_ports()"""
+        return [
+            {
+                'scan_id': scan_id,
+                'port': port_info['port'],
+                'protocol': port_info['protocol'],
+                'state': port_info['state'],
+                'service': port_info.get('name') or None,
+                'product': port_info.get('product') or None,
+                'version': port_info.get('version') or None,
+                'extrainfo': port_info.get('extrainfo') or None,
+                'observed_at': observed_at
+            }
+            for port_info in ports
+        ]
+    
+    def to_port_info(self):
+        """Mismo formato que cada puerto en los resultados de scan_ports()"""
+        return {
+            'port': self.port,
+            'protocol': self.protocol,
+            'state': self.state,
+            'name': self.service or '',
+            'product': self.product or '',
+            'version': self.version or '',
+            'extrainfo': self.extrainfo or ''
+        }
+    
+    def to_dict(self):
+        return dict(
+            self.to_port_info(),
+            id=self.id,
+            scan_id=self.scan_id,
+            observed_at=self.observed_at.isoformat() if self.observed_at else None
+        )
 
 class DonationHistory(db.Model):
     __tablename__ = 'donation_history'
@@ -128,8 +329,10 @@ class DonationHistory(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
-    def to_dict(self):
-        return {
+    FIELDS = ('id', 'stripe_session_id', 'amount', 'currency', 'status', 'created_at', 'completed_at')
+    
+    def to_dict(self, fields=None):
+        data = {
             'id': self.id,
             'stripe_session_id': self.stripe_session_id,
             'amount': self.amount,
@@ -138,3 +341,57 @@ class DonationHistory(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        return data
+
+class DonationDailyStat(db.Model):
+    """Rollup de donaciones por día de creación, moneda y estado (lo mantiene donations.DonationOutbox)"""
+    __tablename__ = 'donation_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'currency', 'status', name='uq_donation_daily_stats_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.BigInteger, nullable=False, default=0)  # Sum of amounts in cents
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'currency': self.currency,
+            'status': self.status,
+            'count': self.count,
+            'amount': self.amount
+        }
+
+class PortTransition(db.Model):
+    """Cambio de estado de un puerto vigilado por port_monitor.PortMonitor (solo se guardan los cambios)"""
+    __tablename__ = 'port_transitions'
+    __table_args__ = (
+        db.Index('idx_port_transitions_target_port_changed_at', 'target', 'port', 'changed_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    target = db.Column(db.String(50), nullable=False)
+    port = db.Column(db.Integer, nullable=False)
+    state = db.Column(db.String(10), nullable=False)  # open, closed, filtered, unknown (monitor stopped)
+    changed_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'port': self.port,
+            'state': self.state,
+            'changed_at': self.changed_at.isoformat()
+        }
+
+class UploadBlob(db.Model):
+    """Archivo del almacén de subidas y última vez que se guardó o reutilizó (ver upload_store.UploadStore.gc)"""
+    __tablename__ = 'upload_blobs'
+    
+    filename = db.Column(db.String(100), primary_key=True)  # Content-hash name inside UPLOAD_FOLDER
+    size = db.Column(db.Integer, nullable=False)
+    last_referenced_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursorError(ValueError):
+    """El cursor de paginación no es válido"""
+
+
+def encode_cursor(timestamp, row_id):
+    """Cursor opaco con la posición (timestamp, id) de la última fila devuelta; timestamp puede ser None"""
+    raw = json.dumps([timestamp.isoformat() if timestamp is not None else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(timestamp) if timestamp is not None else None), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Cursor inválido') from e
+
+
+def parse_fields(raw, allowed):
+    """
+    Interpreta el parámetro ?fields= (lista separada por comas)
+
+    Args:
+        raw (str): Valor del parámetro, o None
+        allowed (tuple): Campos permitidos
+
+    Returns:
+        set | None: Campos pedidos, o None si no se pidió proyección
+
+    Raises:
+        ValueError: Si se pide un campo desconocido
+    """
+    if not raw:
+        return None
+    fields = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(unknown))}. Permitidos: {', '.join(allowed)}")
+    return fields
+
+
+def keyset_page(query, order_column, id_column, cursor=None, limit=10):
+    """
+    Página de resultados ordenada de más nuevo a más viejo por (order_column, id)
+
+    En lugar de OFFSET filtra por la posición de la última fila vista, así
+    cada página cuesta lo mismo sin importar lo profunda que sea y puede
+    resolverse con el índice de order_column. Las filas con order_column nulo
+    van al final, ordenadas por id.
+
+    Args:
+        query: Consulta de SQLAlchemy sobre el modelo
+        order_column: Columna temporal de orden (ej: ScanHistory.timestamp)
+        id_column: Clave primaria, desempata filas con el mismo timestamp
+        cursor (str): Cursor devuelto por la página anterior, o None para la primera
+        limit (int): Tamaño de página
+
+    Returns:
+        tuple: (filas, siguiente_cursor o None)
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        if timestamp is None:
+            query = query.filter(order_column.is_(None), id_column < row_id)
+        else:
+            query = query.filter(or_(
+                order_column < timestamp,
+                and_(order_column == timestamp, id_column < row_id),
+                order_column.is_(None)
+            ))
+
+    rows = query.order_by(order_column.desc().nulls_last(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, order_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from models import db, Profile
+from upload_store import UploadStore
+
+# Variantes de la foto de perfil: nombre -> lado en píxeles (la foto se muestra a 160px)
+PHOTO_VARIANTS = (('thumb', 80), ('display', 160), ('retina', 320))
+
+# Extensión de archivo para cada formato de Pillow
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'AVIF': 'avif', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def render_variants(source_path, output_folder, image_format='WEBP', quality=80):
+    """
+    Genera las variantes cuadradas de una foto y las guarda con el hash de su contenido como nombre
+
+    Args:
+        source_path (str): Ruta de la imagen original
+        output_folder (str): Carpeta donde se escriben las variantes
+        image_format (str): Formato de salida de Pillow (WEBP, AVIF, JPEG...)
+        quality (int): Calidad de compresión (1-100)
+
+    Returns:
+        dict: {nombre: {'filename', 'width', 'height', 'bytes'}} por cada variante
+    """
+    extension = FORMAT_EXTENSIONS.get(image_format.upper(), image_format.lower())
+    save_options = {'format': image_format, 'quality': quality}
+    if image_format.upper() == 'WEBP':
+        save_options['method'] = 6  # Compresión más lenta pero más pequeña; se hace una vez por foto
+    variants = {}
+    with Image.open(source_path) as original:
+        # Respetar la orientación EXIF de las fotos de móvil antes de recortar
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        if image_format.upper() == 'JPEG':
+            image = image.convert('RGB')
+
+        for name, size in PHOTO_VARIANTS:
+            # Sin ampliar: una foto pequeña da variantes del tamaño del original
+            side = min(size, image.width, image.height)
+            resized = ImageOps.fit(image, (side, side), method=Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, **save_options)
+            data = buffer.getvalue()
+
+            filename = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+            path = os.path.join(output_folder, filename)
+            if not os.path.exists(path):
+                # Escritura atómica: nunca se sirve un archivo a medio escribir
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as tmp:
+                    tmp.write(data)
+                os.replace(tmp_path, path)
+            variants[name] = {'filename': filename, 'width': side, 'height': side, 'bytes': len(data)}
+    return variants
+
+
+class PhotoProcessor:
+    """
+    Genera las variantes de la foto de perfil fuera del hilo de la petición
+
+    Mientras se procesan, Profile.photo_variants no corresponde a la foto
+    actual y el CV sigue sirviendo el original. Al terminar se llama
+    on_ready() (por ejemplo para invalidar la caché del CV).
+    """
+
+    def __init__(self, app=None, on_ready=None):
+        self.app = None
+        self.on_ready = on_ready
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.image_format = app.config.get('PHOTO_VARIANT_FORMAT', 'WEBP')
+        self.quality = app.config.get('PHOTO_VARIANT_QUALITY', 80)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='photo-worker')
+        app.extensions['photo_processor'] = self
+
+    def submit(self, profile_id, photo_filename):
+        """Encola la generación de variantes de photo_filename para el perfil"""
+        return self._executor.submit(self._process, profile_id, photo_filename)
+
+    def process(self, profile_id, photo_filename):
+        """Genera las variantes en el hilo actual (comandos CLI)"""
+        return self._process(profile_id, photo_filename)
+
+    def _process(self, profile_id, photo_filename):
+        with self.app.app_context():
+            try:
+                variants = render_variants(
+                    os.path.join(self.upload_folder, photo_filename),
+                    self.upload_folder,
+                    image_format=self.image_format,
+                    quality=self.quality
+                )
+                # Ver UploadStore.gc(): las variantes reutilizadas vuelven a estar en uso
+                for variant in variants.values():
+                    UploadStore.record(variant['filename'], variant['bytes'])
+                profile = db.session.get(Profile, profile_id)
+                # Si mientras tanto se subió otra foto, estas variantes ya no sirven
+                if profile is None or profile.photo_filename != photo_filename:
+                    return None
+                profile.photo_variants = dict(variants, source=photo_filename)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error generating variants for {photo_filename}: {e}")
+                return None
+
+        if self.on_ready is not None:
+            self.on_ready()
+        return variants
+
+
+def photo_urls(profile_data, base_url):
+    """
+    URLs de la foto para la respuesta del CV
+
+    Args:
+        profile_data (dict): Perfil serializado (photo_filename, photo_variants)
+        base_url (str): URL base de /uploads (ej: "http://host/uploads")
+
+    Returns:
+        dict: photo_url (imagen por defecto), photo_srcset y photo_variants
+              (None mientras las variantes no estén listas)
+    """
+    photo_filename = profile_data.get('photo_filename')
+    if not photo_filename:
+        return {'photo_url': None, 'photo_srcset': None, 'photo_variants': None}
+
+    variants = profile_data.get('photo_variants') or {}
+    if variants.get('source') != photo_filename:
+        return {'photo_url': f"{base_url}/{photo_filename}", 'photo_srcset': None, 'photo_variants': None}
+
+    urls = {name: f"{base_url}/{variants[name]['filename']}" for name, _ in PHOTO_VARIANTS if name in variants}
+    # Con originales pequeños varias variantes pueden tener el mismo ancho: una entrada por ancho
+    widths = {}
+    for name, _ in PHOTO_VARIANTS:
+        if name in urls:
+            widths.setdefault(variants[name]['width'], urls[name])
+    srcset = ', '.join(f"{url} {width}w" for width, url in widths.items())
+    return {
+        'photo_url': urls.get('display') or f"{base_url}/{photo_filename}",
+        'photo_srcset': srcset or None,
+        'photo_variants': urls
+    }
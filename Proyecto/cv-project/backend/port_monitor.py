@@ -0,0 +1,277 @@
+import atexit
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, func
+from models import db, PortTransition
+from scan_utils import get_common_ports, probe_ports
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+PORT_STATES = ('open', 'closed', 'filtered', 'unknown')
+
+# Ventanas de ?window= ("90s", "15m", "24h", "7d"; sin sufijo, segundos)
+_WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def _parse_utc(value):
+    """ISO 8601 a datetime UTC sin zona (como los guardados); las horas con zona se convierten"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def parse_window(args, now=None):
+    """
+    Intervalo [start, end) pedido con ?start=&end= (ISO 8601; sin zona se toma como UTC) o ?window=
+
+    Args:
+        args (dict): Parámetros de la petición
+        now (datetime): Opcional, instante actual (UTC)
+
+    Returns:
+        tuple: (start, end); por defecto las últimas 24 horas
+    """
+    now = now or datetime.utcnow()
+    end = _parse_utc(args['end']) if args.get('end') else now
+    if args.get('start'):
+        start = _parse_utc(args['start'])
+    else:
+        match = re.fullmatch(r'(\d+)([smhd]?)', args.get('window', '24h').strip())
+        if not match:
+            raise ValueError('window debe ser un número seguido de s, m, h o d (ej: 24h)')
+        start = end - timedelta(seconds=int(match.group(1)) * _WINDOW_UNITS[match.group(2) or 's'])
+    if start >= end:
+        raise ValueError('El inicio de la ventana debe ser anterior al final')
+    return start, end
+
+
+def port_availability(target, start, end, ports=None):
+    """
+    Tiempo en cada estado por puerto dentro de [start, end), a partir de las transiciones
+
+    El estado al empezar la ventana es el de la última transición anterior
+    (unknown si no hay ninguna) y cada transición cuenta hasta la siguiente.
+    La disponibilidad es la fracción del tiempo conocido que el puerto estuvo
+    abierto. Son dos consultas sea cual sea el número de puertos.
+
+    Args:
+        target (str): Objetivo vigilado
+        start (datetime): Inicio de la ventana (UTC)
+        end (datetime): Fin de la ventana (UTC), recortado al instante actual
+        ports (list): Opcional, puertos a incluir (por defecto, todos los que tienen transiciones)
+
+    Returns:
+        dict: {puerto: {'state', 'availability', 'seconds', 'transitions'}}
+    """
+    end = min(end, datetime.utcnow())
+    conditions = [PortTransition.target == target]
+    if ports is not None:
+        conditions.append(PortTransition.port.in_(ports))
+
+    latest = (
+        db.select(PortTransition.port, func.max(PortTransition.changed_at).label('changed_at'))
+        .where(*conditions, PortTransition.changed_at < start)
+        .group_by(PortTransition.port)
+        .subquery()
+    )
+    initial = dict(db.session.execute(
+        db.select(PortTransition.port, PortTransition.state)
+        .join(latest, and_(PortTransition.port == latest.c.port, PortTransition.changed_at == latest.c.changed_at))
+        .where(*conditions)
+    ).all())
+    changes = {}
+    for port, state, changed_at in db.session.execute(
+        db.select(PortTransition.port, PortTransition.state, PortTransition.changed_at)
+        .where(*conditions, PortTransition.changed_at >= start, PortTransition.changed_at < end)
+        .order_by(PortTransition.port, PortTransition.changed_at, PortTransition.id)
+    ):
+        changes.setdefault(port, []).append((changed_at, state))
+
+    report = {}
+    for port in sorted(set(ports or ()) | set(initial) | set(changes)):
+        state = initial.get(port, 'unknown')
+        seconds = dict.fromkeys(PORT_STATES, 0.0)
+        cursor = start
+        for changed_at, new_state in changes.get(port, []):
+            seconds[state] += (changed_at - cursor).total_seconds()
+            state, cursor = new_state, changed_at
+        if end > cursor:
+            seconds[state] += (end - cursor).total_seconds()
+        known = sum(seconds.values()) - seconds['unknown']
+        report[port] = {
+            'state': state,
+            'availability': round(seconds['open'] / known, 6) if known else None,
+            'seconds': {name: round(value, 3) for name, value in seconds.items()},
+            'transitions': len(changes.get(port, []))
+        }
+    return report
+
+
+class PortMonitor:
+    """
+    Vigilancia periódica de puertos con conexiones TCP concurrentes
+
+    Cada MONITOR_INTERVAL segundos comprueba MONITOR_PORTS (por defecto
+    get_common_ports()) en MONITOR_TARGET con probe_ports() y solo escribe en
+    port_transitions los puertos cuyo estado cambió, así una vigilancia de
+    segundos apenas genera filas. Con MONITOR_ENABLED el hilo arranca con la
+    primera petición de cada worker (no al importar, por si el servidor hace
+    fork), pero solo vigila el proceso que consigue el bloqueo de
+    MONITOR_LOCK_FILE; los demás lo reintentan en cada ciclo por si ese worker
+    muere. `flask monitor-ports` ejecuta el mismo bucle en primer plano. Al
+    parar de forma limpia los puertos pasan a "unknown"; una caída sin parada
+    cuenta como el último estado conocido hasta que vuelve a vigilarse.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.leader = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+        self._states = {}
+        self.probes = 0
+        self.transitions = 0
+        self.last_probe_at = None
+        self.last_probe_ms = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('MONITOR_ENABLED', False)
+        self.target = app.config.get('MONITOR_TARGET', '127.0.0.1')
+        self.ports = app.config.get('MONITOR_PORTS') or sorted(get_common_ports())
+        self.interval = app.config.get('MONITOR_INTERVAL', 5.0)
+        self.timeout = app.config.get('MONITOR_TIMEOUT', 0.5)
+        self.concurrency = app.config.get('MONITOR_CONCURRENCY', 100)
+        self.lock_path = app.config.get('MONITOR_LOCK_FILE') or os.path.join(tempfile.gettempdir(), 'cv-port-monitor.lock')
+        if self.enabled:
+            app.before_request(self._ensure_started)
+        app.extensions['port_monitor'] = self
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self.start()
+
+    def start(self):
+        """Arranca el hilo de vigilancia (una sola vez por proceso)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='port-monitor', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """Detiene el bucle, marca los puertos como unknown y suelta el bloqueo"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        if self.leader:
+            try:
+                self._record({port: 'unknown' for port in self.ports})
+            except Exception as e:
+                print(f"Port monitor error: {e}")
+            self._release_leadership()
+
+    def run_forever(self):
+        """Bucle de vigilancia; devuelve al llamar a stop()"""
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self.leader or self._acquire_leadership():
+                    self.probe_once()
+            except Exception as e:
+                print(f"Port monitor error: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _acquire_leadership(self):
+        if fcntl is not None:
+            lock_file = open(self.lock_path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        self.leader = True
+        self.load_states()
+        print(f"🛰️  Port monitor vigilando {len(self.ports)} puertos de {self.target} cada {self.interval} s")
+        return True
+
+    def _release_leadership(self):
+        self.leader = False
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def load_states(self):
+        """Último estado guardado de cada puerto, para no repetir transiciones tras reiniciar"""
+        with self.app.app_context():
+            latest = (
+                db.select(PortTransition.port, func.max(PortTransition.changed_at).label('changed_at'))
+                .where(PortTransition.target == self.target)
+                .group_by(PortTransition.port)
+                .subquery()
+            )
+            self._states = dict(db.session.execute(
+                db.select(PortTransition.port, PortTransition.state)
+                .join(latest, and_(PortTransition.port == latest.c.port,
+                                   PortTransition.changed_at == latest.c.changed_at))
+                .where(PortTransition.target == self.target)
+            ).all())
+
+    def probe_once(self):
+        """
+        Comprueba los puertos una vez y guarda los cambios de estado
+
+        Returns:
+            list: Transiciones guardadas en este ciclo
+        """
+        start = time.perf_counter()
+        changes = self._record(probe_ports(self.target, self.ports, self.concurrency, self.timeout))
+        self.probes += 1
+        self.last_probe_at = datetime.utcnow()
+        self.last_probe_ms = round((time.perf_counter() - start) * 1000, 3)
+        return changes
+
+    def _record(self, states):
+        now = datetime.utcnow()
+        changes = [
+            {'target': self.target, 'port': port, 'state': state, 'changed_at': now}
+            for port, state in sorted(states.items())
+            if self._states.get(port) != state
+        ]
+        if changes:
+            with self.app.app_context():
+                db.session.execute(db.insert(PortTransition), changes)
+                db.session.commit()
+            self._states.update((change['port'], change['state']) for change in changes)
+            self.transitions += len(changes)
+        return changes
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'running': self.leader,
+            'target': self.target,
+            'interval': self.interval,
+            'ports': len(self.ports),
+            'probes': self.probes,
+            'transitions': self.transitions,
+            'last_probe_at': self.last_probe_at.isoformat() if self.last_probe_at else None,
+            'last_probe_ms': self.last_probe_ms
+        }
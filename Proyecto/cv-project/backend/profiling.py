@@ -0,0 +1,161 @@
+import cProfile
+import hmac
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Longitud máxima de los parámetros en el log de consultas lentas
+_MAX_PARAMS_LENGTH = 500
+
+
+class RequestProfile:
+    """Consultas SQL y fases medidas durante una petición"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en ms)"""
+        entries = [f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"']
+        entries.extend(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items())
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def phase(name):
+    """
+    Mide un bloque de la petición como una fase de Server-Timing
+
+    Sin PROFILING_ENABLED (o fuera de una petición) no hace nada. Las fases
+    pueden solaparse con "db" si el bloque lanza consultas (carga perezosa).
+
+    Args:
+        name (str): Nombre de la fase (ej: "serialize", "json")
+    """
+    profile = g.get('_request_profile') if has_request_context() else None
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - start)
+
+
+class RequestProfiler:
+    """
+    Instrumentación opcional por petición
+
+    Con PROFILING_ENABLED cuenta y cronometra las consultas SQL de cada
+    petición y añade Server-Timing con la base de datos, las fases marcadas con
+    phase() y el total. Con SLOW_QUERY_MS > 0 registra las consultas que lo
+    superan junto con sus parámetros (también fuera de las peticiones). Las
+    peticiones con la cabecera X-Profile igual a PROFILE_TOKEN (sin token
+    configurado la cabecera se ignora) o cuya ruta empieza por una de PROFILE_PATHS se ejecutan bajo
+    cProfile y el resultado se guarda en PROFILE_DIR (ver con `python -m pstats`
+    o snakeviz).
+    """
+
+    HEADER = 'X-Profile'
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.slow_query_ms = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('PROFILING_ENABLED', False)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', 0)
+        self.profile_dir = app.config.get('PROFILE_DIR', 'profiles')
+        self.profile_token = app.config.get('PROFILE_TOKEN')
+        self.profile_paths = tuple(path for path in app.config.get('PROFILE_PATHS', ()) if path)
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.after_request(self._after_request)
+        app.extensions['request_profiler'] = self
+
+    def register_engine(self, engine):
+        """Cronometra las consultas del engine (llamar con el engine ya creado)"""
+        if not (self.enabled or self.slow_query_ms):
+            return
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._profiling_start = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start = getattr(context, '_profiling_start', None)
+            if start is None:
+                return
+            elapsed = time.perf_counter() - start
+            profile = g.get('_request_profile') if has_request_context() else None
+            if profile is not None:
+                profile.queries += 1
+                profile.db_time += elapsed
+            if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+                self._log_slow_query(statement, parameters, elapsed)
+
+    @staticmethod
+    def _log_slow_query(statement, parameters, elapsed):
+        where = f" [{request.method} {request.path}]" if has_request_context() else ''
+        params = repr(parameters)
+        if len(params) > _MAX_PARAMS_LENGTH:
+            params = params[:_MAX_PARAMS_LENGTH] + '...'
+        statement = ' '.join(statement.split())
+        print(f"🐢 Slow query ({elapsed * 1000:.1f} ms){where}: {statement} -- params: {params}")
+
+    def _wants_profile(self):
+        header = request.headers.get(self.HEADER)
+        if header is not None and self.profile_token:
+            # Cada perfil escribe en disco: solo a petición de quien conoce el token
+            return hmac.compare_digest(header.encode('utf-8'), self.profile_token.encode('utf-8'))
+        return bool(self.profile_paths) and request.path.startswith(self.profile_paths)
+
+    def _before_request(self):
+        g._request_profile = RequestProfile()
+        if self._wants_profile():
+            profiler = cProfile.Profile()
+            g._cprofile = profiler
+            profiler.enable()
+
+    def _after_request(self, response):
+        profiler = g.pop('_cprofile', None)
+        if profiler is not None:
+            profiler.disable()
+            path = self._dump(profiler)
+            if path:
+                response.headers['X-Profile-File'] = os.path.basename(path)
+        profile = g.get('_request_profile')
+        if profile is not None:
+            response.headers['Server-Timing'] = profile.server_timing()
+            # Sin esto el navegador oculta Server-Timing a un frontend de otro origen
+            response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    def _dump(self, profiler):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        filename = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{request.method}-{slug}.prof"
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, filename)
+            profiler.dump_stats(path)
+            return path
+        except OSError as e:
+            print(f"Error writing profile {filename}: {e}")
+            return None
@@ -0,0 +1,302 @@
+import threading
+import time
+from collections import OrderedDict
+from metrics import Counter, Gauge
+
+# Token bucket atómico en Redis; el reloj es el del servidor para que todos los workers coincidan
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(data[1]) or burst
+local updated = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring((1 - tokens) / rate)}
+"""
+
+# Plaza en un pool acotado: sorted set de leases con su caducidad como puntuación
+_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) or redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Renovación de un lease que aún existe (uno caducado no se resucita: podría superar el límite)
+_RENEW_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class LocalLimiterStore:
+    """
+    Estado del limitador en memoria del proceso
+
+    Los buckets de clientes inactivos se desalojan por LRU a partir de
+    max_clients: un bucket olvidado equivale a uno lleno.
+    """
+
+    def __init__(self, max_clients=10000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def acquire(self, pool, lease, limit, ttl):
+        now = time.monotonic()
+        with self._lock:
+            slots = self._slots.setdefault(pool, {})
+            for held, expires_at in list(slots.items()):
+                if expires_at <= now:
+                    del slots[held]
+            if lease in slots or len(slots) < limit:
+                slots[lease] = now + ttl
+                return True
+            return False
+
+    def renew(self, pool, lease, ttl):
+        now = time.monotonic()
+        with self._lock:
+            slots = self._slots.get(pool, {})
+            if slots.get(lease, 0) > now:
+                slots[lease] = now + ttl
+                return True
+            return False
+
+    def release(self, pool, lease):
+        with self._lock:
+            self._slots.get(pool, {}).pop(lease, None)
+
+    def count(self, pool):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for expires_at in self._slots.get(pool, {}).values() if expires_at > now)
+
+
+class RedisLimiterStore:
+    """Estado del limitador compartido entre procesos sobre Redis (dependencia opcional)"""
+
+    def __init__(self, url, prefix=''):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('Se requiere el paquete "redis" para compartir el límite de escaneos') from e
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self._acquire = self._client.register_script(_ACQUIRE_SCRIPT)
+        self._renew = self._client.register_script(_RENEW_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst):
+        allowed, retry_after = self._take(keys=[f"{self.prefix}bucket:{key}"], args=[rate, burst])
+        return bool(allowed), 0.0 if allowed else float(retry_after)
+
+    def acquire(self, pool, lease, limit, ttl):
+        return bool(self._acquire(keys=[f"{self.prefix}slots:{pool}"], args=[lease, limit, ttl]))
+
+    def renew(self, pool, lease, ttl):
+        return bool(self._renew(keys=[f"{self.prefix}slots:{pool}"], args=[lease, ttl]))
+
+    def release(self, pool, lease):
+        self._client.zrem(f"{self.prefix}slots:{pool}", lease)
+
+    def count(self, pool):
+        seconds, microseconds = self._client.time()
+        return self._client.zcount(f"{self.prefix}slots:{pool}", f"({seconds + microseconds / 1e6}", '+inf')
+
+
+def make_limiter_store(url=None, prefix=''):
+    """
+    Crea el almacén del limitador según la URL configurada
+
+    Args:
+        url (str): URL del almacén compartido (ej: "redis://redis:6379/2"); si está vacía se usa memoria del proceso
+        prefix (str): Prefijo de claves para el almacén compartido
+
+    Returns:
+        LocalLimiterStore | RedisLimiterStore: Almacén del limitador
+    """
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisLimiterStore(url, prefix=prefix)
+    return LocalLimiterStore()
+
+
+class ScanAdmission:
+    """
+    Control de admisión de /api/scan
+
+    Cada cliente tiene un token bucket de SCAN_RATE_BURST escaneos que se
+    recarga a SCAN_RATE_LIMIT por minuto; sin tokens la petición se rechaza con
+    429 y Retry-After. Los escaneos admitidos ocupan una plaza "active" (como
+    mucho SCAN_MAX_CONCURRENT + SCAN_MAX_QUEUED) hasta terminar, y una plaza
+    "running" (como mucho SCAN_MAX_CONCURRENT) mientras nmap se ejecuta; el
+    resto espera su turno en la cola. Con SCAN_LIMIT_URL el estado vive en
+    Redis y el límite es uno solo para todos los workers; sin él, cada proceso
+    aplica el suyo. Las plazas caducan a los SCAN_SLOT_TTL segundos por si un
+    worker muere sin liberarlas; mientras el escaneo sigue vivo, un hilo por
+    proceso las renueva cada SCAN_SLOT_TTL / 3 segundos, así un escaneo largo
+    no pierde su plaza a mitad. Si el almacén falla, se admite (los límites
+    por proceso de ScanJobManager siguen aplicándose).
+    """
+
+    ACTIVE = 'active'
+    RUNNING = 'running'
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, app=None):
+        self.app = None
+        self.store = None
+        self.rejections = {'rate_limited': 0, 'queue_full': 0}
+        self._lock = threading.Lock()
+        self._held = {}
+        self._renewer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.rate = app.config.get('SCAN_RATE_LIMIT', 6) / 60.0
+        self.burst = max(1, app.config.get('SCAN_RATE_BURST', 3))
+        self.max_concurrent = max(1, app.config.get('SCAN_MAX_CONCURRENT', 2))
+        self.max_queued = max(0, app.config.get('SCAN_MAX_QUEUED', 8))
+        self.slot_ttl = app.config.get('SCAN_SLOT_TTL', 1800)
+        self.store = make_limiter_store(app.config.get('SCAN_LIMIT_URL'), prefix='scanlimit:')
+        app.extensions['scan_admission'] = self
+
+    def _count_rejection(self, reason):
+        with self._lock:
+            self.rejections[reason] += 1
+
+    def check_rate(self, client):
+        """
+        Gasta un token del cliente
+
+        Args:
+            client (str): Identificador del cliente (su IP)
+
+        Returns:
+            tuple: (bool, int) - si se admite y los segundos hasta el próximo token
+        """
+        if not self.rate:
+            return True, 0
+        try:
+            allowed, retry_after = self.store.take(client, self.rate, self.burst)
+        except Exception as e:
+            print(f"Scan limiter error: {e}")
+            return True, 0
+        if not allowed:
+            self._count_rejection('rate_limited')
+        return allowed, max(1, int(retry_after + 0.999))
+
+    def admit(self, lease):
+        """Reserva una plaza "active" para un escaneo nuevo; False si la cola está llena"""
+        try:
+            admitted = self.store.acquire(self.ACTIVE, lease, self.max_concurrent + self.max_queued, self.slot_ttl)
+        except Exception as e:
+            print(f"Scan limiter error: {e}")
+            return True
+        if not admitted:
+            self._count_rejection('queue_full')
+        else:
+            self._hold(lease, self.ACTIVE)
+        return admitted
+
+    def _hold(self, lease, pool):
+        with self._lock:
+            self._held.setdefault(lease, set()).add(pool)
+            # El hilo se arranca con el primer uso (no al importar, por si el servidor hace fork)
+            if self._renewer is None or not self._renewer.is_alive():
+                self._renewer = threading.Thread(target=self._renew_forever, name='scan-slot-renewer', daemon=True)
+                self._renewer.start()
+
+    def _renew_forever(self):
+        while True:
+            time.sleep(max(1.0, self.slot_ttl / 3))
+            self.renew_held()
+
+    def renew_held(self):
+        """Alarga el TTL de las plazas de los escaneos de este proceso que siguen vivos"""
+        with self._lock:
+            held = [(lease, pool) for lease, pools in self._held.items() for pool in pools]
+        for lease, pool in held:
+            try:
+                self.store.renew(pool, lease, self.slot_ttl)
+            except Exception as e:
+                print(f"Scan limiter error: {e}")
+
+    def wait_for_slot(self, lease, cancel_event=None):
+        """
+        Espera una plaza "running" antes de lanzar nmap
+
+        Returns:
+            bool: True con la plaza reservada, False si se canceló mientras esperaba
+        """
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            try:
+                if self.store.acquire(self.RUNNING, lease, self.max_concurrent, self.slot_ttl):
+                    self._hold(lease, self.RUNNING)
+                    return True
+            except Exception as e:
+                print(f"Scan limiter error: {e}")
+                return True
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self, lease):
+        """Libera las plazas del escaneo al terminar (en cualquier estado)"""
+        with self._lock:
+            self._held.pop(lease, None)
+        for pool in (self.RUNNING, self.ACTIVE):
+            try:
+                self.store.release(pool, lease)
+            except Exception as e:
+                print(f"Scan limiter error: {e}")
+
+    def collect(self):
+        """Plazas ocupadas y rechazos, para /api/metrics"""
+        slots = Gauge('cv_scan_slots_in_use', 'Plazas de escaneo ocupadas (active = en curso + en cola)', ('pool',))
+        for pool in (self.ACTIVE, self.RUNNING):
+            try:
+                slots.set(self.store.count(pool), (pool,))
+            except Exception:
+                pass
+        rejected = Counter('cv_scan_rejections_total', 'Peticiones de escaneo rechazadas por el control de admisión',
+                           ('reason',))
+        with self._lock:
+            for reason, count in self.rejections.items():
+                rejected.inc(count, (reason,))
+        return [slots, rejected]
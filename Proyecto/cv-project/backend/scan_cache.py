@@ -0,0 +1,173 @@
+import hashlib
+import json
+import socket
+import time
+from cache import make_cache
+from scan_utils import parse_port_range
+
+
+def normalize_target(target):
+    """Resuelve el objetivo a su IP para que 'localhost' y '127.0.0.1' compartan entrada"""
+    try:
+        return socket.gethostbyname(target)
+    except OSError:
+        return target.strip().lower()
+
+
+def normalize_ports(ports):
+    """
+    Representación canónica de un conjunto de puertos como rangos ordenados
+
+    Args:
+        ports (iterable): Puertos a normalizar
+
+    Returns:
+        str: Rangos separados por comas (ej: "22,80-82,443")
+    """
+    ranges = []
+    for port in sorted(set(ports)):
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def make_scan_key(target, port_range, options=None):
+    """
+    Clave de caché de un escaneo: objetivo normalizado + puertos + opciones
+
+    Args:
+        target (str): Objetivo del escaneo
+        port_range (str): Rango de puertos "inicio-fin"
+        options (dict): Opciones que cambian el resultado (motor, perfil...)
+
+    Returns:
+        str: Clave estable para la caché y la coalescencia
+    """
+    raw = json.dumps({
+        'target': normalize_target(target),
+        'ports': normalize_ports(parse_port_range(port_range)),
+        'options': options or {}
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ScanResultCache:
+    """
+    Caché de resultados de escaneos completados con TTL configurable (SCAN_CACHE_TTL)
+
+    Usa el mismo backend que la caché del CV: LRU en proceso, o Redis si
+    SCAN_CACHE_URL apunta a uno. Con TTL 0 la caché queda desactivada.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SCAN_CACHE_TTL', 60)
+        self.backend = make_cache(
+            app.config.get('SCAN_CACHE_URL'),
+            maxsize=app.config.get('SCAN_CACHE_SIZE', 128),
+            prefix='scan:'
+        )
+        app.extensions['scan_cache'] = self
+
+    def get(self, key):
+        """Devuelve la entrada {'scan_id', 'results', 'duration', 'cached_at'} vigente, o None"""
+        if not self.ttl:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"Scan cache error: {e}")
+            return None
+
+    def set(self, key, job):
+        if not self.ttl:
+            return
+        entry = {
+            'scan_id': job.scan_id,
+            'results': job.results,
+            'duration': job.duration,
+            'cached_at': job.finished_at or time.time()
+        }
+        try:
+            self.backend.set(key, entry, ttl=self.ttl)
+        except Exception as e:
+            print(f"Scan cache error: {e}")
+
+
+class FingerprintCache:
+    """
+    Huellas de servicio (name, product, version, extrainfo) por (objetivo, puerto, protocolo)
+    y detección de SO por objetivo
+
+    Permite que los escaneos con detección de versiones solo vuelvan a
+    identificar los puertos recién abiertos o cuya huella superó
+    SCAN_FINGERPRINT_TTL segundos (ver scan_ports_incremental). Comparte
+    backend con la caché de escaneos (SCAN_CACHE_URL). Con TTL 0 queda
+    desactivada y cada escaneo identifica todos los puertos.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SCAN_FINGERPRINT_TTL', 86400)
+        self.backend = make_cache(
+            app.config.get('SCAN_CACHE_URL'),
+            maxsize=app.config.get('SCAN_FINGERPRINT_CACHE_SIZE', 4096),
+            prefix='fp:'
+        )
+        app.extensions['fingerprint_cache'] = self
+
+    @staticmethod
+    def _host_key(target):
+        return f"{normalize_target(target)}:host"
+
+    @staticmethod
+    def _key(target, port, protocol):
+        return f"{normalize_target(target)}:{protocol}:{port}"
+
+    def get(self, target, port, protocol='tcp'):
+        """Devuelve la huella vigente del puerto, o None si no hay o caducó"""
+        if not self.ttl:
+            return None
+        try:
+            return self.backend.get(self._key(target, port, protocol))
+        except Exception as e:
+            print(f"Fingerprint cache error: {e}")
+            return None
+
+    def set(self, target, port, protocol, fingerprint):
+        if not self.ttl:
+            return
+        try:
+            self.backend.set(self._key(target, port, protocol), fingerprint, ttl=self.ttl)
+        except Exception as e:
+            print(f"Fingerprint cache error: {e}")
+
+    def get_host(self, target):
+        """Devuelve la detección de SO vigente del objetivo ({'os_matches', 'fingerprinted_at'}), o None"""
+        if not self.ttl:
+            return None
+        try:
+            return self.backend.get(self._host_key(target))
+        except Exception as e:
+            print(f"Fingerprint cache error: {e}")
+            return None
+
+    def set_host(self, target, host):
+        if not self.ttl:
+            return
+        try:
+            self.backend.set(self._host_key(target), host, ttl=self.ttl)
+        except Exception as e:
+            print(f"Fingerprint cache error: {e}")
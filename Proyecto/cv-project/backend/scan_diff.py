@@ -0,0 +1,98 @@
+# Listas de puertos de un resultado de scan_ports(), por estado
+PORT_STATE_LISTS = ('open_ports', 'closed_ports', 'filtered_ports')
+
+# Campos de un puerto que identifican el servicio detectado
+SERVICE_FIELDS = ('name', 'product', 'version', 'extrainfo')
+
+
+def _port_key(port_info):
+    return f"{port_info['protocol']}/{port_info['port']}"
+
+
+def _ports_by_key(results):
+    return {
+        _port_key(port_info): port_info
+        for state in PORT_STATE_LISTS
+        for port_info in (results or {}).get(state, [])
+    }
+
+
+def diff_results(previous, current):
+    """
+    Compara dos resultados de scan_ports()
+
+    Args:
+        previous (dict): Resultado anterior (o None si no hay)
+        current (dict): Resultado nuevo
+
+    Returns:
+        dict: Puertos abiertos nuevos (opened), que dejaron de estar abiertos
+              (closed) y abiertos en ambos con otro servicio (changed)
+    """
+    before = _ports_by_key(previous)
+    after = _ports_by_key(current)
+    opened, closed, changed = [], [], []
+
+    for key, port_info in after.items():
+        old = before.get(key)
+        if port_info['state'] == 'open':
+            if old is None or old['state'] != 'open':
+                opened.append(port_info)
+            elif any(old.get(field, '') != port_info.get(field, '') for field in SERVICE_FIELDS):
+                changed.append({
+                    'port': port_info['port'],
+                    'protocol': port_info['protocol'],
+                    'before': {field: old.get(field, '') for field in SERVICE_FIELDS},
+                    'after': {field: port_info.get(field, '') for field in SERVICE_FIELDS}
+                })
+        elif old is not None and old['state'] == 'open':
+            closed.append(dict(port_info, previous_state='open'))
+
+    for key, old in before.items():
+        if key not in after and old['state'] == 'open':
+            closed.append(dict(old, state='not_reported', previous_state='open'))
+
+    sort_key = lambda p: (p['port'], p['protocol'])
+    return {
+        'opened': sorted(opened, key=sort_key),
+        'closed': sorted(closed, key=sort_key),
+        'changed': sorted(changed, key=sort_key),
+        'summary': {
+            'opened_count': len(opened),
+            'closed_count': len(closed),
+            'changed_count': len(changed)
+        }
+    }
+
+
+def make_delta(base, results):
+    """
+    Codifica `results` como diferencias respecto a `base` (un snapshot completo)
+
+    Returns:
+        dict: {'meta': claves que no son listas de puertos,
+               'upsert': puertos nuevos o distintos, 'remove': claves "proto/puerto" ausentes}
+    """
+    before = _ports_by_key(base)
+    after = _ports_by_key(results)
+    return {
+        'meta': {key: value for key, value in results.items() if key not in PORT_STATE_LISTS},
+        'upsert': [port_info for key, port_info in after.items() if before.get(key) != port_info],
+        'remove': [key for key in before if key not in after]
+    }
+
+
+def apply_delta(base, delta):
+    """Reconstruye el resultado completo a partir del snapshot base y su delta"""
+    ports = _ports_by_key(base)
+    for key in delta['remove']:
+        ports.pop(key, None)
+    for port_info in delta['upsert']:
+        ports[_port_key(port_info)] = port_info
+
+    results = dict(delta['meta'])
+    for state in PORT_STATE_LISTS:
+        results[state] = []
+    for port_info in sorted(ports.values(), key=lambda p: (p['port'], p['protocol'])):
+        results.setdefault(f"{port_info['state']}_ports", []).append(port_info)
+    return results
@@ -0,0 +1,372 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import db, ScanHistory
+
+
+class QueueFullError(Exception):
+    """La cola de escaneos está llena"""
+
+
+class ScanJob:
+    """
+    Estado en memoria de un escaneo encolado; su id es el de la fila ScanHistory
+
+    Además guarda un registro ordenado de eventos (port, progress, done) que los
+    clientes de streaming pueden leer desde el principio o desde un índice dado.
+    """
+
+    # Intervalo mínimo entre eventos de progreso, en segundos
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, scan_id, target, port_range, key=None, on_complete=None, engine='nmap', profile=None,
+                 lease=None):
+        self.scan_id = scan_id
+        self.engine = engine
+        self.profile = profile
+        self.key = key
+        self.on_complete = on_complete
+        self.target = target
+        self.port_range = port_range
+        self.status = 'queued'
+        self.progress = 0.0
+        self.results = None
+        self.duration = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        # Identifica las plazas del control de admisión (ver ScanAdmission)
+        self.lease = lease
+        self.streamed_ports = 0
+        self._events = []
+        self._events_cond = threading.Condition()
+        self._last_progress_event = 0.0
+
+    @property
+    def finished(self):
+        return self.status in ScanJobManager.FINAL_STATES
+
+    def report_progress(self, done, total):
+        self.progress = round(done / total, 4) if total else 1.0
+        now = time.time()
+        if done < total and now - self._last_progress_event < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress_event = now
+        elapsed = now - (self.started_at or now)
+        eta = elapsed / done * (total - done) if done else None
+        self.publish('progress', {
+            'done': done,
+            'total': total,
+            'progress': self.progress,
+            'elapsed': round(elapsed, 3),
+            'eta': round(eta, 3) if eta is not None else None
+        })
+
+    def report_port(self, port_info, done, total):
+        """Publica el resultado de un puerto y actualiza el progreso"""
+        self.streamed_ports += 1
+        self.publish('port', port_info)
+        self.report_progress(done, total)
+
+    def publish(self, event, data):
+        with self._events_cond:
+            self._events.append((event, data))
+            self._events_cond.notify_all()
+
+    def iter_events(self, start=0, heartbeat=15):
+        """
+        Genera (índice, evento, datos) desde `start` hasta el evento final 'done'.
+        Si no llega nada en `heartbeat` segundos genera (None, None, None) para
+        que el cliente mantenga viva la conexión.
+        """
+        index = start
+        while True:
+            with self._events_cond:
+                if index >= len(self._events):
+                    self._events_cond.wait(heartbeat)
+                pending = self._events[index:]
+            if not pending:
+                yield None, None, None
+                continue
+            for event, data in pending:
+                yield index, event, data
+                index += 1
+                if event == 'done':
+                    return
+
+    def to_dict(self):
+        data = {
+            'scan_id': self.scan_id,
+            'target': self.target,
+            'port_range': self.port_range,
+            'profile': self.profile,
+            'status': self.status,
+            'progress': self.progress,
+            'cancel_requested': self.cancel_event.is_set(),
+            'duration': self.duration
+        }
+        if self.results is not None:
+            data['results'] = self.results
+            data['timestamp'] = self.results.get('timestamp', '')
+        return data
+
+
+class ScanJobManager:
+    """
+    Ejecuta los escaneos en un pool acotado de hilos para no bloquear los workers de Flask
+
+    El número de escaneos simultáneos lo fija SCAN_WORKERS y el de escaneos en
+    espera SCAN_QUEUE_SIZE; por encima de eso submit() lanza QueueFullError.
+    Los trabajos terminados se conservan en memoria SCAN_JOB_TTL segundos y
+    después se consultan desde ScanHistory. Las filas que siguen en queued o
+    running más de SCAN_STALE_AFTER segundos sin un trabajo vivo (el worker
+    murió o se reinició) se marcan como failed con fail_orphaned(). Los envíos con la misma clave que
+    un trabajo aún activo se unen a ese trabajo en lugar de lanzar otro. Si la
+    app tiene ScanAdmission, además se respetan sus plazas globales: submit()
+    reserva una plaza en la cola y el trabajo espera una plaza de ejecución
+    antes de lanzar el runner.
+    """
+
+    FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+    def __init__(self, app=None):
+        self.app = None
+        self._jobs = {}
+        self._inflight = {}
+        # Envíos que ya tienen hueco en la cola pero aún están creando su fila
+        self._reserved = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('SCAN_WORKERS', 2)
+        self.max_queue = app.config.get('SCAN_QUEUE_SIZE', 8)
+        self.job_ttl = app.config.get('SCAN_JOB_TTL', 3600)
+        self.stale_after = app.config.get('SCAN_STALE_AFTER', 3600)
+        self.store_json = app.config.get('SCAN_STORE_JSON', True)
+        self.delta_storage = app.config.get('SCAN_DELTA_STORAGE', False)
+        self.snapshot_interval = app.config.get('SCAN_SNAPSHOT_INTERVAL', 10)
+        self.compress_level = app.config.get('SCAN_COMPRESS_LEVEL', 6) if app.config.get('SCAN_COMPRESS_RESULTS', True) else None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scan-worker')
+        app.extensions['scan_jobs'] = self
+
+    def active_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def submit(self, target, port_range, runner, key=None, on_complete=None, engine='nmap', profile=None):
+        """
+        Registra el escaneo en ScanHistory y lo encola, o lo une a uno idéntico en curso
+
+        Args:
+            target (str): Objetivo del escaneo
+            port_range (str): Rango de puertos "inicio-fin"
+            runner (callable): Función runner(job) -> dict con los resultados de scan_ports()
+            key (str): Opcional, clave de coalescencia (ver scan_cache.make_scan_key)
+            on_complete (callable): Opcional, on_complete(job) cuando termina con éxito
+            engine (str): Motor del escaneo, para las métricas
+            profile (str): Opcional, perfil de nmap que se guarda en ScanHistory
+
+        Returns:
+            tuple: (ScanJob, bool) - el trabajo y si se creó uno nuevo
+        """
+        self._prune()
+        while True:
+            with self._lock:
+                if key is not None:
+                    inflight = self._inflight.get(key)
+                    if inflight is not None and not inflight.finished:
+                        return inflight, False
+                pending = self._pending.get(key) if key is not None else None
+                if pending is None:
+                    active = sum(1 for job in self._jobs.values() if not job.finished) + self._reserved
+                    if active >= self.max_workers + self.max_queue:
+                        raise QueueFullError()
+                    # Se reserva el hueco bajo el lock; la BD y el almacén de admisión, fuera de él
+                    self._reserved += 1
+                    reservation = threading.Event()
+                    if key is not None:
+                        self._pending[key] = reservation
+                    break
+            # Otro envío con la misma clave está registrando su escaneo: se espera y se une a él
+            pending.wait()
+
+        job = None
+        try:
+            admission = self.app.extensions.get('scan_admission')
+            lease = uuid.uuid4().hex
+            if admission is not None and not admission.admit(lease):
+                raise QueueFullError()
+            try:
+                scan_record = ScanHistory(target=target, port_range=port_range, profile=profile, status='queued')
+                db.session.add(scan_record)
+                db.session.commit()
+            except Exception:
+                if admission is not None:
+                    admission.release(lease)
+                raise
+
+            job = ScanJob(scan_record.id, target, port_range, key=key, on_complete=on_complete, engine=engine,
+                          profile=profile, lease=lease)
+        finally:
+            with self._lock:
+                self._reserved -= 1
+                if key is not None:
+                    self._pending.pop(key, None)
+                if job is not None:
+                    self._jobs[job.scan_id] = job
+                    if key is not None:
+                        self._inflight[key] = job
+            reservation.set()
+        job.future = self._executor.submit(self._run, job, runner)
+        return job, True
+
+    def get(self, scan_id):
+        with self._lock:
+            return self._jobs.get(scan_id)
+
+    def cancel(self, scan_id):
+        """
+        Cancela un trabajo. Si aún está en cola no llega a ejecutarse; si ya está
+        corriendo, el runner puede atender job.cancel_event y el resultado se descarta.
+
+        Returns:
+            ScanJob | None: El trabajo, o None si no está en este proceso
+        """
+        job = self.get(scan_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, 'cancelled')
+        return job
+
+    def _run(self, job, runner):
+        with self.app.app_context():
+            if job.cancel_event.is_set():
+                self._finish(job, 'cancelled')
+                return
+
+            admission = self.app.extensions.get('scan_admission')
+            if admission is not None and not admission.wait_for_slot(job.lease, job.cancel_event):
+                self._finish(job, 'cancelled')
+                return
+
+            job.status = 'running'
+            job.started_at = time.time()
+            self._update_record(job.scan_id, status='running')
+
+            try:
+                results = runner(job)
+            except Exception as e:
+                results = {'error': f'Error inesperado durante el escaneo: {str(e)}'}
+            job.duration = time.time() - job.started_at
+
+            if job.cancel_event.is_set():
+                self._finish(job, 'cancelled')
+            else:
+                # Motores sin resultados parciales (nmap): los puertos se publican al final
+                if not job.streamed_ports:
+                    for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+                        for port_info in results.get(state, []):
+                            job.publish('port', port_info)
+                job.results = results
+                job.progress = 1.0
+                self._finish(job, 'failed' if 'error' in results else 'completed')
+
+    def _finish(self, job, status):
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+        admission = self.app.extensions.get('scan_admission')
+        if admission is not None:
+            admission.release(job.lease)
+        with self.app.app_context():
+            self._update_record(
+                job.scan_id,
+                status=status,
+                duration=job.duration,
+                results=job.results
+            )
+        if status == 'completed' and job.on_complete is not None:
+            try:
+                job.on_complete(job)
+            except Exception as e:
+                print(f"Error in scan {job.scan_id} completion hook: {e}")
+        metrics = self.app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.observe_scan(job)
+        # El resumen final se publica después de persistir, así lo que recibe el
+        # cliente es exactamente lo guardado en ScanHistory
+        done = job.to_dict()
+        if job.results is not None:
+            done.pop('results')
+            done['summary'] = job.results.get('summary')
+            done['error'] = job.results.get('error')
+        job.publish('done', done)
+
+    def _update_record(self, scan_id, results=None, **fields):
+        try:
+            scan_record = db.session.get(ScanHistory, scan_id)
+            if scan_record is None:
+                return
+            if results is not None:
+                delta_base = scan_record.choose_delta_base(self.snapshot_interval) if self.delta_storage else None
+                scan_record.set_results(results, store_json=self.store_json, delta_base=delta_base,
+                                        compress_level=self.compress_level)
+            for name, value in fields.items():
+                if value is not None:
+                    setattr(scan_record, name, value)
+            db.session.commit()
+        except Exception as db_error:
+            db.session.rollback()
+            print(f"Error updating scan {scan_id} in database: {db_error}")
+
+    def fail_orphaned(self, older_than=None):
+        """
+        Marca como failed los escaneos queued/running que ya nadie va a terminar
+
+        Args:
+            older_than (int): Segundos desde la creación a partir de los cuales una
+                fila sin trabajo en este proceso se da por huérfana (por defecto SCAN_STALE_AFTER)
+
+        Returns:
+            int: Filas marcadas
+        """
+        older_than = self.stale_after if older_than is None else older_than
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        with self._lock:
+            live = [scan_id for scan_id, job in self._jobs.items() if not job.finished]
+        orphaned = ScanHistory.query.filter(
+            ScanHistory.status.in_(('queued', 'running')),
+            ScanHistory.timestamp < cutoff,
+            ScanHistory.id.notin_(live)
+        ).all()
+        for scan_record in orphaned:
+            scan_record.store_results({
+                'error': 'El escaneo se interrumpió (el servidor se reinició o el worker terminó)',
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'target': scan_record.target,
+                'port_range': scan_record.port_range
+            }, self.compress_level)
+            scan_record.status = 'failed'
+        db.session.commit()
+        return len(orphaned)
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        with self._lock:
+            expired = [scan_id for scan_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for scan_id in expired:
+                del self._jobs[scan_id]
@@ -0,0 +1,193 @@
+import json
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import Text, cast, func
+from models import db, ScanHistory, ScanPort
+from scan_diff import PORT_STATE_LISTS
+from scan_jobs import ScanJobManager
+
+
+def payload_size():
+    """Expresión SQL con los bytes de resultados guardados en una fila (JSON, comprimido y delta)"""
+    return (
+        func.coalesce(func.length(cast(ScanHistory.scan_results, Text)), 0)
+        + func.coalesce(func.length(ScanHistory.scan_results_z), 0)
+        + func.coalesce(func.length(cast(ScanHistory.scan_delta, Text)), 0)
+    )
+
+
+def _stored_bytes(ids):
+    if not ids:
+        return 0
+    return int(db.session.execute(
+        db.select(func.coalesce(func.sum(payload_size()), 0)).where(ScanHistory.id.in_(ids))
+    ).scalar())
+
+
+def _drop_condition(now, full_days, rollup_days):
+    """Escaneos terminados más antiguos que rollup_days (todos se eliminan)"""
+    if not rollup_days:
+        return None
+    return db.and_(
+        ScanHistory.status.in_(ScanJobManager.FINAL_STATES),
+        ScanHistory.timestamp < now - timedelta(days=rollup_days)
+    )
+
+
+def _rollup_condition(now, full_days, rollup_days):
+    """
+    Escaneos terminados entre full_days y rollup_days que no son el último
+    escaneo completado de su objetivo, rango, perfil y día
+    """
+    if not full_days:
+        return None
+    window = [
+        ScanHistory.status.in_(ScanJobManager.FINAL_STATES),
+        ScanHistory.timestamp < now - timedelta(days=full_days)
+    ]
+    if rollup_days:
+        window.append(ScanHistory.timestamp >= now - timedelta(days=rollup_days))
+    keep = (
+        db.select(func.max(ScanHistory.id))
+        .where(*window, ScanHistory.status == 'completed')
+        .group_by(ScanHistory.target, ScanHistory.port_range, ScanHistory.profile, func.date(ScanHistory.timestamp))
+    )
+    return db.and_(*window, ScanHistory.id.not_in(keep))
+
+
+def _delete_scans(ids, store_json, compress_level):
+    """
+    Elimina los escaneos `ids` con sus puertos. Los deltas que se conservan y
+    se apoyan en alguno de ellos se rematerializan antes como snapshots completos.
+
+    Returns:
+        tuple: (bytes de resultados liberados en neto, deltas rematerializados)
+    """
+    dependents = ScanHistory.query.filter(
+        ScanHistory.base_scan_id.in_(ids),
+        ScanHistory.id.not_in(ids)
+    ).all()
+    dependent_ids = [scan.id for scan in dependents]
+    # Lo que crecen los deltas al rematerializarse se descuenta de lo liberado
+    reclaimed = -_stored_bytes(dependent_ids)
+    port_rows = []
+    for scan in dependents:
+        results = scan.results
+        scan.base_scan_id = None
+        scan.scan_delta = None
+        if store_json:
+            scan.store_results(results, compress_level)
+        else:
+            scan.store_results({key: value for key, value in results.items() if key not in PORT_STATE_LISTS},
+                               compress_level)
+        # Como delta solo tenía en scan_ports los puertos distintos del snapshot
+        port_rows.extend(ScanPort.rows_from_results(scan.id, results, scan.timestamp))
+    db.session.flush()
+    if dependent_ids:
+        ScanPort.query.filter(ScanPort.scan_id.in_(dependent_ids)).delete(synchronize_session=False)
+    if port_rows:
+        db.session.execute(db.insert(ScanPort), port_rows)
+
+    reclaimed += _stored_bytes(ids) - _stored_bytes(dependent_ids)
+    ScanPort.query.filter(ScanPort.scan_id.in_(ids)).delete(synchronize_session=False)
+    ScanHistory.query.filter(ScanHistory.id.in_(ids)).delete(synchronize_session=False)
+    return reclaimed, len(dependents)
+
+
+def compact_scans(full_days=30, rollup_days=365, compress_level=None, store_json=True,
+                  batch_size=500, pause=0.0, dry_run=False, now=None, log=print):
+    """
+    Aplica la política de retención de ScanHistory por lotes
+
+    - Los últimos full_days días se conservan completos.
+    - Entre full_days y rollup_days solo queda el último escaneo completado por
+      objetivo, rango y día.
+    - Lo anterior a rollup_days se elimina.
+    - Con compress_level, las filas con scan_results en JSON se pasan a scan_results_z.
+
+    Cada lote es una transacción corta (commit por lote), así nunca se bloquea
+    la tabla entera; `pause` deja respirar a los escaneos entre lotes.
+
+    Args:
+        full_days (int): Días con todo el historial (0 desactiva el rollup)
+        rollup_days (int): Días con un escaneo diario (0 conserva los rollups para siempre)
+        compress_level (int): Nivel zlib 0-9 para comprimir filas antiguas, o None
+        store_json (bool): Igual que SCAN_STORE_JSON, para los deltas rematerializados
+        batch_size (int): Filas por lote
+        pause (float): Segundos de espera entre lotes
+        dry_run (bool): Solo cuenta lo que se haría, sin modificar nada (sin
+            descontar lo que crecerían los deltas rematerializados)
+        now (datetime): Referencia temporal (por defecto datetime.utcnow())
+        log (callable): Función para los mensajes de progreso
+
+    Returns:
+        dict: Filas eliminadas, rematerializadas y comprimidas, y bytes liberados
+    """
+    if rollup_days and rollup_days < full_days:
+        raise ValueError('rollup_days debe ser mayor o igual que full_days')
+    now = now or datetime.utcnow()
+    report = {
+        'dry_run': dry_run,
+        'dropped': 0,
+        'rolled_up': 0,
+        'rematerialized': 0,
+        'compressed': 0,
+        'bytes_reclaimed': 0
+    }
+
+    for name, condition in (('dropped', _drop_condition(now, full_days, rollup_days)),
+                            ('rolled_up', _rollup_condition(now, full_days, rollup_days))):
+        if condition is None:
+            continue
+        if dry_run:
+            count, size = db.session.execute(
+                db.select(func.count(ScanHistory.id), func.coalesce(func.sum(payload_size()), 0)).where(condition)
+            ).one()
+            report[name] += count
+            report['bytes_reclaimed'] += int(size)
+            continue
+        while True:
+            ids = db.session.execute(
+                db.select(ScanHistory.id).where(condition).order_by(ScanHistory.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            reclaimed, rematerialized = _delete_scans(ids, store_json, compress_level)
+            db.session.commit()
+            report[name] += len(ids)
+            report['rematerialized'] += rematerialized
+            report['bytes_reclaimed'] += reclaimed
+            log(f"{name}: {report[name]} escaneos, {report['bytes_reclaimed']} bytes liberados")
+            if pause:
+                time.sleep(pause)
+
+    if compress_level is not None:
+        last_id = 0
+        while True:
+            scans = ScanHistory.query.filter(
+                ScanHistory.id > last_id,
+                ScanHistory.status.in_(ScanJobManager.FINAL_STATES),
+                ScanHistory.scan_results.isnot(None),
+                ScanHistory.scan_results_z.is_(None)
+            ).order_by(ScanHistory.id).limit(batch_size).all()
+            if not scans:
+                break
+            last_id = scans[-1].id
+            for scan in scans:
+                before = len(json.dumps(scan.scan_results).encode('utf-8'))
+                if not dry_run:
+                    scan.store_results(scan.scan_results, compress_level)
+                    after = len(scan.scan_results_z)
+                else:
+                    after = len(ScanHistory.compress_payload(scan.scan_results, compress_level))
+                report['compressed'] += 1
+                report['bytes_reclaimed'] += max(before - after, 0)
+            if dry_run:
+                db.session.rollback()
+                continue
+            db.session.commit()
+            log(f"compressed: {report['compressed']} escaneos, {report['bytes_reclaimed']} bytes liberados")
+            if pause:
+                time.sleep(pause)
+
+    return report
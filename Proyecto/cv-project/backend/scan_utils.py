@@ -1,99 +1,376 @@
 import nmap
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import math
+import os
 import socket
+import time
 
-def scan_ports(target, port_range):
+# Argumentos de nmap del escaneo completo: SYN scan, detección de SO, versiones, scripts y traceroute
+NMAP_ARGUMENTS = '-sS -O -A'
+
+# Barrido barato que solo averigua el estado de los puertos (sin versiones, SO ni scripts)
+SWEEP_ARGUMENTS = '-sS -T4'
+
+# Perfiles de escaneo de nmap (campo "profile" de /api/scan): argumentos, si se limita a los
+# puertos de get_common_ports() dentro del rango, si detecta servicios y versiones (y por tanto
+# puede reutilizar huellas, ver scan_ports_incremental) y timeout por defecto en segundos
+SCAN_PROFILES = {
+    'quick': {'arguments': SWEEP_ARGUMENTS, 'common_ports_only': True, 'fingerprints': False, 'timeout': 60},
+    'standard': {'arguments': '-sS -sV -T4', 'common_ports_only': False, 'fingerprints': True, 'timeout': 300},
+    'deep': {'arguments': NMAP_ARGUMENTS, 'common_ports_only': False, 'fingerprints': True, 'timeout': 900}
+}
+
+# Campos de un puerto que salen de la detección de servicios y versiones
+FINGERPRINT_FIELDS = ('name', 'product', 'version', 'extrainfo')
+DEFAULT_SCAN_PROFILE = 'quick'
+
+def _run_nmap(target, ports_spec, arguments, port_range, timeout=0):
+    """Ejecuta un proceso nmap sobre `ports_spec` y convierte su salida al formato de resultados"""
+    # Inicializar el escáner nmap
+    nm = nmap.PortScanner()
+    
+    # Realizar el escaneo (timeout 0 = sin límite; al superarlo python-nmap mata el proceso)
+    scan_result = nm.scan(target, ports_spec, arguments=arguments, timeout=timeout)
+    
+    # Procesar resultados
+    results = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'target': target,
+        'port_range': port_range,
+        'scan_info': {},
+        'host_info': {},
+        'open_ports': [],
+        'closed_ports': [],
+        'filtered_ports': []
+    }
+    
+    # Información general del escaneo
+    if 'nmap' in scan_result:
+        results['scan_info'] = {
+            'command_line': scan_result['nmap']['command_line'],
+            'scanstats': scan_result['nmap']['scanstats']
+        }
+    
+    # Procesar información del host
+    for host in nm.all_hosts():
+        host_info = {
+            'hostname': nm[host].hostname(),
+            'state': nm[host].state(),
+            'protocols': list(nm[host].all_protocols())
+        }
+        
+        # Obtener información del OS si está disponible
+        if 'osmatch' in nm[host]:
+            os_matches = []
+            for osmatch in nm[host]['osmatch']:
+                os_matches.append({
+                    'name': osmatch['name'],
+                    'accuracy': osmatch['accuracy']
+                })
+            host_info['os_matches'] = os_matches
+        
+        results['host_info'] = host_info
+        
+        # Procesar puertos para cada protocolo
+        for protocol in nm[host].all_protocols():
+            ports = nm[host][protocol].keys()
+            
+            for port in ports:
+                port_info = {
+                    'port': port,
+                    'protocol': protocol,
+                    'state': nm[host][protocol][port]['state'],
+                    'name': nm[host][protocol][port]['name'],
+                    'product': nm[host][protocol][port].get('product', ''),
+                    'version': nm[host][protocol][port].get('version', ''),
+                    'extrainfo': nm[host][protocol][port].get('extrainfo', '')
+                }
+                
+                # Clasificar puertos por estado
+                if port_info['state'] == 'open':
+                    results['open_ports'].append(port_info)
+                elif port_info['state'] == 'closed':
+                    results['closed_ports'].append(port_info)
+                elif port_info['state'] == 'filtered':
+                    results['filtered_ports'].append(port_info)
+    
+    # Agregar resumen
+    results['summary'] = build_summary(results)
+    
+    return results
+
+def scan_ports(target, port_range, arguments=NMAP_ARGUMENTS, ports=None, timeout=0):
     """
     Escanea puertos usando nmap en el objetivo especificado
     
     Args:
         target (str): Dirección IP o hostname a escanear (solo localhost/127.0.0.1)
         port_range (str): Rango de puertos en formato "inicio-fin" (ej: "22-443")
+        arguments (str): Argumentos de nmap (por defecto '-sS -O -A')
+        ports (list): Opcional, puertos a escanear en lugar del rango completo
+        timeout (int): Segundos máximos del proceso nmap (0 = sin límite)
     
     Returns:
         dict: Resultados del escaneo con información de puertos
     """
     try:
-        # Inicializar el escáner nmap
-        nm = nmap.PortScanner()
-        
-        # Realizar el escaneo
         print(f"🔍 Escaneando {target} en rango de puertos {port_range}...")
-        scan_result = nm.scan(target, port_range, arguments='-sS -O -A')
+        ports_spec = format_ports_spec(ports) if ports else port_range
+        results = _run_nmap(target, ports_spec, arguments, port_range, timeout=timeout)
         
-        # Procesar resultados
-        results = {
+        print(f"✅ Escaneo completado. Puertos abiertos: {len(results['open_ports'])}")
+        return results
+        
+    except nmap.PortScannerTimeout:
+        return _timeout_result(target, port_range, timeout)
+    
+    except nmap.PortScannerError as e:
+        error_msg = f"Error de nmap: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {
+            'error': error_msg,
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'target': target,
-            'port_range': port_range,
-            'scan_info': {},
-            'host_info': {},
-            'open_ports': [],
-            'closed_ports': [],
-            'filtered_ports': []
+            'port_range': port_range
         }
-        
-        # Información general del escaneo
-        if 'nmap' in scan_result:
-            results['scan_info'] = {
-                'command_line': scan_result['nmap']['command_line'],
-                'scanstats': scan_result['nmap']['scanstats']
-            }
-        
-        # Procesar información del host
-        for host in nm.all_hosts():
-            host_info = {
-                'hostname': nm[host].hostname(),
-                'state': nm[host].state(),
-                'protocols': list(nm[host].all_protocols())
-            }
-            
-            # Obtener información del OS si está disponible
-            if 'osmatch' in nm[host]:
-                os_matches = []
-                for osmatch in nm[host]['osmatch']:
-                    os_matches.append({
-                        'name': osmatch['name'],
-                        'accuracy': osmatch['accuracy']
-                    })
-                host_info['os_matches'] = os_matches
-            
-            results['host_info'] = host_info
-            
-            # Procesar puertos para cada protocolo
-            for protocol in nm[host].all_protocols():
-                ports = nm[host][protocol].keys()
-                
-                for port in ports:
-                    port_info = {
-                        'port': port,
-                        'protocol': protocol,
-                        'state': nm[host][protocol][port]['state'],
-                        'name': nm[host][protocol][port]['name'],
-                        'product': nm[host][protocol][port].get('product', ''),
-                        'version': nm[host][protocol][port].get('version', ''),
-                        'extrainfo': nm[host][protocol][port].get('extrainfo', '')
-                    }
-                    
-                    # Clasificar puertos por estado
-                    if port_info['state'] == 'open':
-                        results['open_ports'].append(port_info)
-                    elif port_info['state'] == 'closed':
-                        results['closed_ports'].append(port_info)
-                    elif port_info['state'] == 'filtered':
-                        results['filtered_ports'].append(port_info)
-        
-        # Agregar resumen
-        results['summary'] = {
-            'total_ports_scanned': len(results['open_ports']) + len(results['closed_ports']) + len(results['filtered_ports']),
-            'open_ports_count': len(results['open_ports']),
-            'closed_ports_count': len(results['closed_ports']),
-            'filtered_ports_count': len(results['filtered_ports'])
+    
+    except Exception as e:
+        error_msg = f"Error inesperado durante el escaneo: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {
+            'error': error_msg,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'target': target,
+            'port_range': port_range
         }
-        
+
+def _timeout_result(target, port_range, timeout):
+    error_msg = f"El escaneo superó el tiempo máximo de {timeout} s"
+    print(f"❌ {error_msg}")
+    return {
+        'error': error_msg,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'target': target,
+        'port_range': port_range
+    }
+
+def format_ports_spec(ports):
+    """
+    Especificación de nmap compacta para una lista de puertos ordenados
+
+    Args:
+        ports (list): Puertos ordenados, ej: [22, 80, 81, 82, 443]
+
+    Returns:
+        str: Especificación con los tramos consecutivos agrupados, ej: "22,80-82,443"
+    """
+    parts = []
+    start = previous = None
+    for port in ports:
+        if previous is not None and port == previous + 1:
+            previous = port
+            continue
+        if start is not None:
+            parts.append(f"{start}-{previous}" if previous > start else str(start))
+        start = previous = port
+    if start is not None:
+        parts.append(f"{start}-{previous}" if previous > start else str(start))
+    return ','.join(parts)
+
+def parse_ports_spec(spec):
+    """
+    Lista de puertos de una especificación de nmap (la inversa de format_ports_spec)
+
+    Args:
+        spec (str): Puertos y rangos separados por comas, ej: "22,80-82,443"
+
+    Returns:
+        list: Puertos ordenados y sin repetir
+    """
+    ports = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if '-' in part:
+            start_port, end_port = map(int, part.split('-'))
+            ports.update(range(start_port, end_port + 1))
+        elif part:
+            ports.add(int(part))
+    if any(port < 1 or port > 65535 for port in ports):
+        raise ValueError('Los puertos deben estar entre 1 y 65535')
+    return sorted(ports)
+
+def profile_ports(profile, port_range):
+    """
+    Puertos que escanea un perfil dentro del rango pedido
+
+    Args:
+        profile (str): Nombre del perfil (ver SCAN_PROFILES)
+        port_range (str): Rango de puertos en formato "inicio-fin"
+
+    Returns:
+        list | None: Puertos comunes del rango en los perfiles que se limitan a
+        ellos (lista vacía si no hay ninguno), o None para escanear el rango completo
+    """
+    if not SCAN_PROFILES[profile]['common_ports_only']:
+        return None
+    start_port, end_port = map(int, port_range.split('-'))
+    return sorted(port for port in get_common_ports() if start_port <= port <= end_port)
+
+def split_port_chunks(ports, chunk_size):
+    """
+    Divide una lista de puertos en bloques de como máximo chunk_size puertos
+
+    Args:
+        ports (list): Puertos ordenados
+        chunk_size (int): Tamaño máximo de cada bloque
+
+    Returns:
+        list: Pares (especificación de nmap, número de puertos), ej: [("1-250", 250), ("251-500", 250)]
+    """
+    chunks = []
+    for i in range(0, len(ports), chunk_size):
+        chunk = ports[i:i + chunk_size]
+        chunks.append((format_ports_spec(chunk), len(chunk)))
+    return chunks
+
+def merge_scan_results(target, port_range, parts, elapsed=None):
+    """
+    Une los resultados parciales de varios procesos nmap en un único resultado
+
+    Los puertos se deduplican por (puerto, protocolo), los protocolos y las
+    coincidencias de SO se unen (conservando la mayor precisión por nombre) y
+    el resumen se recalcula.
+
+    Args:
+        target (str): Objetivo del escaneo
+        port_range (str): Rango de puertos original
+        parts (list): Resultados parciales de _run_nmap()
+        elapsed (float): Opcional, duración total real del escaneo en segundos
+
+    Returns:
+        dict: Resultado con la misma estructura que scan_ports()
+    """
+    results = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'target': target,
+        'port_range': port_range,
+        'scan_info': {},
+        'host_info': {},
+        'open_ports': [],
+        'closed_ports': [],
+        'filtered_ports': []
+    }
+    seen_ports = set()
+    protocols = []
+    os_matches = {}
+
+    for part in parts:
+        if not results['scan_info'] and part.get('scan_info'):
+            results['scan_info'] = dict(part['scan_info'])
+
+        host_info = part.get('host_info') or {}
+        if host_info and not results['host_info']:
+            results['host_info'] = {'hostname': host_info.get('hostname'), 'state': host_info.get('state')}
+        for protocol in host_info.get('protocols', []):
+            if protocol not in protocols:
+                protocols.append(protocol)
+        for osmatch in host_info.get('os_matches', []):
+            best = os_matches.get(osmatch['name'])
+            if best is None or int(osmatch['accuracy']) > int(best['accuracy']):
+                os_matches[osmatch['name']] = osmatch
+
+        for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+            for port_info in part.get(state, []):
+                key = (port_info['port'], port_info['protocol'])
+                if key not in seen_ports:
+                    seen_ports.add(key)
+                    results[state].append(port_info)
+
+    if results['host_info']:
+        results['host_info']['protocols'] = protocols
+        if os_matches:
+            results['host_info']['os_matches'] = sorted(os_matches.values(), key=lambda m: -int(m['accuracy']))
+
+    for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+        results[state].sort(key=lambda p: (p['port'], p['protocol']))
+
+    results['scan_info']['chunks'] = len(parts)
+    if elapsed is not None and 'scanstats' in results['scan_info']:
+        results['scan_info']['scanstats'] = dict(results['scan_info']['scanstats'], elapsed=f"{elapsed:.2f}")
+
+    results['summary'] = build_summary(results)
+    return results
+
+def scan_ports_parallel(target, port_range, workers=None, chunk_size=None, arguments=NMAP_ARGUMENTS,
+                        on_port=None, on_progress=None, cancel_event=None, ports=None, timeout=0):
+    """
+    Escanea puertos repartiendo el rango en bloques entre varios procesos nmap en paralelo
+
+    Cada bloque es un proceso nmap independiente, así que un pool de hilos basta
+    para ocupar varios núcleos. `timeout` limita el escaneo completo: cada bloque
+    recibe el tiempo que queda al empezar. Devuelve la misma estructura que scan_ports().
+
+    Args:
+        target (str): Dirección IP o hostname a escanear (solo localhost/127.0.0.1)
+        port_range (str): Rango de puertos en formato "inicio-fin" (ej: "22-443")
+        workers (int): Procesos nmap simultáneos (por defecto, número de CPUs)
+        chunk_size (int): Puertos por bloque (por defecto, 4 bloques por worker)
+        arguments (str): Argumentos de nmap (por defecto '-sS -O -A')
+        on_port (callable): Opcional, on_port(port_info, done, total) por cada puerto de un bloque terminado
+        on_progress (callable): Opcional, on_progress(done, total) al terminar cada bloque
+        cancel_event (threading.Event): Opcional, evita lanzar los bloques pendientes cuando se activa
+        ports (list): Opcional, puertos a escanear en lugar del rango completo
+        timeout (int): Segundos máximos del escaneo completo (0 = sin límite)
+
+    Returns:
+        dict: Resultados del escaneo con información de puertos
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def run_chunk(spec):
+        remaining = 0
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise nmap.PortScannerTimeout('Timeout from nmap process')
+        return _run_nmap(target, spec, arguments, port_range, remaining)
+
+    try:
+        ports = ports or parse_port_range(port_range)
+        workers = max(1, workers or os.cpu_count() or 1)
+        chunk_size = chunk_size or max(1, math.ceil(len(ports) / (workers * 4)))
+        chunks = split_port_chunks(ports, chunk_size)
+
+        print(f"🔍 Escaneando {target} en rango de puertos {port_range} ({len(chunks)} bloques, {workers} workers)...")
+        start_time = time.time()
+        parts = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nmap-chunk') as executor:
+            futures = {executor.submit(run_chunk, spec): count for spec, count in chunks}
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                part = future.result()
+                parts.append(part)
+                done += futures[future]
+                if on_port is not None:
+                    for state in ('open_ports', 'closed_ports', 'filtered_ports'):
+                        for port_info in part[state]:
+                            on_port(port_info, done, len(ports))
+                if on_progress is not None:
+                    on_progress(done, len(ports))
+
+        results = merge_scan_results(target, port_range, parts, elapsed=time.time() - start_time)
         print(f"✅ Escaneo completado. Puertos abiertos: {len(results['open_ports'])}")
         return results
-        
+
+    except nmap.PortScannerTimeout:
+        return _timeout_result(target, port_range, timeout)
+
     except nmap.PortScannerError as e:
         error_msg = f"Error de nmap: {str(e)}"
         print(f"❌ {error_msg}")
@@ -103,7 +380,313 @@ def scan_ports(target, port_range):
             'target': target,
             'port_range': port_range
         }
-    
+
+    except Exception as e:
+        error_msg = f"Error inesperado durante el escaneo: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {
+            'error': error_msg,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'target': target,
+            'port_range': port_range
+        }
+
+def scan_ports_incremental(target, port_range, fingerprints, arguments=NMAP_ARGUMENTS, ports=None, timeout=0,
+                           sweep=None, refresh=False):
+    """
+    Escaneo con detección de versiones que solo vuelve a identificar los puertos que lo necesitan
+
+    Primero hace un barrido de estados (SWEEP_ARGUMENTS) y después lanza nmap con
+    `arguments` únicamente sobre los puertos abiertos sin huella vigente en
+    `fingerprints` (recién abiertos o con la huella caducada). Las huellas
+    guardadas se copian en el resto. Cada puerto abierto lleva "fingerprint":
+    "fresh" o "cached" (con "fingerprinted_at"), y scan_info["fingerprints"] los
+    cuenta. Si `arguments` detecta el SO (-O o -A), el resultado del host también
+    se guarda y se reutiliza (host_info["os_fingerprint"]); sin él en caché, la
+    detección incluye al menos un puerto abierto para que nmap pueda obtenerlo.
+    Ambas pasadas comparten `timeout`. Devuelve la misma estructura que scan_ports().
+
+    Args:
+        target (str): Dirección IP o hostname a escanear (solo localhost/127.0.0.1)
+        port_range (str): Rango de puertos en formato "inicio-fin" (ej: "22-443")
+        fingerprints: Almacén de huellas con get/set(target, port, protocol[, fingerprint]) y get_host/set_host(target[, host])
+        arguments (str): Argumentos de nmap de la detección (por defecto '-sS -O -A')
+        ports (list): Opcional, puertos a escanear en lugar del rango completo
+        timeout (int): Segundos máximos del escaneo completo, barrido y detección (0 = sin límite)
+        sweep (callable): Opcional, sweep(arguments, timeout) -> resultados del barrido (ej: con scan_ports_parallel)
+        refresh (bool): Si es True ignora las huellas guardadas y vuelve a identificar todos los puertos abiertos
+
+    Returns:
+        dict: Resultados del escaneo con información de puertos
+    """
+    try:
+        print(f"🔍 Escaneando {target} en rango de puertos {port_range} (huellas incrementales)...")
+        deadline = time.monotonic() + timeout if timeout else None
+        ports_spec = format_ports_spec(ports) if ports else port_range
+        if sweep is None:
+            results = _run_nmap(target, ports_spec, SWEEP_ARGUMENTS, port_range, timeout=timeout)
+        else:
+            results = sweep(SWEEP_ARGUMENTS, timeout)
+            if 'error' in results:
+                return results
+
+        cached = {}
+        stale = []
+        for port_info in results['open_ports']:
+            fingerprint = None if refresh else fingerprints.get(target, port_info['port'], port_info['protocol'])
+            if fingerprint is None:
+                stale.append(port_info['port'])
+            else:
+                cached[(port_info['port'], port_info['protocol'])] = fingerprint
+
+        detect_os = bool({'-O', '-A'} & set(arguments.split()))
+        host = None
+        if detect_os:
+            host = None if refresh else fingerprints.get_host(target)
+            if host is None and not stale and results['open_ports']:
+                # nmap necesita un puerto abierto para identificar el SO: se vuelve a identificar el primero
+                first = results['open_ports'][0]
+                cached.pop((first['port'], first['protocol']), None)
+                stale.append(first['port'])
+
+        fresh = {}
+        host_fresh = False
+        if stale:
+            remaining = timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return _timeout_result(target, port_range, timeout)
+            detail = _run_nmap(target, format_ports_spec(sorted(stale)), arguments, port_range, timeout=remaining)
+            fingerprinted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for port_info in detail['open_ports']:
+                fingerprint = {field: port_info.get(field, '') for field in FINGERPRINT_FIELDS}
+                fingerprint['fingerprinted_at'] = fingerprinted_at
+                fresh[(port_info['port'], port_info['protocol'])] = fingerprint
+                fingerprints.set(target, port_info['port'], port_info['protocol'], fingerprint)
+            if detect_os:
+                # También sin coincidencias, para no repetir la detección en cada escaneo
+                host = {'os_matches': detail['host_info'].get('os_matches', []), 'fingerprinted_at': fingerprinted_at}
+                host_fresh = True
+                fingerprints.set_host(target, host)
+            results['scan_info']['fingerprint_command_line'] = detail['scan_info'].get('command_line')
+
+        if host is not None:
+            if host['os_matches']:
+                results['host_info']['os_matches'] = host['os_matches']
+            results['host_info']['os_fingerprint'] = 'fresh' if host_fresh else 'cached'
+            results['host_info']['os_fingerprinted_at'] = host.get('fingerprinted_at')
+
+        # Un puerto que se cerró entre el barrido y la detección queda sin marca ni huella
+        for port_info in results['open_ports']:
+            key = (port_info['port'], port_info['protocol'])
+            if key in fresh:
+                port_info.update({field: fresh[key][field] for field in FINGERPRINT_FIELDS})
+                port_info['fingerprint'] = 'fresh'
+            elif key in cached:
+                port_info.update({field: cached[key].get(field, '') for field in FINGERPRINT_FIELDS})
+                port_info['fingerprint'] = 'cached'
+                port_info['fingerprinted_at'] = cached[key].get('fingerprinted_at')
+
+        results['scan_info']['fingerprints'] = {'fresh': len(fresh), 'cached': len(cached)}
+        print(f"✅ Escaneo completado. Puertos abiertos: {len(results['open_ports'])} "
+              f"({len(fresh)} huellas nuevas, {len(cached)} reutilizadas)")
+        return results
+
+    except nmap.PortScannerTimeout:
+        return _timeout_result(target, port_range, timeout)
+
+    except nmap.PortScannerError as e:
+        error_msg = f"Error de nmap: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {
+            'error': error_msg,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'target': target,
+            'port_range': port_range
+        }
+
+    except Exception as e:
+        error_msg = f"Error inesperado durante el escaneo: {str(e)}"
+        print(f"❌ {error_msg}")
+        return {
+            'error': error_msg,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'target': target,
+            'port_range': port_range
+        }
+
+def build_summary(results):
+    """
+    Calcula el resumen de conteos a partir de las listas de puertos
+
+    Args:
+        results (dict): Resultados con open_ports, closed_ports y filtered_ports
+
+    Returns:
+        dict: Resumen con el total y el conteo por estado
+    """
+    return {
+        'total_ports_scanned': len(results['open_ports']) + len(results['closed_ports']) + len(results['filtered_ports']),
+        'open_ports_count': len(results['open_ports']),
+        'closed_ports_count': len(results['closed_ports']),
+        'filtered_ports_count': len(results['filtered_ports'])
+    }
+
+def parse_port_range(port_range):
+    """
+    Convierte un rango "inicio-fin" en la lista de puertos que contiene
+
+    Args:
+        port_range (str): Rango en formato "inicio-fin"
+
+    Returns:
+        list: Puertos del rango, ambos extremos incluidos
+    """
+    start_port, end_port = map(int, port_range.split('-'))
+    return list(range(start_port, end_port + 1))
+
+def _service_name(port):
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return ''
+
+def _connect_port_info(port, state):
+    return {
+        'port': port,
+        'protocol': 'tcp',
+        'state': state,
+        'name': _service_name(port),
+        'product': '',
+        'version': '',
+        'extrainfo': ''
+    }
+
+async def _probe_port(loop, address, port, timeout):
+    # Mismo criterio que check_single_port(), pero sin bloquear el event loop:
+    # conexión aceptada = open, rechazada (RST) = closed, sin respuesta = filtered
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+        return 'open'
+    except ConnectionRefusedError:
+        return 'closed'
+    except (asyncio.TimeoutError, OSError):
+        return 'filtered'
+    finally:
+        sock.close()
+
+async def _connect_scan(address, ports, concurrency, timeout, on_port, cancel_event):
+    loop = asyncio.get_running_loop()
+    port_infos = {}
+    pending = iter(ports)
+    total = len(ports)
+
+    async def worker():
+        # Cada worker toma el siguiente puerto pendiente: nunca hay más de
+        # `concurrency` conexiones abiertas a la vez
+        for port in pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            state = await _probe_port(loop, address, port, timeout)
+            port_infos[port] = _connect_port_info(port, state)
+            if on_port is not None:
+                on_port(port_infos[port], len(port_infos), total)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total) or 1)))
+    return port_infos
+
+async def _probe_states(address, ports, concurrency, timeout):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def probe(port):
+        async with semaphore:
+            return port, await _probe_port(loop, address, port, timeout)
+
+    return dict(await asyncio.gather(*(probe(port) for port in ports)))
+
+def probe_ports(target, ports, concurrency=100, timeout=0.5):
+    """
+    Estado de una lista de puertos con conexiones TCP concurrentes
+
+    Mismo criterio que check_single_port() pero todos a la vez y sin buscar el
+    nombre del servicio, para que se pueda repetir cada pocos segundos.
+
+    Args:
+        target (str): Dirección IP o hostname
+        ports (list): Puertos a comprobar
+        concurrency (int): Conexiones simultáneas máximas
+        timeout (float): Segundos de espera por puerto antes de marcarlo como filtrado
+
+    Returns:
+        dict: {puerto: 'open' | 'closed' | 'filtered'}
+    """
+    address = socket.gethostbyname(target)
+    return asyncio.run(_probe_states(address, ports, concurrency, timeout))
+
+def scan_ports_connect(target, port_range, concurrency=500, timeout=1.0, on_port=None, cancel_event=None):
+    """
+    Escanea puertos con conexiones TCP concurrentes (asyncio), sin lanzar nmap
+
+    No detecta sistema operativo ni versiones, pero devuelve la misma estructura
+    que scan_ports() (open_ports/closed_ports/filtered_ports/summary).
+
+    Args:
+        target (str): Dirección IP o hostname a escanear (solo localhost/127.0.0.1)
+        port_range (str): Rango de puertos en formato "inicio-fin" (ej: "22-443")
+        concurrency (int): Conexiones simultáneas máximas
+        timeout (float): Segundos de espera por puerto antes de marcarlo como filtrado
+        on_port (callable): Opcional, on_port(port_info, done, total) tras cada puerto
+        cancel_event (threading.Event): Opcional, detiene el escaneo cuando se activa
+
+    Returns:
+        dict: Resultados del escaneo con información de puertos
+    """
+    try:
+        ports = parse_port_range(port_range)
+        address = socket.gethostbyname(target)
+
+        print(f"🔍 Escaneando (connect) {target} en rango de puertos {port_range}...")
+        start_time = time.time()
+        port_infos = asyncio.run(_connect_scan(address, ports, concurrency, timeout, on_port, cancel_event))
+        elapsed = time.time() - start_time
+
+        results = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'target': target,
+            'port_range': port_range,
+            'scan_info': {
+                'engine': 'connect',
+                'scanstats': {
+                    'timestr': time.ctime(start_time),
+                    'elapsed': f"{elapsed:.2f}",
+                    'uphosts': '1',
+                    'downhosts': '0',
+                    'totalhosts': '1'
+                }
+            },
+            'host_info': {
+                'hostname': target,
+                'state': 'up',
+                'protocols': ['tcp']
+            },
+            'open_ports': [],
+            'closed_ports': [],
+            'filtered_ports': []
+        }
+
+        for port in sorted(port_infos):
+            port_info = port_infos[port]
+            results[f"{port_info['state']}_ports"].append(port_info)
+
+        results['summary'] = build_summary(results)
+
+        print(f"✅ Escaneo completado. Puertos abiertos: {len(results['open_ports'])}")
+        return results
+
     except Exception as e:
         error_msg = f"Error inesperado durante el escaneo: {str(e)}"
         print(f"❌ {error_msg}")
@@ -0,0 +1,108 @@
+import hashlib
+import io
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+from flask import abort, send_file
+from werkzeug.security import safe_join
+from cache import LRUCache
+
+# Nombres direccionados por contenido ("<sha256 truncado>.<ext>"): su contenido nunca cambia
+CONTENT_HASH_NAME = re.compile(r'^(?P<digest>[0-9a-f]{32,64})\.[a-z0-9]+$')
+
+# Un año, el máximo recomendado para recursos inmutables
+IMMUTABLE_MAX_AGE = 31536000
+
+_READ_CHUNK = 64 * 1024
+
+
+def file_digest(path):
+    """SHA-256 del archivo leyendo por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadServer:
+    """
+    Sirve /uploads con caché HTTP: ETag fuerte, Last-Modified, 304 y rangos de bytes
+
+    Los archivos con nombre direccionado por contenido se marcan como inmutables
+    durante un año; el resto se revalida en cada uso (no-cache + ETag). Los
+    archivos pequeños más pedidos se guardan en un LRU en memoria
+    (UPLOAD_CACHE_SIZE entradas de hasta UPLOAD_CACHE_MAX_FILE bytes) para no
+    tocar el disco en las peticiones repetidas.
+    """
+
+    def __init__(self, app=None):
+        self.folder = None
+        self._files = None
+        self._etags = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+        self.max_cached_file = app.config.get('UPLOAD_CACHE_MAX_FILE', 256 * 1024)
+        cache_size = app.config.get('UPLOAD_CACHE_SIZE', 32)
+        self._files = LRUCache(maxsize=cache_size) if cache_size else None
+        self._etags = LRUCache(maxsize=1024)
+        app.extensions['upload_server'] = self
+
+    def _etag(self, path, filename, stat):
+        match = CONTENT_HASH_NAME.match(filename)
+        if match:
+            return match.group('digest')
+        # Resto de archivos: hash del contenido, recalculado solo si cambia el archivo
+        key = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+        etag = self._etags.get(key)
+        if etag is None:
+            etag = file_digest(path)[:32]
+            self._etags.set(key, etag)
+        return etag
+
+    def send(self, filename):
+        """Respuesta para GET/HEAD /uploads/<filename> (304, 206 o 200 según la petición)"""
+        path = safe_join(self.folder, filename)
+        # Los archivos ocultos incluyen los temporales de subidas en curso
+        if path is None or filename.startswith('.'):
+            abort(404)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            abort(404)
+        if not os.path.isfile(path):
+            abort(404)
+
+        etag = self._etag(path, filename, stat)
+        last_modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        source = path
+        if self._files is not None and stat.st_size <= self.max_cached_file:
+            key = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+            data = self._files.get(key)
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self._files.set(key, data)
+            source = io.BytesIO(data)
+
+        immutable = CONTENT_HASH_NAME.match(filename) is not None
+        # send_file con conditional=True resuelve If-None-Match, If-Modified-Since y Range
+        response = send_file(
+            source,
+            mimetype=mimetype,
+            conditional=True,
+            etag=etag,
+            last_modified=last_modified,
+            max_age=IMMUTABLE_MAX_AGE if immutable else 0
+        )
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from flask import Request, current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import RequestEntityTooLarge
+from models import db, Profile, UploadBlob
+from upload_serving import CONTENT_HASH_NAME
+
+# Prefijo de los temporales de subida: UploadServer no los sirve y gc() limpia los abandonados
+TEMP_PREFIX = '.upload-'
+
+_COPY_CHUNK = 64 * 1024
+
+
+class HashingFile:
+    """
+    Temporal en la carpeta de subidas que calcula el SHA-256 y el tamaño mientras se escribe
+
+    Corta la subida con 413 en cuanto se pasa de max_bytes, sin esperar al final
+    del cuerpo. Al cerrarse sin commit() el temporal se elimina.
+    """
+
+    def __init__(self, folder, max_bytes=None):
+        self._file = tempfile.NamedTemporaryFile(dir=folder, prefix=TEMP_PREFIX, suffix='.tmp', delete=False)
+        self.path = self._file.name
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+        self._hash = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            # El parser no cierra el contenedor al abortar: borrar el temporal aquí
+            self.close()
+            raise RequestEntityTooLarge(f'El archivo supera el máximo de {self.max_bytes} bytes')
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def commit(self, path):
+        """Mueve el temporal a `path` de forma atómica; si ya existe (duplicado) lo descarta"""
+        self._file.close()
+        self.committed = True
+        if os.path.exists(path):
+            os.unlink(self.path)
+            return False
+        # NamedTemporaryFile lo crea con 0600: se publica legible como el resto de /uploads
+        os.chmod(self.path, 0o644)
+        os.replace(self.path, path)
+        return True
+
+    def close(self):
+        self._file.close()
+        if not self.committed:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read, seek, tell, flush... del archivo subyacente (FileStorage los necesita)
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request que escribe los archivos multipart directamente en un HashingFile del UploadStore"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        store = current_app.extensions.get('upload_store')
+        if store is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return store.open_temp()
+
+
+class UploadStore:
+    """
+    Almacén de subidas direccionado por contenido
+
+    Cada archivo se guarda como "<sha256 truncado>.<ext>", así dos subidas
+    iguales comparten archivo y dos distintas con el mismo nombre no se pisan.
+    Los archivos no referenciados por ningún Profile (photo_filename y sus
+    variantes) se eliminan con gc(). La última vez que se guardó o reutilizó
+    cada archivo se anota en UploadBlob, no en su mtime: los archivos son
+    inmutables y su Last-Modified no debe cambiar.
+    """
+
+    # Longitud del hash en el nombre, igual que las variantes de photo_variants
+    DIGEST_LENGTH = 32
+
+    def __init__(self, app=None):
+        self.folder = None
+        self.max_bytes = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+        self.max_bytes = app.config.get('UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+        # Rechazo temprano por Content-Length (con margen para las cabeceras multipart);
+        # sin Content-Length el límite lo aplica HashingFile al escribir
+        if self.max_bytes and not app.config.get('MAX_CONTENT_LENGTH'):
+            app.config['MAX_CONTENT_LENGTH'] = self.max_bytes + 64 * 1024
+        app.request_class = UploadRequest
+        app.extensions['upload_store'] = self
+
+    def open_temp(self):
+        return HashingFile(self.folder, self.max_bytes)
+
+    def save(self, file_storage, extension):
+        """
+        Guarda una subida con su nombre por contenido
+
+        Args:
+            file_storage (FileStorage): Archivo de request.files
+            extension (str): Extensión ya validada (sin punto)
+
+        Returns:
+            tuple: (nombre del archivo, bool indicando si el contenido era nuevo)
+        """
+        stream = file_storage.stream
+        if not isinstance(stream, HashingFile):
+            # Subidas que no pasaron por UploadRequest: copiar por bloques calculando el hash
+            temp = self.open_temp()
+            try:
+                shutil.copyfileobj(stream, temp, _COPY_CHUNK)
+            except Exception:
+                temp.close()
+                raise
+            stream = temp
+
+        filename = f"{stream.hexdigest()[:self.DIGEST_LENGTH]}.{extension.lower()}"
+        created = stream.commit(os.path.join(self.folder, filename))
+        self.record(filename, stream.size)
+        metrics = current_app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.observe_upload(stream.size, created)
+        return filename, created
+
+    @staticmethod
+    def record(filename, size):
+        """Anota que el archivo se acaba de guardar o reutilizar: gc() cuenta la gracia desde aquí"""
+        now = datetime.utcnow()
+        for _ in range(2):
+            try:
+                if not UploadBlob.query.filter_by(filename=filename).update({'last_referenced_at': now}):
+                    db.session.add(UploadBlob(filename=filename, size=size, last_referenced_at=now))
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Otra petición insertó la misma fila a la vez: el segundo intento la actualiza
+                db.session.rollback()
+
+    @staticmethod
+    def reference_counts():
+        """Número de perfiles que usan cada archivo (foto original y sus variantes)"""
+        counts = {}
+        for photo_filename, variants in Profile.query.with_entities(Profile.photo_filename, Profile.photo_variants):
+            names = {photo_filename} if photo_filename else set()
+            for variant in (variants or {}).values():
+                if isinstance(variant, dict) and variant.get('filename'):
+                    names.add(variant['filename'])
+            for name in names:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def gc(self, grace_seconds=3600, dry_run=False):
+        """
+        Elimina los archivos por contenido sin referencias y los temporales abandonados
+
+        Los archivos con otros nombres (default.png, subidas anteriores al
+        almacén) no se tocan.
+
+        Args:
+            grace_seconds (int): Antigüedad mínima para borrar, para no competir
+                                 con subidas o variantes que aún no llegaron a la BD
+            dry_run (bool): Solo informa, sin borrar
+
+        Returns:
+            dict: Archivos eliminados y bytes liberados
+        """
+        counts = self.reference_counts()
+        last_referenced = dict(UploadBlob.query.with_entities(UploadBlob.filename, UploadBlob.last_referenced_at))
+        cutoff = time.time() - grace_seconds
+        cutoff_at = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        report = {'dry_run': dry_run, 'removed': [], 'bytes_reclaimed': 0, 'referenced': len(counts)}
+
+        for entry in os.scandir(self.folder):
+            if not entry.is_file() or counts.get(entry.name):
+                continue
+            if not (CONTENT_HASH_NAME.match(entry.name) or entry.name.startswith(TEMP_PREFIX)):
+                continue
+            stat = entry.stat()
+            # Sin fila (temporales y archivos anteriores a UploadBlob) cuenta la fecha del archivo
+            referenced_at = last_referenced.get(entry.name)
+            if referenced_at is not None and referenced_at > cutoff_at:
+                continue
+            if referenced_at is None and stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+            report['removed'].append(entry.name)
+            report['bytes_reclaimed'] += stat.st_size
+
+        removed = [name for name in report['removed'] if name in last_referenced]
+        if removed and not dry_run:
+            UploadBlob.query.filter(UploadBlob.filename.in_(removed)).delete(synchronize_session=False)
+            db.session.commit()
+        return report
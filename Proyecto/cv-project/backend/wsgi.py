@@ -0,0 +1,10 @@
+"""
+Punto de entrada WSGI para producción
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+El esquema no se crea aquí: ejecute antes `flask --app app init-db`.
+"""
+from app import create_app
+
+app = create_app()
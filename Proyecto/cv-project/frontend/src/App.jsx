@@ -100,7 +100,11 @@ function App() {
         // Optimistically update the UI
         setCvData(prevData => ({
           ...prevData,
-          profile: { ...prevData.profile, photo_url: response.data.photo_url }
+          profile: {
+            ...prevData.profile,
+            photo_url: response.data.photo_url,
+            photo_srcset: response.data.photo_srcset
+          }
         }));
       } else {
         throw new Error(response.data.error || 'Failed to upload photo.');
@@ -205,7 +209,13 @@ function App() {
             transition={{ type: 'spring', stiffness: 300 }}
           >
             {cvData.profile.photo_url ? (
-              <img src={cvData.profile.photo_url} alt="Profile" className="profile-photo" />
+              <img
+                src={cvData.profile.photo_url}
+                srcSet={cvData.profile.photo_srcset || undefined}
+                sizes="160px"
+                alt="Profile"
+                className="profile-photo"
+              />
             ) : (
               <div className="profile-photo-placeholder">
                 <User size={80} />
@@ -3,13 +3,57 @@ import axios from 'axios'
 import { Shield, Search, AlertTriangle, CheckCircle, XCircle, Filter } from 'lucide-react'
 
 const API_BASE_URL = 'http://localhost:5000'
+const POLL_INTERVAL_MS = 1000
+
+// Perfiles de nmap del backend: el rápido solo mira los puertos comunes del rango
+const SCAN_PROFILES = [
+  { value: 'quick', label: 'Rápido (puertos comunes, sin detección de SO)' },
+  { value: 'standard', label: 'Estándar (versiones de servicios)' },
+  { value: 'deep', label: 'Profundo (SO, versiones, scripts y traceroute)' }
+]
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
 
 const NmapScanner = () => {
   const [portRange, setPortRange] = useState('22-443')
+  const [profile, setProfile] = useState('quick')
   const [target] = useState('localhost') // Fixed to localhost for security
   const [scanning, setScanning] = useState(false)
   const [results, setResults] = useState(null)
   const [error, setError] = useState(null)
+  const [progress, setProgress] = useState(null)
+  const [liveOpenPorts, setLiveOpenPorts] = useState([])
+
+  // Recibe por SSE cada puerto y el progreso; se resuelve con el evento final 'done'
+  const streamScan = (scanId) => new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}/api/scan/${scanId}/events`)
+    source.addEventListener('port', (event) => {
+      // Solo los abiertos se muestran en vivo; el resto se cuenta en el progreso
+      const port = JSON.parse(event.data)
+      if (port.state === 'open') setLiveOpenPorts(prev => [...prev, port])
+    })
+    source.addEventListener('progress', (event) => {
+      setProgress(JSON.parse(event.data))
+    })
+    source.addEventListener('done', (event) => {
+      source.close()
+      resolve(JSON.parse(event.data))
+    })
+    source.onerror = () => {
+      source.close()
+      reject(new Error('stream closed'))
+    }
+  })
+
+  // Devuelve el escaneo completo (con host_info) una vez terminado
+  const pollScan = async (scanId) => {
+    while (true) {
+      const statusResponse = await axios.get(`${API_BASE_URL}/api/scan/${scanId}`)
+      const job = statusResponse.data
+      if (job.status !== 'queued' && job.status !== 'running') return job
+      await sleep(POLL_INTERVAL_MS)
+    }
+  }
 
   const handleScan = async () => {
     if (!portRange.trim()) {
@@ -28,13 +72,32 @@ const NmapScanner = () => {
       setScanning(true)
       setError(null)
       setResults(null)
+      setProgress(null)
+      setLiveOpenPorts([])
 
-      const response = await axios.post(`${API_BASE_URL}/api/scan`, {
+      // El backend encola el escaneo y devuelve su id; seguimos el progreso en vivo
+      // por SSE y, si el navegador o la red no lo permiten, consultando el estado
+      const submitResponse = await axios.post(`${API_BASE_URL}/api/scan`, {
         port_range: portRange.trim(),
-        target: target
+        target: target,
+        profile: profile
       })
 
-      setResults(response.data)
+      const scanId = submitResponse.data.scan_id
+      try {
+        if (typeof EventSource === 'undefined') throw new Error('SSE no soportado')
+        await streamScan(scanId)
+      } catch (streamError) {
+        console.warn('Scan stream unavailable, polling instead:', streamError)
+      }
+      const job = await pollScan(scanId)
+
+      if (job.status === 'cancelled') {
+        setError('El escaneo fue cancelado')
+        return
+      }
+
+      setResults(job)
     } catch (err) {
       if (err.response && err.response.data && err.response.data.error) {
         setError(err.response.data.error)
@@ -128,6 +191,20 @@ const NmapScanner = () => {
         </small>
       </div>
 
+      <div className="input-group">
+        <label htmlFor="scanProfile">Tipo de Escaneo:</label>
+        <select
+          id="scanProfile"
+          value={profile}
+          onChange={(e) => setProfile(e.target.value)}
+          disabled={scanning}
+        >
+          {SCAN_PROFILES.map(option => (
+            <option key={option.value} value={option.value}>{option.label}</option>
+          ))}
+        </select>
+      </div>
+
       <div className="input-group">
         <label>Objetivo:</label>
         <input
@@ -160,6 +237,19 @@ const NmapScanner = () => {
         )}
       </button>
 
+      {scanning && progress && (
+        <div style={{ marginTop: '1rem', color: 'var(--text-light)', fontSize: '0.9rem' }}>
+          Progreso: {progress.done}/{progress.total} puertos ({Math.round(progress.progress * 100)}%)
+          {progress.eta != null && ` · ETA ${Math.ceil(progress.eta)}s`}
+        </div>
+      )}
+
+      {scanning && liveOpenPorts.length > 0 && (
+        <div className="scan-results">
+          {renderPortList(liveOpenPorts, 'Puertos Abiertos (en vivo)', 'open')}
+        </div>
+      )}
+
       {error && (
         <div className="alert alert-error" style={{ marginTop: '1rem' }}>
           <AlertTriangle size={16} style={{ display: 'inline', marginRight: '0.5rem' }} />
@@ -186,6 +276,7 @@ const NmapScanner = () => {
           }}>
             <p><strong>Objetivo:</strong> {results.target}</p>
             <p><strong>Rango:</strong> {results.port_range}</p>
+            {results.profile && <p><strong>Perfil:</strong> {results.profile}</p>}
             <p><strong>Timestamp:</strong> {results.timestamp}</p>
             {results.summary && (
               <div style={{ marginTop: '0.5rem' }}>